@@ -48,6 +48,7 @@ User API
 
    pca
    tica
+   tica_multilag
 
 **Clustering Algorithms**
 
@@ -55,6 +56,9 @@ User API
    :toctree: generated/
 
    cluster_kmeans
+   cluster_mini_batch_kmeans
+   cluster_coreset_kmeans
+   cluster_hierarchical_kmeans
    cluster_regspace
    cluster_uniform_time
    assign_to_centers
@@ -70,6 +74,7 @@ is done by the user API functions above. Find here a documentation how to extrac
    pipelines.Pipeline
    transform.PCA
    transform.TICA
+   transform.MultiLagTICA
 
 """
 from .api import *
@@ -46,8 +46,12 @@ from pyemma.coordinates.data.frames_from_file import frames_from_file as _frames
 from pyemma.coordinates.transform.transformer import Transformer as _Transformer
 from pyemma.coordinates.transform.pca import PCA as _PCA
 from pyemma.coordinates.transform.tica import TICA as _TICA
+from pyemma.coordinates.transform.tica_multilag import MultiLagTICA as _MultiLagTICA
 # clustering
 from pyemma.coordinates.clustering.kmeans import KmeansClustering as _KmeansClustering
+from pyemma.coordinates.clustering.kmeans import MiniBatchKmeansClustering as _MiniBatchKmeansClustering
+from pyemma.coordinates.clustering.kmeans import CoresetKmeansClustering as _CoresetKmeansClustering
+from pyemma.coordinates.clustering.kmeans import HierarchicalKmeansClustering as _HierarchicalKmeansClustering
 from pyemma.coordinates.clustering.uniform_time import UniformTimeClustering as _UniformTimeClustering
 from pyemma.coordinates.clustering.regspace import RegularSpaceClustering as _RegularSpaceClustering
 from pyemma.coordinates.clustering.assign import AssignCenters as _AssignCenters
@@ -71,8 +75,12 @@ __all__ = ['featurizer',  # IO
            'save_trajs',
            'pca',  # transform
            'tica',
+           'tica_multilag',
            'cluster_regspace',  # cluster
            'cluster_kmeans',
+           'cluster_mini_batch_kmeans',
+           'cluster_coreset_kmeans',
+           'cluster_hierarchical_kmeans',
            'cluster_uniform_time',
            'assign_to_centers',
            'feature_reader',  # deprecated:
@@ -639,7 +647,7 @@ def _param_stage(previous_stage, this_stage, stride=1):
     return this_stage
 
 
-def pca(data=None, dim=2, stride=1):
+def pca(data=None, dim=2, stride=1, n_jobs=1, comm=None, precision='float64'):
     r"""Principal Component Analysis (PCA).
 
     PCA is a linear transformation method that finds coordinates of maximal variance.
@@ -676,6 +684,20 @@ def pca(data=None, dim=2, stride=1):
         Note that the stride option in the get_output() function of the returned object is independent, so
         you can parametrize at a long stride, and still map all frames through the transformer.
 
+    n_jobs : int, optional, default = 1
+        number of threads used to compute the moments of the data chunks.
+
+    comm : communicator, optional, default = None
+        estimates PCA distributed over several processes, e.g. with
+        ``mpi4py.MPI.COMM_WORLD``. Every process passes its own share of the
+        trajectories as data and obtains the PCA of all data. See
+        :mod:`pyemma.coordinates.util.distributed`.
+
+    precision : str or numpy dtype, optional, default = 'float64'
+        precision of the matrix products of the data chunks, 'float32' or
+        'float64'. Single precision halves the memory traffic of the
+        estimation, the moments are always combined in double precision.
+
     Returns
     -------
     obj : a :class:`PCA <pyemma.coordinates.transform.PCA>` transformation object
@@ -711,11 +733,12 @@ def pca(data=None, dim=2, stride=1):
         J. Edu. Psych. 24, 417-441 and 498-520.
 
     """
-    res = _PCA(dim)
+    res = _PCA(dim, n_jobs=n_jobs, comm=comm, precision=precision)
     return _param_stage(data, res, stride=stride)
 
 
-def tica(data=None, lag=10, dim=2, stride=1, force_eigenvalues_le_one=False):
+def tica(data=None, lag=10, dim=2, stride=1, force_eigenvalues_le_one=False, n_jobs=1, comm=None,
+         scaling=None, precision='float64'):
     r"""Time-lagged independent component analysis (TICA).
 
     TICA is a linear transformation method. In contrast to PCA that finds
@@ -760,6 +783,26 @@ def tica(data=None, lag=10, dim=2, stride=1, force_eigenvalues_le_one=False):
         Compute covariance matrix and time-lagged covariance matrix such
         that the generalized eigenvalues are always guaranteed to be <= 1.
 
+    n_jobs : int, optional, default = 1
+        number of threads used to compute the moments of the data chunks.
+
+    comm : communicator, optional, default = None
+        estimates TICA distributed over several processes, e.g. with
+        ``mpi4py.MPI.COMM_WORLD``. Every process passes its own share of the
+        trajectories as data and obtains the TICA of all data. See
+        :mod:`pyemma.coordinates.util.distributed`.
+
+    scaling : str, optional, default = None
+        scaling of the independent components in the output. None leaves them
+        unscaled. 'kinetic_map' scales them by their eigenvalues, such that
+        Euclidean distances approximate kinetic distances [4]_. 'commute_map'
+        scales them by the square root of half their implied timescales, such
+        that Euclidean distances approximate commute distances [5]_.
+
+    precision : str or numpy dtype, optional, default = 'float64'
+        precision of the matrix products of the data chunks, 'float32' or
+        'float64'. Single precision halves the memory traffic of the
+        estimation, the moments are always combined in double precision.
 
     Returns
     -------
@@ -814,11 +857,86 @@ def tica(data=None, lag=10, dim=2, stride=1, force_eigenvalues_le_one=False):
     .. [3] L. Molgedey and H. G. Schuster. 1994.
         Separation of a mixture of independent signals using time delayed correlations
         Phys. Rev. Lett. 72, 3634.
+    .. [4] Noe, F. and C. Clementi. 2015. Kinetic distance and kinetic maps
+        from molecular dynamics simulation. J. Chem. Theory Comput. 11, 5002-5011.
+    .. [5] Noe, F., R. Banisch and C. Clementi. 2016. Commute maps: separating
+        slowly-mixing molecular configurations for kinetic modeling.
+        J. Chem. Theory Comput. 12, 5620-5630.
 
     """
     # don't expose this until we know what this is doing.
     #force_eigenvalues_le_one = False
-    res = _TICA(lag, dim, force_eigenvalues_le_one=force_eigenvalues_le_one)
+    res = _TICA(lag, dim, force_eigenvalues_le_one=force_eigenvalues_le_one, n_jobs=n_jobs, comm=comm,
+                scaling=scaling, precision=precision)
+    return _param_stage(data, res, stride=stride)
+
+
+def tica_multilag(data=None, lags=(1, 2, 5, 10, 20, 50), dim=2, stride=1, force_eigenvalues_le_one=False,
+                  n_jobs=1, lag=None, precision='float64'):
+    r"""Time-lagged independent component analysis (TICA) for a series of lag times.
+
+    Estimates one TICA transformation for each of the given lag times while
+    reading the data only once. This is useful to choose the lag time of TICA
+    by inspecting the convergence of the TICA timescales, similar to the
+    implied timescales of Markov models (see :func:`pyemma.msm.its`).
+
+    Parameters
+    ----------
+    data : ndarray(N, d), optional
+        array with the data, if available. When given, the TICA transformations
+        are immediately computed.
+
+    lags : array-like of int, optional, default = (1, 2, 5, 10, 20, 50)
+        the lag times, in multiples of the input time step
+
+    dim : int, optional, default = 2
+        the number of dimensions (independent components) to project onto
+        and the number of timescales to summarize.
+
+    stride : int, optional, default = 1
+        If set to 1, all input data will be used for estimation. Note that the
+        lag times are given in multiples of the strided time step.
+
+    force_eigenvalues_le_one : boolean
+        Compute covariance matrix and time-lagged covariance matrix such
+        that the generalized eigenvalues are always guaranteed to be <= 1.
+
+    n_jobs : int, optional, default = 1
+        number of threads used to compute the moments of the data chunks.
+
+    lag : int, optional, default = None
+        the lag time, one of lags, whose TICA transformation projects the
+        data, e.g. in get_output(). By default the smallest lag time. It can
+        be changed later by setting obj.lag.
+
+    precision : str or numpy dtype, optional, default = 'float64'
+        precision of the matrix products of the data chunks, 'float32' or
+        'float64'.
+
+    Returns
+    -------
+    obj : a :class:`MultiLagTICA <pyemma.coordinates.transform.MultiLagTICA>` object.
+        The TICA models of all lag times are available as obj.models, the
+        timescales for all lag times as obj.timescales.
+
+    See also
+    --------
+    tica
+        for time-lagged independent component analysis at a single lag time
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> X = np.random.randn(1000, 3)
+    >>> multi = tica_multilag(X, lags=[1, 5, 10], dim=1)
+    >>> [m.lag for m in multi.models]
+    [1, 5, 10]
+    >>> multi.timescales.shape
+    (3, 1)
+
+    """
+    res = _MultiLagTICA(lags, dim, force_eigenvalues_le_one=force_eigenvalues_le_one, n_jobs=n_jobs, lag=lag,
+                        precision=precision)
     return _param_stage(data, res, stride=stride)
 
 
@@ -853,6 +971,11 @@ def cluster_kmeans(data=None, k=100, max_iter=10, stride=1, metric='euclidean'):
     k: int
         the number of cluster centers
 
+    max_iter : int, optional, default = 10
+        maximum number of Lloyd iterations, i.e. passes through the data
+        updating the centers. The data is streamed in chunks, so it does not
+        have to fit into memory.
+
     stride : int, optional, default = 1
         If set to 1, all input data will be used for estimation. Note that this could cause this calculation
         to be very slow for large data sets. Since molecular dynamics data is usually
@@ -861,7 +984,9 @@ def cluster_kmeans(data=None, k=100, max_iter=10, stride=1, metric='euclidean'):
         you can parametrize at a long stride, and still map all frames through the transformer.
 
     metric : str
-        metric to use during clustering ('euclidean', 'minRMSD')
+        metric to use during clustering ('euclidean', 'minRMSD'). With minRMSD,
+        the cluster centers are the mean structures of the optimally
+        superimposed frames of their clusters.
 
     Returns
     -------
@@ -882,16 +1007,220 @@ def cluster_kmeans(data=None, k=100, max_iter=10, stride=1, metric='euclidean'):
     return _param_stage(data, res, stride=stride)
 
 
+def cluster_mini_batch_kmeans(data=None, k=100, max_iter=10, tolerance=1e-5, reservoir_size=None, stride=1,
+                              metric='euclidean'):
+    r"""Mini-batch k-means clustering, streaming through the data
+
+    In contrast to :func:`cluster_kmeans`, the data is never loaded into
+    memory at once. The cluster centers are seeded by k-means++ on a random
+    sample of the data and then updated chunk by chunk, for at most max_iter
+    passes through the data. Thus, the memory requirement does not depend on
+    the amount of data, and arbitrarily long trajectories can be clustered.
+    Returns a :class:`MiniBatchKmeansClustering <pyemma.coordinates.clustering.MiniBatchKmeansClustering>`
+    object that can be used to extract the discretized data sequences, or to
+    assign other data points to the same partition. If data is not given, an
+    empty object will be created that still needs to be parametrized, e.g. in
+    a :func:`pipeline`.
+
+    Parameters
+    ----------
+    data: ndarray or list of ndarray or Transformer, optional
+        input data, if available
+
+    k: int
+        the number of cluster centers
+
+    max_iter : int, optional, default = 10
+        maximum number of passes through the data updating the centers
+
+    tolerance : float, optional, default = 1e-5
+        stop when no center has moved further than this during a pass
+
+    reservoir_size : int, optional, default = None
+        number of randomly sampled frames the centers are seeded from. By
+        default, max(10 * k, 1000).
+
+    stride : int, optional, default = 1
+        If set to 1, all input data will be used for estimation. Note that this could cause this calculation
+        to be very slow for large data sets. Since molecular dynamics data is usually
+        correlated at short timescales, it is often sufficient to estimate transformations at a longer stride.
+        Note that the stride option in the get_output() function of the returned object is independent, so
+        you can parametrize at a long stride, and still map all frames through the transformer.
+
+    metric : str
+        metric to use during clustering ('euclidean', 'minRMSD')
+
+    Returns
+    -------
+    kmeans : A :class:`MiniBatchKmeansClustering <pyemma.coordinates.clustering.MiniBatchKmeansClustering>` object
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> traj_data = [np.random.random((100, 3)), np.random.random((100,3))]
+    >>> clustering = cluster_mini_batch_kmeans(traj_data, k=20)
+    >>> clustering.dtrajs
+
+    [array([0, 0, 1, ... ])]
+
+    """
+    res = _MiniBatchKmeansClustering(n_clusters=k, max_iter=max_iter, tolerance=tolerance,
+                                     reservoir_size=reservoir_size, metric=metric)
+    return _param_stage(data, res, stride=stride)
+
+
+def cluster_coreset_kmeans(data=None, k=100, coreset_size=None, max_iter=100, tolerance=1e-5,
+                           reservoir_size=None, stride=1):
+    r"""k-means clustering on a coreset of the data
+
+    Streams through the data twice: once to seed preliminary cluster centers
+    from a random sample, and once to draw a coreset, a small weighted
+    summary of the data. Frames far away from the preliminary centers are
+    sampled preferably and weighted down accordingly, such that weighted
+    k-means on the coreset gives centers close to those of k-means on the
+    full data. The cost of the k-means iterations does not depend on the
+    amount of data. Returns a
+    :class:`CoresetKmeansClustering <pyemma.coordinates.clustering.CoresetKmeansClustering>`
+    object that can be used to extract the discretized data sequences, or to
+    assign other data points to the same partition. If data is not given, an
+    empty object will be created that still needs to be parametrized, e.g. in
+    a :func:`pipeline`.
+
+    Parameters
+    ----------
+    data: ndarray or list of ndarray or Transformer, optional
+        input data, if available
+
+    k: int
+        the number of cluster centers
+
+    coreset_size : int, optional, default = None
+        number of frames in the coreset. By default, max(200 * k, 10000).
+
+    max_iter : int, optional, default = 100
+        maximum number of Lloyd iterations on the coreset
+
+    tolerance : float, optional, default = 1e-5
+        stop when no center has moved further than this during an iteration
+
+    reservoir_size : int, optional, default = None
+        number of randomly sampled frames the preliminary centers are seeded
+        from. By default, max(10 * k, 1000).
+
+    stride : int, optional, default = 1
+        If set to 1, all input data will be used for estimation. Note that this could cause this calculation
+        to be very slow for large data sets. Since molecular dynamics data is usually
+        correlated at short timescales, it is often sufficient to estimate transformations at a longer stride.
+        Note that the stride option in the get_output() function of the returned object is independent, so
+        you can parametrize at a long stride, and still map all frames through the transformer.
+
+    Returns
+    -------
+    kmeans : A :class:`CoresetKmeansClustering <pyemma.coordinates.clustering.CoresetKmeansClustering>` object
+
+    Notes
+    -----
+    Only the Euclidean metric is supported.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> traj_data = [np.random.random((100, 3)), np.random.random((100,3))]
+    >>> clustering = cluster_coreset_kmeans(traj_data, k=20)
+    >>> clustering.dtrajs
+
+    [array([0, 0, 1, ... ])]
+
+    """
+    res = _CoresetKmeansClustering(n_clusters=k, coreset_size=coreset_size, max_iter=max_iter,
+                                   tolerance=tolerance, reservoir_size=reservoir_size)
+    return _param_stage(data, res, stride=stride)
+
+
+def cluster_hierarchical_kmeans(data=None, k=10000, n_coarse=None, max_iter=5, tolerance=1e-5,
+                                reservoir_size=None, stride=1):
+    r"""Two-level k-means clustering for very large numbers of clusters
+
+    Partitions the data into about sqrt(k) coarse cells by k-means and then
+    runs independent k-means within every coarse cell, in parallel. Frames
+    are assigned to the closest coarse center first and then to the closest
+    cluster center within that cell, which costs about 2 sqrt(k) instead of
+    k distance computations per frame. This makes discretizations into tens
+    of thousands of microstates feasible. Returns a
+    :class:`HierarchicalKmeansClustering <pyemma.coordinates.clustering.HierarchicalKmeansClustering>`
+    object that can be used to extract the discretized data sequences, or to
+    assign other data points to the same partition. If data is not given, an
+    empty object will be created that still needs to be parametrized, e.g. in
+    a :func:`pipeline`.
+
+    Parameters
+    ----------
+    data: ndarray or list of ndarray or Transformer, optional
+        input data, if available
+
+    k: int
+        the number of cluster centers
+
+    n_coarse : int, optional, default = None
+        the number of coarse cells. By default, ceil(sqrt(k)).
+
+    max_iter : int, optional, default = 5
+        maximum number of passes through the data updating the centers
+
+    tolerance : float, optional, default = 1e-5
+        stop when no center has moved further than this during a pass
+
+    reservoir_size : int, optional, default = None
+        number of randomly sampled frames both levels are seeded from. By
+        default, max(10 * k, 1000).
+
+    stride : int, optional, default = 1
+        If set to 1, all input data will be used for estimation. Note that this could cause this calculation
+        to be very slow for large data sets. Since molecular dynamics data is usually
+        correlated at short timescales, it is often sufficient to estimate transformations at a longer stride.
+        Note that the stride option in the get_output() function of the returned object is independent, so
+        you can parametrize at a long stride, and still map all frames through the transformer.
+
+    Returns
+    -------
+    kmeans : A :class:`HierarchicalKmeansClustering <pyemma.coordinates.clustering.HierarchicalKmeansClustering>`
+        object
+
+    Notes
+    -----
+    Only the Euclidean metric is supported. The two-level assignment is not
+    the exact Voronoi partition of the cluster centers, frames close to the
+    border of a coarse cell may have a closer center in the neighboring cell.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> traj_data = [np.random.random((1000, 3)), np.random.random((1000,3))]
+    >>> clustering = cluster_hierarchical_kmeans(traj_data, k=100)
+    >>> clustering.dtrajs
+
+    [array([0, 12, 1, ... ])]
+
+    """
+    res = _HierarchicalKmeansClustering(n_clusters=k, n_coarse=n_coarse, max_iter=max_iter,
+                                        tolerance=tolerance, reservoir_size=reservoir_size)
+    return _param_stage(data, res, stride=stride)
+
+
 @deprecated
 def uniform_time(data=None, k=100, stride=1):
     return cluster_uniform_time(data, k, stride=stride)
 
 
-def cluster_uniform_time(data=None, k=100, stride=1, metric='euclidean'):
+def cluster_uniform_time(data=None, k=100, stride=1, metric='euclidean', sampling='uniform'):
     r"""Uniform time clustering
 
     If given data, performs a clustering that selects data points uniformly in time and then assigns the data
-    using a Voronoi discretization. Returns a
+    using a Voronoi discretization. If the data source supports random access, only the selected data points
+    are read to obtain the cluster centers. Returns a
     :class:`UniformTimeClustering <pyemma.coordinates.clustering.UniformTimeClustering>` object
     that can be used to extract the discretized data sequences, or to assign other data points to the same partition.
     If data is not given, an empty
@@ -913,13 +1242,20 @@ def cluster_uniform_time(data=None, k=100, stride=1, metric='euclidean'):
         Note that the stride option in the get_output() function of the returned object is independent, so
         you can parametrize at a long stride, and still map all frames through the transformer.
 
+    metric : str
+        metric to use during clustering ('euclidean', 'minRMSD')
+
+    sampling : str, optional, default = 'uniform'
+        'uniform' selects data points at uniform time intervals, 'random' selects a uniform random subset of
+        data points.
+
     Returns
     -------
         A :class:`UniformTimeClustering <pyemma.coordinates.clustering.UniformTimeClustering>` object
 
     """
-    res = _UniformTimeClustering(k, metric=metric)
-    return _param_stage(data, res)
+    res = _UniformTimeClustering(k, metric=metric, sampling=sampling)
+    return _param_stage(data, res, stride=stride)
 
 
 @deprecated
@@ -34,12 +34,16 @@ clustering - Algorithms (:mod:`pyemma.coordinates.clustering`)
     :toctree: generated/
 
     AssignCenters
+    CoresetKmeansClustering
+    HierarchicalKmeansClustering
     KmeansClustering
+    MiniBatchKmeansClustering
     RegularSpaceClustering
     UniformTimeClustering
 """
 
 from .assign import AssignCenters
-from .kmeans import KmeansClustering
+from .kmeans import KmeansClustering, MiniBatchKmeansClustering, CoresetKmeansClustering, \
+    HierarchicalKmeansClustering
 from .regspace import RegularSpaceClustering
 from .uniform_time import UniformTimeClustering
\ No newline at end of file
@@ -73,6 +73,21 @@ class AssignCenters(AbstractClustering):
     def describe(self):
         return "[AssignCenters c=%s]" % self.clustercenters
 
+    def parametrize(self, stride=1):
+        # the assignment is the parametrization, it may be in the dtraj cache
+        if self._parametrized and stride == self._param_with_stride:
+            return
+        key, cached = self._cached_dtrajs(stride)
+        if cached is not None:
+            self._dtrajs = cached
+            self._param_with_stride = stride
+            self._parametrized = True
+            return
+        self._dtrajs = []
+        super(AssignCenters, self).parametrize(stride=stride)
+        if key is not None:
+            self._store_dtrajs(key)
+
     def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
                         last_chunk, ipass, Y=None, stride=1):
         # discretize all
@@ -66,7 +66,7 @@ extern "C" {
 "    (input) array of N frames, each frame having dimension M\n"\
 "centers : (M,K) ndarray-like of np.float32\n"\
 "    (input) Non-empty array-like of cluster centers.\n"\
-"dtraj : (N) ndarray of np.int64\n"\
+"dtraj : (N) ndarray of np.int32\n"\
 "    (output) discretized trajectory\n"\
 "    dtraj[i]=argmin{ d(chunk[i,:],centers[j,:]) | j in 0...(K-1) }\n"\
 "    where d is the metric that is specified with the argument `metric`.\n"\
@@ -79,6 +79,63 @@ extern "C" {
 "\n"\
 "Note\n"\
 "----\n"\
+"With the minRMSD metric, the cluster centers are centered once per call and\n"\
+"every frame is centered once in a scratch buffer of its thread.\n"\
+"This function uses the minRMSD implementation of mdtraj."
+
+#define MINRMSD_DISTANCES_USAGE "minRMSD_distances(chunk, references, ref_traces, out)\n"\
+"Computes the minimal RMSD of every frame in `chunk` to every reference structure.\n"\
+"\n"\
+"Parameters\n"\
+"----------\n"\
+"chunk : (N,M) C-style contiguous and behaved ndarray of np.float32\n"\
+"    (input) array of N frames in atom major layout [x1,y1,z1,x2,...], M=3*n_atoms\n"\
+"references : (K,M) C-style contiguous and behaved ndarray of np.float32\n"\
+"    (input) array of K reference structures, which are already centered\n"\
+"ref_traces : (K) C-style contiguous and behaved ndarray of np.float32\n"\
+"    (input) traces (sum of squared coordinates) of the centered references\n"\
+"out : (N,K) behaved ndarray of np.float32 with contiguous rows\n"\
+"    (output) out[i,j] is the minRMSD between chunk[i,:] and references[j,:]\n"\
+"\n"\
+"Returns \n"\
+"-------\n"\
+"None\n"\
+"\n"\
+"Note\n"\
+"----\n"\
+"Every frame of `chunk` is centered exactly once. The centering and the\n"\
+"traces of the references have to be precomputed by the caller.\n"\
+"This function uses the minRMSD implementation of mdtraj."
+
+#define KMEANS_ACCUMULATE_USAGE "kmeans_accumulate(chunk, centers, sums, counts, metric)\n"\
+"Assigns frames in `chunk` to the closest cluster centers and adds every frame\n"\
+"to the sum of the frames assigned to its center.\n"\
+"\n"\
+"Parameters\n"\
+"----------\n"\
+"chunk : (N,M) C-style contiguous and behaved ndarray of np.float32\n"\
+"    (input) array of N frames, each frame having dimension M\n"\
+"centers : (K,M) C-style contiguous and behaved ndarray of np.float32\n"\
+"    (input) Non-empty array of cluster centers.\n"\
+"sums : (K,M) C-style contiguous and behaved ndarray of np.float64\n"\
+"    (input/output) sums[j,:] is increased by the sum of the frames\n"\
+"    assigned to centers[j,:]\n"\
+"counts : (K) C-style contiguous and behaved ndarray of np.int64\n"\
+"    (input/output) counts[j] is increased by the number of frames\n"\
+"    assigned to centers[j,:]\n"\
+"metric : string\n"\
+"    (input) One of \"euclidean\" or \"minRMSD\" (case sensitive).\n"\
+"\n"\
+"Returns \n"\
+"-------\n"\
+"None\n"\
+"\n"\
+"Note\n"\
+"----\n"\
+"With the minRMSD metric, every frame is centered and optimally rotated onto\n"\
+"its (centered) cluster center before it is added, such that sums/counts\n"\
+"is the mean structure of a cluster. Every thread accumulates into its own\n"\
+"buffers, which are added up at the end.\n"\
 "This function uses the minRMSD implementation of mdtraj."
 
 // euclidean metric
@@ -89,7 +146,17 @@ float minRMSD_distance(float *SKP_restrict a, float *SKP_restrict b, size_t n, f
 // assignment to cluster centers from python
 PyObject *assign(PyObject *self, PyObject *args);
 // assignment to cluster centers from c
-int c_assign(float *chunk, float *centers, npy_int64 *dtraj, char* metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim);
+int c_assign(float *chunk, float *centers, npy_int32 *dtraj, char* metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim);
+
+// minRMSD of every frame to a set of precentered references from python
+PyObject *minRMSD_distances(PyObject *self, PyObject *args);
+// minRMSD of every frame to a set of precentered references from c
+int c_minRMSD_distances(float *chunk, float *refs, float *ref_traces, float *out, Py_ssize_t out_stride, Py_ssize_t N_frames, Py_ssize_t N_refs, Py_ssize_t dim);
+
+// k-means accumulation of the frames assigned to every center from python
+PyObject *kmeans_accumulate(PyObject *self, PyObject *args);
+// k-means accumulation of the frames assigned to every center from c
+int c_kmeans_accumulate(float *chunk, float *centers, double *sums, npy_int64 *counts, char *metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim);
 
 #ifdef __cplusplus
 }
@@ -31,8 +31,62 @@ from pyemma.util.files import mkdir_p
 
 import numpy as np
 import os
+from scipy.spatial import cKDTree
 
 from pyemma.coordinates.clustering import regspatial
+from pyemma.coordinates.util import dtraj_cache
+
+# maximum number of frame-center distances held at once by _assign_euclidean
+_ASSIGN_BLOCK_ELEMENTS = 2 ** 20
+
+# a KD-tree over the cluster centers is only used up to this dimension, since
+# it degrades to a brute force scan in high dimensions
+_KDTREE_MAX_DIM = 10
+
+# minimum number of centers for which a KD-tree query beats the blocked brute
+# force assignment, for dimensions 1 to _KDTREE_MAX_DIM. Measured break-even
+# points for 1e5 frames.
+_KDTREE_MIN_CENTERS = (150, 170, 260, 420, 640, 1200, 2200, 4100, 9800, 14000)
+
+
+def _use_kdtree(n_centers, dim):
+    """ whether a KD-tree query is expected to be faster than the blocked
+    brute force assignment. A tree pays off for many centers in few
+    dimensions. """
+    return 0 < dim <= _KDTREE_MAX_DIM and n_centers >= _KDTREE_MIN_CENTERS[dim - 1]
+
+
+def _assign_euclidean(X, centers, dtraj):
+    r""" assigns the frames in X to their closest centers (Euclidean metric)
+
+    Since :math:`\|x - c\|^2 = \|x\|^2 - 2 x \cdot c + \|c\|^2`, the closest
+    center maximizes :math:`x \cdot c - \|c\|^2 / 2`. This is computed for
+    blocks of frames by a matrix product, i.e. by BLAS, and the center
+    norms are computed once per chunk. Neither :math:`\|x\|^2` nor square
+    roots are needed. Data and centers are shifted by the mean of the centers
+    first, which limits the cancellation in single precision.
+
+    Parameters
+    ----------
+    X : ndarray(T, n)
+        frames
+    centers : ndarray(k, n)
+        cluster centers
+    dtraj : ndarray(T)
+        (output) index of the closest center of every frame
+    """
+    shift = np.mean(centers, axis=0, dtype=np.float64).astype(np.float32)
+    C = np.asarray(centers, dtype=np.float32) - shift
+    half_norms = 0.5 * np.sum(C.astype(np.float64) ** 2, axis=1).astype(np.float32)
+    CT = np.asfortranarray(C.T)
+    block = max(1, _ASSIGN_BLOCK_ELEMENTS // C.shape[0])
+    scores = np.empty((min(block, X.shape[0]), C.shape[0]), dtype=np.float32)
+    for start in xrange(0, X.shape[0], block):
+        Xb = np.asarray(X[start:start + block], dtype=np.float32) - shift
+        S = scores[:Xb.shape[0]]
+        np.dot(Xb, CT, out=S)
+        S -= half_norms
+        dtraj[start:start + Xb.shape[0]] = np.argmax(S, axis=1)
 
 
 class AbstractClustering(Transformer):
@@ -47,6 +101,60 @@ class AbstractClustering(Transformer):
         self.clustercenters = None
         self._dtrajs = []
 
+    @property
+    def clustercenters(self):
+        """ cluster centers, array of shape (n_clusters, dimension). To change
+        them, assign a new array, which also discards the spatial index over
+        the old centers. """
+        return self._clustercenters_array
+
+    @clustercenters.setter
+    def clustercenters(self, centers):
+        self._clustercenters_array = centers
+        # spatial index over the centers, built on first use
+        self._kdtree = None
+
+    def _assign_kdtree(self, X, dtraj):
+        """ assigns by a KD-tree over the cluster centers, which is built once
+        and reused for all chunks and calls of assign() """
+        if self._kdtree is None:
+            self._kdtree = cKDTree(np.asarray(self.clustercenters, dtype=np.float64))
+        _, dtraj[:] = self._kdtree.query(np.asarray(X, dtype=np.float64))
+
+    def _assignment_description(self):
+        """ describes how frames are assigned to the cluster centers, by
+        default the metric of a Voronoi partition """
+        return self.metric
+
+    def _cached_dtrajs(self, stride):
+        """ looks up the assignment of the data producer's output at the given
+        stride in the persistent dtraj cache
+
+        Returns
+        -------
+        key : str or None
+            cache key, None if the assignment can't be cached
+        dtrajs : list of ndarray or None
+            the cached dtrajs, None on a cache miss
+        """
+        key = dtraj_cache.cache_key(self.clustercenters, self._assignment_description(), stride,
+                                    self.data_producer)
+        if key is None:
+            return None, None
+        cached = dtraj_cache.load(key)
+        if cached is None:
+            return key, None
+        self._logger.debug('read dtrajs from cache entry %s' % key)
+        return key, [d.astype(self.output_type(), copy=False) for d in cached]
+
+    def _store_dtrajs(self, key):
+        """ stores the dtrajs in the persistent dtraj cache under key. The cache
+        is best effort, a failing store is logged and doesn't fail the assignment. """
+        try:
+            dtraj_cache.store(key, self._dtrajs)
+        except (IOError, OSError) as e:
+            self._logger.warning('could not store dtrajs in cache entry %s: %s' % (key, e))
+
     @property
     def dtrajs(self):
         if len(self._dtrajs) == 0:  # nothing assigned yet, doing that now
@@ -57,8 +165,19 @@ class AbstractClustering(Transformer):
     def _map_array(self, X):
         """get closest index of point in :attr:`clustercenters` to x."""
         dtraj = np.empty(X.shape[0], dtype=self.output_type())
-        regspatial.assign(X.astype(np.float32, order='C', copy=False),
-                          self.clustercenters, dtraj, self.metric)
+        if self.metric == 'euclidean':
+            if _use_kdtree(*np.shape(self.clustercenters)):
+                self._assign_kdtree(X, dtraj)
+            else:
+                _assign_euclidean(X, self.clustercenters, dtraj)
+        elif dtraj.dtype == np.int32:
+            regspatial.assign(X.astype(np.float32, order='C', copy=False),
+                              self.clustercenters, dtraj, self.metric)
+        else:
+            dtraj32 = np.empty(X.shape[0], dtype=np.int32)
+            regspatial.assign(X.astype(np.float32, order='C', copy=False),
+                              self.clustercenters, dtraj32, self.metric)
+            dtraj[:] = dtraj32
         res = dtraj[:,None] # always return a column vector in this function
         return res
 
@@ -67,7 +186,12 @@ class AbstractClustering(Transformer):
         return 1
 
     def output_type(self):
-        return np.int64
+        """ the narrowest integer type of the discrete trajectories that holds
+        all cluster indices: int16 for up to 32767 cluster centers, otherwise
+        int32 """
+        if self.clustercenters is not None and len(self.clustercenters) <= np.iinfo(np.int16).max:
+            return np.int16
+        return np.int32
 
     def assign(self, X=None, stride=1):
         """
@@ -92,18 +216,31 @@ class AbstractClustering(Transformer):
             Note that the stride option used to conduct the clustering is independent of the assign stride.
             This argument is only accepted if X is not given.
 
+        Notes
+        -----
+        If X is not given and the data comes from files, the result is kept in the persistent cache of
+        discrete trajectories if it is enabled, see :mod:`pyemma.coordinates.util.dtraj_cache`. Assigning the
+        same files to the same centers again then reads the result from the cache.
+
         Returns
         -------
         Y : ndarray(T, dtype=int) or list of ndarray(T_i, dtype=int)
             The discretized trajectory: int-array with the indexes of the assigned clusters, or list of such int-arrays.
-            If called with a list of trajectories, Y will also be a corresponding list of discrete trajectories
+            If called with a list of trajectories, Y will also be a corresponding list of discrete trajectories.
+            The integer type is the narrowest one that holds all cluster indices, see :func:`output_type`.
 
         """
         if X is None:
+            key, cached = self._cached_dtrajs(stride)
+            if cached is not None:
+                self._dtrajs = cached
+                return self._dtrajs
             # map to column vectors
             mapped = self.get_output(stride=stride)
             # flatten and save
             self._dtrajs = [np.transpose(m)[0] for m in mapped]
+            if key is not None:
+                self._store_dtrajs(key)
             # return
             return self._dtrajs
         else:
@@ -29,84 +29,601 @@ Created on 22.01.2015
 @author: marscher, noe
 '''
 import numpy as np
-from sklearn.cluster import KMeans as _sklearn_kmeans
+import scipy.sparse
 
 from pyemma.util.annotators import doc_inherit
-from pyemma.coordinates.clustering.interface import AbstractClustering
+from pyemma.coordinates.clustering.interface import AbstractClustering, _assign_euclidean
+from pyemma.coordinates.clustering import regspatial
+from pyemma.coordinates.util.dtraj_cache import arrays_digest
 
-__all__ = ['KmeansClustering']
+__all__ = ['KmeansClustering', 'MiniBatchKmeansClustering', 'CoresetKmeansClustering',
+           'HierarchicalKmeansClustering']
+
+
+def _distances(X, center, metric):
+    """ distances of all frames in X to a single center """
+    if metric == 'minRMSD':
+        ref = center.reshape(-1, 3).astype(np.float64)
+        ref -= ref.mean(axis=0)
+        trace = np.array([np.sum(ref ** 2)], dtype=np.float32)
+        out = np.empty((X.shape[0], 1), dtype=np.float32)
+        regspatial.minRMSD_distances(np.require(X, np.float32, 'C'),
+                                     np.require(ref.reshape(1, -1), np.float32, 'C'), trace, out)
+        return out[:, 0].astype(np.float64)
+    return np.sqrt(np.sum((X - center) ** 2, axis=1))
+
+
+def _kmeans_plusplus(X, k, metric='euclidean'):
+    """ k-means++ seeding: picks k rows of X, each with a probability
+    proportional to its squared distance to the closest row picked before """
+    n = X.shape[0]
+    centers = np.empty((k, X.shape[1]))
+    centers[0] = X[np.random.randint(n)]
+    d2 = _distances(X, centers[0], metric) ** 2
+    for i in xrange(1, k):
+        total = d2.sum()
+        if total > 0:
+            index = min(np.searchsorted(np.cumsum(d2), np.random.random_sample() * total), n - 1)
+        else:
+            # all remaining points coincide with a center
+            index = np.random.randint(n)
+        centers[i] = X[index]
+        d2 = np.minimum(d2, _distances(X, centers[i], metric) ** 2)
+    return centers
+
+
+def _closest_sq_distances(X, centers):
+    """ squared Euclidean distances of all frames in X to their closest centers """
+    dtraj = np.empty(X.shape[0], dtype=np.int32)
+    _assign_euclidean(X, centers, dtraj)
+    return np.sum((X - centers[dtraj]) ** 2, axis=1), dtraj
+
+
+def _add_to_centers(X, dtraj, sums, counts):
+    """ adds every frame of X to the sum of its center dtraj and counts it """
+    # sparse (k, N) assignment matrix, summing up the frames of every center at once
+    assignment = scipy.sparse.csr_matrix((np.ones(X.shape[0]), (dtraj, np.arange(X.shape[0]))),
+                                         shape=(len(counts), X.shape[0]))
+    sums += assignment.dot(np.asarray(X, dtype=np.float64))
+    counts += np.bincount(dtraj, minlength=len(counts))
+
+
+def _weighted_lloyd(X, weights, centers, max_iter, tolerance):
+    """ Lloyd iterations on weighted points X, starting from the given centers
+
+    Returns
+    -------
+    centers : ndarray(k, n)
+        every center is the weighted mean of its points, centers without
+        points stay where they are
+    n_iter : int
+        number of iterations done
+    """
+    k = centers.shape[0]
+    centers = np.array(centers, dtype=np.float64)
+    columns = np.arange(X.shape[0])
+    for n_iter in xrange(1, max_iter + 1):
+        _, dtraj = _closest_sq_distances(X, centers)
+        # sparse (k, N) matrix of the weights, summing up the points of every center at once
+        assignment = scipy.sparse.csr_matrix((weights, (dtraj, columns)), shape=(k, X.shape[0]))
+        sums = assignment.dot(X)
+        total = np.asarray(assignment.sum(axis=1)).ravel()
+        assigned = total > 0
+        before = centers.copy()
+        centers[assigned] = sums[assigned] / total[assigned, None]
+        if np.max(np.sqrt(np.sum((centers - before) ** 2, axis=1))) <= tolerance:
+            break
+    return centers, n_iter
 
 
 class KmeansClustering(AbstractClustering):
     r"""
     Kmeans clustering
 
+    The first pass draws a uniform random sample of the data (reservoir
+    sampling) and seeds the cluster centers from it by k-means++. Every
+    further pass is a Lloyd iteration: all frames are streamed through in
+    chunks, assigned to their closest centers, and each center is moved to
+    the mean of its frames at the end of the pass. Euclidean frames are
+    assigned by blocked matrix products, like in :meth:`assign`. For minRMSD,
+    assigning and summing up the frames is done in C, parallelized with
+    OpenMP if available.
+    The memory requirement only depends on the number of clusters and the
+    reservoir size, not on the amount of data.
+
     Parameters
     ----------
     n_clusters : int
         amount of cluster centers
-    max_iter : int 
-        how many iterations per chunk?
+    max_iter : int
+        maximum number of passes through the data updating the centers
     metric : str
-        metric to use during clustering ('euclidean', 'minRMSD')
+        metric to use during clustering ('euclidean', 'minRMSD'). For minRMSD,
+        the frames are optimally superimposed onto their centers before the
+        mean is taken.
+    tolerance : float, default = 1e-5
+        stop when no center has moved further than this during a pass
+    reservoir_size : int, optional, default = None
+        number of frames sampled for the k-means++ seeding. By default
+        max(10 * n_clusters, 1000).
 
     """
 
-    def __init__(self, n_clusters, max_iter=5, metric='euclidean'):
+    def __init__(self, n_clusters, max_iter=5, metric='euclidean', tolerance=1e-5, reservoir_size=None):
         super(KmeansClustering, self).__init__(metric=metric)
         self.n_clusters = n_clusters
         self.max_iter = max_iter
-        self._algo = _sklearn_kmeans(n_clusters=self.n_clusters, max_iter=self.max_iter)
-        self._chunks = []
+        self.tolerance = tolerance
+        if reservoir_size is None:
+            reservoir_size = max(10 * n_clusters, 1000)
+        if reservoir_size < n_clusters:
+            raise ValueError("reservoir_size (%i) has to be at least n_clusters (%i)"
+                             % (reservoir_size, n_clusters))
+        self.reservoir_size = reservoir_size
 
     @doc_inherit
     def describe(self):
         return "[Kmeans, k=%i]" % self.n_clusters
 
     def _get_memory_per_frame(self):
-        return 1
+        # 4 bytes per frame for an integer index
+        return 4
 
     def _get_constant_memory(self):
-        return 1
+        # centers, the sums of their frames and the reservoir sample
+        dim = self.data_producer.dimension()
+        return 8 * (2 * self.n_clusters * (dim + 1) + self.reservoir_size * dim)
 
-    def _map_to_memory(self):
-        # resutls mapped to memory during parameterize
-        pass
+    def _param_init(self):
+        self._logger.info("Running %s" % self.describe())
+        dim = self.data_producer.dimension()
+        self._reservoir = np.empty((self.reservoir_size, dim))
+        self._n_seen = 0
+        self._centers = None
+        self._centers_before = None
+        self._sums = None
+        self._counts = None
+
+    def _sample(self, X):
+        """ adds a chunk to the reservoir sample (Vitter's algorithm R) """
+        L = X.shape[0]
+        R = self.reservoir_size
+        n_fill = max(0, min(L, R - self._n_seen))
+        self._reservoir[self._n_seen:self._n_seen + n_fill] = X[:n_fill]
+        if n_fill < L:
+            # frame number n replaces a random sample with probability R / (n + 1)
+            n = self._n_seen + np.arange(n_fill, L)
+            slot = (np.random.random_sample(L - n_fill) * (n + 1)).astype(int)
+            replace = slot < R
+            # later frames overwrite earlier ones, as in the sequential algorithm
+            self._reservoir[slot[replace]] = X[n_fill:][replace]
+        self._n_seen += L
+
+    def _seed(self):
+        sample = self._reservoir[:min(self._n_seen, self.reservoir_size)]
+        if self.n_clusters > len(sample):
+            self._logger.info('Requested more clusters (k = %i) than there are total data points %i.'
+                              ' Will do clustering with k = %i' % (self.n_clusters, len(sample), len(sample)))
+            self.n_clusters = len(sample)
+        self._centers = _kmeans_plusplus(sample, self.n_clusters, self.metric)
+        self.clustercenters = np.array(self._centers, dtype=np.float32, order='C')
+        self._sums = np.zeros_like(self._centers)
+        self._counts = np.zeros(self.n_clusters, dtype=np.int64)
+        del self._reservoir
+
+    def _accumulate(self, X):
+        """ adds the chunk frames to the sums of their closest centers """
+        if self.metric == 'euclidean':
+            _add_to_centers(X, self._map_array(X)[:, 0], self._sums, self._counts)
+        else:
+            regspatial.kmeans_accumulate(np.require(X, np.float32, 'C'), self.clustercenters,
+                                         self._sums, self._counts, self.metric)
+
+    def _begin_pass(self):
+        self._centers_before = self._centers.copy()
+        self._sums[:] = 0
+        self._counts[:] = 0
+
+    def _add_chunk(self, X):
+        self._accumulate(X)
+
+    def _end_pass(self):
+        # centers without frames stay where they are
+        assigned = self._counts > 0
+        self._centers[assigned] = self._sums[assigned] / self._counts[assigned, None]
+        self.clustercenters = np.array(self._centers, dtype=np.float32, order='C')
 
     def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
                         last_chunk, ipass, Y=None, stride=1):
-        # first pass: gather data and run k-means
         if ipass == 0:
-            # beginning - compute
-            if first_chunk:
-                memreq = 1e-6 * 2 * X[0, :].nbytes * self.n_frames_total(stride=stride)
-                self._logger.warn('K-means implementation is currently memory inefficient.'
-                                  ' This calculation needs %i megabytes of main memory.'
-                                  ' If you get a memory error, try using a larger stride.'
-                                  % memreq)
-
-            # appends a true copy
-            self._chunks.append(X[:, :])
-
-            # run k-means in the end
-            if last_chunk:
-                # concatenate all data
-                alldata = np.vstack(self._chunks)
-                # free part of the memory
-                del self._chunks
-                # run k-means with all the data
-                self._logger.info("Accumulated all data, running kmeans on "+str(alldata.shape))
-                self._algo.fit(alldata)
-
-            # done
+            self._sample(X)
             if last_chunk:
+                self._seed()
+            return False
+
+        if first_chunk:
+            self._begin_pass()
+        if len(X) > 0:
+            self._add_chunk(X)
+        if last_chunk:
+            self._end_pass()
+            shift = np.max(np.sqrt(np.sum((self._centers - self._centers_before) ** 2, axis=1)))
+            self._logger.debug("pass %i: maximum center shift %g" % (ipass, shift))
+            if shift <= self.tolerance:
+                self._logger.info("converged after %i passes" % ipass)
+                return True
+            if ipass >= self.max_iter:
+                self._logger.info("stopped after %i passes, maximum center shift %g"
+                                  % (ipass, shift))
                 return True
+        return False
 
     def _param_finish(self):
-        self.clustercenters = self._algo.cluster_centers_
+        self.clustercenters = np.array(self._centers, dtype=np.float32, order='C')
+        self._sums = None
+        self._counts = None
+        # the dtrajs of a previous estimation are outdated
+        self._dtrajs = []
+
+
+class MiniBatchKmeansClustering(KmeansClustering):
+    r"""
+    Mini-batch k-means clustering, streaming through the data
+
+    The centers are seeded as in :class:`KmeansClustering`. Every further
+    pass streams through the data in chunks. Each chunk is a mini batch: its
+    frames are assigned to the closest centers, which are then moved towards
+    the mean of their assigned frames with a per-center learning rate of
+    1 / (number of frames assigned so far) [1]_. In contrast to Lloyd
+    iterations, the centers move after every chunk, so usually fewer passes
+    are needed.
+
+    Parameters
+    ----------
+    n_clusters : int
+        amount of cluster centers
+    max_iter : int, default = 10
+        maximum number of passes through the data updating the centers
+    tolerance : float, default = 1e-5
+        stop when no center has moved further than this during a pass
+    reservoir_size : int, optional, default = None
+        number of frames sampled for the k-means++ seeding. By default
+        max(10 * n_clusters, 1000).
+    metric : str
+        metric to use during clustering ('euclidean', 'minRMSD')
+
+    Notes
+    -----
+    The size of the mini batches is the chunksize of the data producer.
+
+    References
+    ----------
+    .. [1] Sculley, D. 2010. Web-scale k-means clustering.
+        Proceedings of the 19th International Conference on World Wide Web, 1177-1178.
+
+    """
+
+    def __init__(self, n_clusters, max_iter=10, tolerance=1e-5, reservoir_size=None, metric='euclidean'):
+        super(MiniBatchKmeansClustering, self).__init__(n_clusters, max_iter=max_iter, metric=metric,
+                                                        tolerance=tolerance, reservoir_size=reservoir_size)
+
+    def describe(self):
+        return "[MiniBatchKmeans, k=%i]" % self.n_clusters
+
+    def _begin_pass(self):
+        self._centers_before = self._centers.copy()
+        if self._total_counts is None:
+            self._total_counts = np.zeros(self.n_clusters, dtype=np.int64)
+
+    def _add_chunk(self, X):
+        """ moves the centers towards the means of the chunk frames assigned to them """
+        self._sums[:] = 0
+        self._counts[:] = 0
+        self._accumulate(X)
+        moved = self._counts > 0
+        self._total_counts += self._counts
+        self._centers[moved] += (self._sums[moved] - self._counts[moved, None] * self._centers[moved]) \
+            / self._total_counts[moved, None]
+        self.clustercenters = np.array(self._centers, dtype=np.float32, order='C')
+
+    def _end_pass(self):
+        pass
+
+    def _param_init(self):
+        super(MiniBatchKmeansClustering, self)._param_init()
+        self._total_counts = None
+
+
+class CoresetKmeansClustering(KmeansClustering):
+    r"""
+    k-means clustering on a coreset, a small weighted summary of the data
+
+    The first pass seeds a preliminary solution from a uniform random sample
+    of the data, as in :class:`KmeansClustering`. The second pass streams
+    through all frames once and draws the coreset by importance sampling: a
+    frame x is sampled with a probability proportional to
+    :math:`q(x) = d(x, B)^2 + \overline{d^2}`, where :math:`d(x, B)` is its
+    distance to the closest preliminary center and :math:`\overline{d^2}`
+    the mean of these squared distances, estimated from the sample [1]_. Far
+    away frames, which matter most for the k-means cost, are therefore kept
+    preferably. The sampling is done by a weighted reservoir [2]_, so the
+    memory requirement only depends on the coreset size. Each sampled frame
+    gets the weight :math:`\sum_y q(y) / (m\,q(x))`, where m is the coreset
+    size, such that the weighted coreset approximates the k-means cost of
+    the full data. Finally, weighted Lloyd iterations run on the coreset in
+    memory.
+
+    Only two passes through the data are needed, independent of the number
+    of iterations.
+
+    Parameters
+    ----------
+    n_clusters : int
+        amount of cluster centers
+    coreset_size : int, optional, default = None
+        number of frames in the coreset. By default max(200 * n_clusters, 10000).
+    max_iter : int, default = 100
+        maximum number of Lloyd iterations on the coreset
+    tolerance : float, default = 1e-5
+        stop when no center has moved further than this during an iteration
+    reservoir_size : int, optional, default = None
+        number of frames sampled for the preliminary solution. By default
+        max(10 * n_clusters, 1000).
+
+    Notes
+    -----
+    Only the Euclidean metric is supported.
+
+    References
+    ----------
+    .. [1] Bachem, O., M. Lucic and A. Krause. 2018. Scalable k-means clustering via lightweight coresets.
+        Proceedings of the 24th ACM SIGKDD International Conference on Knowledge Discovery & Data Mining,
+        1119-1127.
+    .. [2] Efraimidis, P. S. and P. G. Spirakis. 2006. Weighted random sampling with a reservoir.
+        Information Processing Letters 97, 181-185.
+
+    """
+
+    def __init__(self, n_clusters, coreset_size=None, max_iter=100, tolerance=1e-5, reservoir_size=None):
+        super(CoresetKmeansClustering, self).__init__(n_clusters, max_iter=max_iter, metric='euclidean',
+                                                      tolerance=tolerance, reservoir_size=reservoir_size)
+        if coreset_size is None:
+            coreset_size = max(200 * n_clusters, 10000)
+        if coreset_size < n_clusters:
+            raise ValueError("coreset_size (%i) has to be at least n_clusters (%i)"
+                             % (coreset_size, n_clusters))
+        self.coreset_size = coreset_size
+
+    def describe(self):
+        return "[CoresetKmeans, k=%i, coreset size=%i]" % (self.n_clusters, self.coreset_size)
+
+    def _get_constant_memory(self):
+        # additionally the coreset, its sampling keys and probabilities
+        dim = self.data_producer.dimension()
+        return super(CoresetKmeansClustering, self)._get_constant_memory() \
+            + 8 * self.coreset_size * (dim + 2)
+
+    def _seed(self):
+        sample = self._reservoir[:min(self._n_seen, self.reservoir_size)]
+        super(CoresetKmeansClustering, self)._seed()
+        # offset of the sampling probabilities: the mean squared distance to the preliminary centers
+        self._d2_mean = np.mean(_closest_sq_distances(sample, self._centers)[0])
+        if self._d2_mean == 0:
+            # the preliminary centers cover all sampled frames, sample uniformly
+            self._d2_mean = 1.0
+        self._coreset = np.empty((0, self._centers.shape[1]))
+        self._keys = np.empty(0)
+        self._q = np.empty(0)
+        self._q_total = 0.0
+        self._n_frames = 0
+
+    def _sample_coreset(self, X):
+        """ adds a chunk to the weighted reservoir: every frame gets the key
+        log(u) / q with u uniform in (0, 1], the frames with the largest keys
+        form the coreset """
+        q = _closest_sq_distances(X, self._centers)[0] + self._d2_mean
+        self._q_total += q.sum()
+        self._n_frames += X.shape[0]
+        keys = np.log(1.0 - np.random.random_sample(X.shape[0])) / q
+        m = self.coreset_size
+        if len(self._keys) < m:
+            # still filling the reservoir
+            keys = np.concatenate((self._keys, keys))
+            coreset = np.concatenate((self._coreset, X))
+            q = np.concatenate((self._q, q))
+            if len(keys) > m:
+                keep = np.argpartition(keys, len(keys) - m)[-m:]
+                keys, coreset, q = keys[keep], coreset[keep], q[keep]
+            self._keys, self._coreset, self._q = keys, coreset, q
+            return
+        # only frames with a key above the smallest one in the reservoir enter it,
+        # each replacing one of the frames with the smallest keys
+        candidates = np.where(keys > self._keys.min())[0]
+        if len(candidates) == 0:
+            return
+        all_keys = np.concatenate((self._keys, keys[candidates]))
+        keep = np.argpartition(all_keys, len(all_keys) - m)[-m:]
+        entering = candidates[keep[keep >= m] - m]
+        leaving = np.ones(m, dtype=bool)
+        leaving[keep[keep < m]] = False
+        leaving = np.where(leaving)[0]
+        self._keys[leaving] = keys[entering]
+        self._coreset[leaving] = X[entering]
+        self._q[leaving] = q[entering]
+
+    def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
+                        last_chunk, ipass, Y=None, stride=1):
+        if ipass == 0:
+            self._sample(X)
+            if last_chunk:
+                self._seed()
+            return False
+
+        if len(X) > 0:
+            self._sample_coreset(X)
+        if last_chunk:
+            if self._n_frames <= self.coreset_size:
+                # all frames are in the coreset
+                weights = np.ones(self._n_frames)
+            else:
+                weights = self._q_total / (self.coreset_size * self._q)
+            self._centers, n_iter = _weighted_lloyd(self._coreset, weights, self._centers,
+                                                    self.max_iter, self.tolerance)
+            self._logger.info("%i Lloyd iterations on a coreset of %i frames"
+                              % (n_iter, len(self._coreset)))
+            return True
+        return False
+
+    def _param_finish(self):
+        super(CoresetKmeansClustering, self)._param_finish()
+        self._coreset = None
+        self._keys = None
+        self._q = None
+
+
+def _split_clusters(k, counts):
+    """ distributes k clusters over cells in proportion to their numbers of
+    frames: every cell with frames gets at least one cluster, no cell more
+    clusters than frames """
+    share = k * counts / float(counts.sum())
+    n = np.minimum(np.floor(share).astype(int), counts)
+    n[(counts > 0) & (n == 0)] = 1
+    # hand out the remaining clusters by largest remainder, or take away the
+    # surplus from the most overserved cells
+    while n.sum() < k:
+        open_cells = n < counts
+        if not open_cells.any():
+            break
+        n[np.argmax(np.where(open_cells, share - n, -np.inf))] += 1
+    while n.sum() > k:
+        open_cells = n > 1
+        if not open_cells.any():
+            break
+        n[np.argmax(np.where(open_cells, n - share, -np.inf))] -= 1
+    return n
+
+
+class HierarchicalKmeansClustering(KmeansClustering):
+    r"""
+    Two-level k-means clustering for very large numbers of clusters
+
+    The space is first partitioned into coarse cells by k-means with about
+    sqrt(n_clusters) centers. The cluster centers are then found by
+    independent k-means runs within the coarse cells, which are executed in
+    parallel threads. Every cell gets a number of clusters proportional to
+    its population.
+
+    Both levels are seeded from a uniform random sample of the data
+    (reservoir sampling), where k-means++ and Lloyd iterations run in memory.
+    Every further pass through the data is a Lloyd iteration of the fine
+    centers, as in :class:`KmeansClustering`, while the coarse cells stay
+    fixed.
+
+    Frames are assigned in two levels, first to the closest coarse center,
+    then to the closest cluster center within that coarse cell. This costs
+    about 2 sqrt(n_clusters) instead of n_clusters distance computations per
+    frame. The assignment is not the exact Voronoi partition of the cluster
+    centers: frames close to the border of a coarse cell may have a closer
+    center in the neighboring cell.
+
+    Parameters
+    ----------
+    n_clusters : int
+        amount of cluster centers
+    n_coarse : int, optional, default = None
+        number of coarse cells. By default ceil(sqrt(n_clusters)).
+    max_iter : int, default = 5
+        maximum number of passes through the data updating the centers
+    tolerance : float, default = 1e-5
+        stop when no center has moved further than this during a pass
+    reservoir_size : int, optional, default = None
+        number of frames sampled for the seeding. By default
+        max(10 * n_clusters, 1000).
+
+    Notes
+    -----
+    Only the Euclidean metric is supported.
+
+    """
+
+    # maximum number of Lloyd iterations on the sample
+    _sample_max_iter = 100
+
+    def __init__(self, n_clusters, n_coarse=None, max_iter=5, tolerance=1e-5, reservoir_size=None):
+        super(HierarchicalKmeansClustering, self).__init__(n_clusters, max_iter=max_iter, metric='euclidean',
+                                                           tolerance=tolerance, reservoir_size=reservoir_size)
+        if n_coarse is None:
+            n_coarse = int(np.ceil(np.sqrt(n_clusters)))
+        if not 1 <= n_coarse <= n_clusters:
+            raise ValueError("n_coarse (%i) has to be between 1 and n_clusters (%i)" % (n_coarse, n_clusters))
+        self.n_coarse = n_coarse
+
+    def describe(self):
+        return "[HierarchicalKmeans, k=%i, coarse k=%i]" % (self.n_clusters, self.n_coarse)
+
+    def _kmeans_sample(self, X, k):
+        """ k-means++ and Lloyd iterations on frames in memory """
+        centers = _kmeans_plusplus(X, k)
+        return _weighted_lloyd(X, np.ones(X.shape[0]), centers, self._sample_max_iter, self.tolerance)[0]
+
+    def _seed(self):
+        from multiprocessing import cpu_count
+        from multiprocessing.pool import ThreadPool
+
+        sample = self._reservoir[:min(self._n_seen, self.reservoir_size)]
+        del self._reservoir
+        if self.n_clusters > len(sample):
+            self._logger.info('Requested more clusters (k = %i) than there are total data points %i.'
+                              ' Will do clustering with k = %i' % (self.n_clusters, len(sample), len(sample)))
+            self.n_clusters = len(sample)
+        n_coarse = min(self.n_coarse, self.n_clusters)
+
+        coarse = self._kmeans_sample(sample, n_coarse)
+        cells = np.empty(len(sample), dtype=np.int32)
+        _assign_euclidean(sample, coarse, cells)
+        n_fine = _split_clusters(self.n_clusters, np.bincount(cells, minlength=n_coarse))
+        # empty coarse cells are dropped
+        populated = np.where(n_fine > 0)[0]
+
+        pool = ThreadPool(min(cpu_count(), len(populated)))
+        try:
+            fine = pool.map(lambda c: self._kmeans_sample(sample[cells == c], n_fine[c]), populated)
+        finally:
+            pool.close()
+
+        self._coarse_centers = np.array(coarse[populated], dtype=np.float32, order='C')
+        # the cluster centers of coarse cell c are clustercenters[offsets[c]:offsets[c + 1]]
+        self._cell_offsets = np.concatenate(([0], np.cumsum(n_fine[populated])))
+        self._centers = np.vstack(fine)
+        self.n_clusters = len(self._centers)
+        self.clustercenters = np.array(self._centers, dtype=np.float32, order='C')
+        self._sums = np.zeros_like(self._centers)
+        self._counts = np.zeros(self.n_clusters, dtype=np.int64)
+
+    def _assign_two_level(self, X):
+        """ assigns X to the closest center within the closest coarse cell """
+        X = np.asarray(X, dtype=np.float32)
+        cells = np.empty(X.shape[0], dtype=np.int32)
+        _assign_euclidean(X, self._coarse_centers, cells)
+        dtraj = np.empty(X.shape[0], dtype=np.int32)
+        # process the frames cell by cell
+        order = np.argsort(cells, kind='mergesort')
+        bounds = np.searchsorted(cells[order], np.arange(len(self._coarse_centers) + 1))
+        for c in np.where(np.diff(bounds) > 0)[0]:
+            frames = order[bounds[c]:bounds[c + 1]]
+            begin, end = self._cell_offsets[c], self._cell_offsets[c + 1]
+            local = np.empty(len(frames), dtype=np.int32)
+            _assign_euclidean(X[frames], self.clustercenters[begin:end], local)
+            dtraj[frames] = local + begin
+        return dtraj
+
+    def _accumulate(self, X):
+        """ adds the chunk frames to the sums of their centers """
+        _add_to_centers(X, self._assign_two_level(X), self._sums, self._counts)
+
+    def _assignment_description(self):
+        return "two-level euclidean, coarse centers %s" % arrays_digest(self._coarse_centers, self._cell_offsets)
 
     def _map_array(self, X):
-        d = self._algo.predict(X)
-        if d.dtype != self.output_type():
-            d = d.astype(self.output_type())  # convert type if necessary
-        return d[:,None]  # always return a column vector in this function
\ No newline at end of file
+        """ two-level assignment of the frames to the cluster centers """
+        return self._assign_two_level(X).astype(self.output_type())[:, None]
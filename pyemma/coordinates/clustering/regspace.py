@@ -73,12 +73,13 @@ class RegularSpaceClustering(AbstractClustering):
 
     """
 
+    # initial number of rows of the center buffer
+    _INITIAL_CAPACITY = 64
+
     def __init__(self, dmin, max_clusters=1000, metric='euclidean'):
         super(RegularSpaceClustering, self).__init__(metric=metric)
 
         self._dmin = dmin
-        # temporary list to store cluster centers
-        self._clustercenters = []
         self.max_clusters = max_clusters
 
     @doc_inherit
@@ -117,6 +118,29 @@ class RegularSpaceClustering(AbstractClustering):
         :return:
         """
         self._logger.info("Running regular space clustering")
+        # temporary buffer to store cluster centers, grown by doubling, and
+        # the distances of the centers to the first one, used for pruning
+        self._center_buffer = None
+        self._pivot_buffer = None
+        self._n_centers = 0
+
+    def _grow_center_buffer(self, dim):
+        if self._center_buffer is None:
+            capacity = min(self._INITIAL_CAPACITY, self.max_clusters)
+            self._center_buffer = np.empty((capacity, dim), dtype=np.float32)
+            self._pivot_buffer = np.empty(capacity, dtype=np.float32)
+            return
+        capacity = min(2 * self._center_buffer.shape[0], self.max_clusters)
+        buffer = np.empty((capacity, dim), dtype=np.float32)
+        buffer[:self._n_centers] = self._center_buffer[:self._n_centers]
+        self._center_buffer = buffer
+        pivots = np.empty(capacity, dtype=np.float32)
+        pivots[:self._n_centers] = self._pivot_buffer[:self._n_centers]
+        self._pivot_buffer = pivots
+
+    def _store_centers(self):
+        self.clustercenters = self._center_buffer[:self._n_centers].copy()
+        self.n_clusters = self._n_centers
 
     def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj, last_chunk, ipass, Y=None, stride=1):
         """
@@ -127,14 +151,22 @@ class RegularSpaceClustering(AbstractClustering):
         second pass: assign data to discrete trajectories
         """
         if ipass == 0:
+            X = X.astype(np.float32, order='C', copy=False)
+            if self._center_buffer is None:
+                self._grow_center_buffer(X.shape[1])
             try:
-                regspatial.cluster(X.astype(np.float32, order='C', copy=False),
-                                   self._clustercenters, self._dmin,
-                                   self.metric, self.max_clusters)
+                while X.shape[0] > 0:
+                    self._n_centers, n_processed = regspatial.cluster(
+                        X, self._center_buffer, self._pivot_buffer, self._n_centers,
+                        self._dmin, self.metric, self.max_clusters)
+                    if n_processed == X.shape[0]:
+                        break
+                    # buffer is full, continue with the remaining frames
+                    self._grow_center_buffer(X.shape[1])
+                    X = X[n_processed:]
                 # finished regularly
                 if last_chunk:
-                    self.clustercenters = np.array(self._clustercenters)
-                    self.n_clusters = self.clustercenters.shape[0]
+                    self._store_centers()
                     return True  # finished!
             except RuntimeError:
                 msg = 'Maximum number of cluster centers reached.' \
@@ -143,11 +175,13 @@ class RegularSpaceClustering(AbstractClustering):
                 self._logger.warning(msg)
                 warnings.warn(msg)
                 # finished anyway, because we have no more space for clusters. Rest of trajectory has no effect
-                self.clustercenters = np.array(self._clustercenters)
-                self.n_clusters = self.clustercenters.shape[0]
+                self._n_centers = self.max_clusters
+                self._store_centers()
                 return True
 
         return False
 
     def _param_finish(self):
-        del self._clustercenters  # delete temporary
\ No newline at end of file
+        # delete temporaries
+        del self._center_buffer
+        del self._pivot_buffer
\ No newline at end of file
@@ -52,50 +52,82 @@ float minRMSD_distance(float *SKP_restrict a, float *SKP_restrict b, size_t n, f
     return sqrt(msd);
 }
 
-int c_assign(float *chunk, float *centers, npy_int64 *dtraj, char* metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim) {
+/* minRMSD assignment: the centers are centered and traced once, every frame
+   is centered once in a scratch buffer of the thread that handles it */
+static int c_assign_minRMSD(float *chunk, float *centers, npy_int32 *dtraj, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim) {
     int ret;
-    float d, mindist;
-    size_t argmin;
-    float *buffer_a, *buffer_b;
-    float (*distance)(float*, float*, size_t, float*, float*);
+    float *centered, *traces;
+    Py_ssize_t n_atoms;
 
-    buffer_a = NULL; buffer_b = NULL;
     ret = ASSIGN_SUCCESS;
+    n_atoms = dim/3;
+    centered = malloc(N_centers*dim*sizeof(float));
+    traces = malloc(N_centers*sizeof(float));
+    if(!centered || !traces) { ret = ASSIGN_ERR_NO_MEMORY; goto error; }
+    memcpy(centered, centers, N_centers*dim*sizeof(float));
+    inplace_center_and_trace_atom_major(centered, traces, N_centers, n_atoms);
 
-    /* init metric */
-    if(strcmp(metric,"euclidean")==0) {
-        distance = euclidean_distance;
-    } else if(strcmp(metric,"minRMSD")==0) {
-        distance = minRMSD_distance;
-        buffer_a = malloc(dim*sizeof(float));
-        buffer_b = malloc(dim*sizeof(float));
-        if(!buffer_a || !buffer_b) {
-            ret = ASSIGN_ERR_NO_MEMORY; goto error;
+    #pragma omp parallel
+    {
+        float *frame;
+        float trace, msd, minmsd;
+        Py_ssize_t i, j, argmin;
+
+        frame = malloc(dim*sizeof(float));
+        if(!frame) {
+            #pragma omp critical
+            ret = ASSIGN_ERR_NO_MEMORY;
         }
-    } else {
-        ret = ASSIGN_ERR_INVALID_METRIC;
-        goto error;
+
+        #pragma omp for
+        for(i = 0; i < N_frames; ++i) {
+            if(!frame) continue;
+            memcpy(frame, &chunk[i*dim], dim*sizeof(float));
+            inplace_center_and_trace_atom_major(frame, &trace, 1, n_atoms);
+            minmsd = FLT_MAX;
+            argmin = -1;
+            for(j = 0; j < N_centers; ++j) {
+                msd = msd_atom_major(n_atoms, n_atoms, frame, &centered[j*dim], trace, traces[j], 0, NULL);
+                if(msd<minmsd) { minmsd = msd; argmin = j; }
+            }
+            dtraj[i] = argmin;
+        }
+        free(frame);
+    }
+
+error:
+    free(centered);
+    free(traces);
+    return ret;
+}
+
+int c_assign(float *chunk, float *centers, npy_int32 *dtraj, char* metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim) {
+    float d, mindist;
+    size_t argmin;
+
+    if(strcmp(metric,"minRMSD")==0) {
+        return c_assign_minRMSD(chunk, centers, dtraj, N_frames, N_centers, dim);
+    }
+    if(strcmp(metric,"euclidean")!=0) {
+        return ASSIGN_ERR_INVALID_METRIC;
     }
 
     /* do the assignment */
     {
         Py_ssize_t i,j;
-        #pragma omp parallel for private(i,j,mindist,argmin)
+        #pragma omp parallel for private(i,j,d,mindist,argmin)
         for(i = 0; i < N_frames; ++i) {
             mindist = FLT_MAX;
             argmin = -1;
             for(j = 0; j < N_centers; ++j) {
-                d = distance(&chunk[i*dim], &centers[j*dim], dim, buffer_a, buffer_b);
+                d = euclidean_distance(&chunk[i*dim], &centers[j*dim], dim, NULL, NULL);
                 if(d<mindist) { mindist = d; argmin = j; }
             }
             dtraj[i] = argmin;
         }
     }
 
-error:
-    free(buffer_a);
-    free(buffer_b);
-    return ret;
+    return ASSIGN_SUCCESS;
 }
 
 PyObject *assign(PyObject *self, PyObject *args) {
@@ -105,7 +137,7 @@ PyObject *assign(PyObject *self, PyObject *args) {
     Py_ssize_t N_centers, N_frames, dim;
     float *chunk;
     float *centers;
-    npy_int64 *dtraj;
+    npy_int32 *dtraj;
     char *metric;
 
     py_centers = NULL; py_res = NULL;
@@ -127,14 +159,14 @@ PyObject *assign(PyObject *self, PyObject *args) {
     chunk = PyArray_DATA(np_chunk);
 
     /* import dtraj */
-    if(PyArray_TYPE(np_dtraj)!=NPY_INT64) { PyErr_SetString(PyExc_ValueError, "dtype of \"dtraj\" isn\'t int (64)."); goto error; };
+    if(PyArray_TYPE(np_dtraj)!=NPY_INT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"dtraj\" isn\'t int (32)."); goto error; };
     if(!PyArray_ISBEHAVED_RO(np_dtraj) ) { PyErr_SetString(PyExc_ValueError, "\"dtraj\" isn\'t behaved."); goto error; };
     if(PyArray_NDIM(np_dtraj)!=1) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"dtraj\" isn\'t 1."); goto error; };
     if(np_chunk->dimensions[0]!=N_frames) {
         PyErr_SetString(PyExc_ValueError, "Size of \"dtraj\" differs from number of frames in \"chunk\".");
         goto error;
     }
-    dtraj = (npy_int64*)PyArray_DATA(np_dtraj);
+    dtraj = (npy_int32*)PyArray_DATA(np_dtraj);
 
     /* import list of cluster centers */
     np_centers = (PyArrayObject*)PyArray_ContiguousFromAny(py_centers, NPY_FLOAT32, 2, 2);
@@ -167,4 +199,262 @@ PyObject *assign(PyObject *self, PyObject *args) {
     /* fall through */
 error:
     return py_res;
-}
\ No newline at end of file
+}
+
+int c_minRMSD_distances(float *chunk, float *refs, float *ref_traces, float *out, Py_ssize_t out_stride, Py_ssize_t N_frames, Py_ssize_t N_refs, Py_ssize_t dim) {
+    float *buffer, *traces;
+    float msd;
+    Py_ssize_t i, j, n_atoms;
+
+    n_atoms = dim/3;
+    buffer = malloc(N_frames*dim*sizeof(float));
+    traces = malloc(N_frames*sizeof(float));
+    if(!buffer || !traces) {
+        free(buffer);
+        free(traces);
+        return ASSIGN_ERR_NO_MEMORY;
+    }
+
+    /* center every frame once */
+    memcpy(buffer, chunk, N_frames*dim*sizeof(float));
+    inplace_center_and_trace_atom_major(buffer, traces, N_frames, n_atoms);
+
+    #pragma omp parallel for private(i,j,msd)
+    for(i = 0; i < N_frames; ++i) {
+        for(j = 0; j < N_refs; ++j) {
+            msd = msd_atom_major(n_atoms, n_atoms, &buffer[i*dim], &refs[j*dim], traces[i], ref_traces[j], 0, NULL);
+            out[i*out_stride + j] = msd > 0 ? sqrt(msd) : 0.0f;
+        }
+    }
+
+    free(buffer);
+    free(traces);
+    return ASSIGN_SUCCESS;
+}
+
+PyObject *minRMSD_distances(PyObject *self, PyObject *args) {
+
+    PyObject *py_res;
+    PyArrayObject *np_chunk, *np_refs, *np_traces, *np_out;
+    Py_ssize_t N_frames, N_refs, dim, out_stride;
+
+    py_res = NULL;
+    np_chunk = NULL; np_refs = NULL; np_traces = NULL; np_out = NULL;
+
+    if (!PyArg_ParseTuple(args, "O!O!O!O!", &PyArray_Type, &np_chunk, &PyArray_Type, &np_refs,
+                          &PyArray_Type, &np_traces, &PyArray_Type, &np_out)) goto error; /* ref:borr. */
+
+    /* import chunk */
+    if(PyArray_TYPE(np_chunk)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"chunk\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY_RO(np_chunk) ) { PyErr_SetString(PyExc_ValueError, "\"chunk\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_chunk)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"chunk\" isn\'t 2."); goto error;  };
+    N_frames = np_chunk->dimensions[0];
+    dim = np_chunk->dimensions[1];
+    if(dim==0 || dim%3!=0) {
+        PyErr_SetString(PyExc_ValueError, "chunk dimension must be a positive multiple of three.");
+        goto error;
+    }
+
+    /* import references and their traces */
+    if(PyArray_TYPE(np_refs)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"references\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY_RO(np_refs) ) { PyErr_SetString(PyExc_ValueError, "\"references\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_refs)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"references\" isn\'t 2."); goto error;  };
+    N_refs = np_refs->dimensions[0];
+    if(np_refs->dimensions[1]!=dim) {
+        PyErr_SetString(PyExc_ValueError, "Dimension of references doesn\'t match dimension of frames.");
+        goto error;
+    }
+    if(PyArray_TYPE(np_traces)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"ref_traces\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY_RO(np_traces) ) { PyErr_SetString(PyExc_ValueError, "\"ref_traces\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_traces)!=1 || np_traces->dimensions[0]!=N_refs) {
+        PyErr_SetString(PyExc_ValueError, "\"ref_traces\" must contain one element per reference.");
+        goto error;
+    }
+
+    /* import output, rows may be strided */
+    if(PyArray_TYPE(np_out)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"out\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISBEHAVED(np_out) ) { PyErr_SetString(PyExc_ValueError, "\"out\" isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_out)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"out\" isn\'t 2."); goto error;  };
+    if(np_out->dimensions[0]!=N_frames || np_out->dimensions[1]!=N_refs) {
+        PyErr_SetString(PyExc_ValueError, "Shape of \"out\" has to be (number of frames, number of references).");
+        goto error;
+    }
+    if(N_refs>1 && PyArray_STRIDES(np_out)[1]!=sizeof(float)) {
+        PyErr_SetString(PyExc_ValueError, "Rows of \"out\" have to be contiguous.");
+        goto error;
+    }
+    out_stride = PyArray_STRIDES(np_out)[0]/sizeof(float);
+
+    switch(c_minRMSD_distances((float*)PyArray_DATA(np_chunk), (float*)PyArray_DATA(np_refs),
+                               (float*)PyArray_DATA(np_traces), (float*)PyArray_DATA(np_out),
+                               out_stride, N_frames, N_refs, dim)) {
+        case ASSIGN_ERR_NO_MEMORY:
+            PyErr_NoMemory();
+            goto error;
+    }
+
+    py_res = Py_BuildValue(""); /* =None */
+    /* fall through */
+error:
+    return py_res;
+}
+
+/* rotates a centered structure in atom major layout in place */
+static void rotate_atom_major(float *xyz, const float rot[9], Py_ssize_t n_atoms)
+{
+    Py_ssize_t k;
+    float x, y, z;
+
+    for(k = 0; k < n_atoms; ++k) {
+        x = xyz[3*k]; y = xyz[3*k+1]; z = xyz[3*k+2];
+        xyz[3*k]   = x*rot[0] + y*rot[1] + z*rot[2];
+        xyz[3*k+1] = x*rot[3] + y*rot[4] + z*rot[5];
+        xyz[3*k+2] = x*rot[6] + y*rot[7] + z*rot[8];
+    }
+}
+
+int c_kmeans_accumulate(float *chunk, float *centers, double *sums, npy_int64 *counts, char *metric, Py_ssize_t N_frames, Py_ssize_t N_centers, Py_ssize_t dim) {
+    int ret, minrmsd;
+    npy_int32 *dtraj;
+    float *centered, *traces;
+    Py_ssize_t n_atoms;
+
+    dtraj = NULL; centered = NULL; traces = NULL;
+    n_atoms = dim/3;
+
+    dtraj = malloc(N_frames*sizeof(npy_int32));
+    if(!dtraj) { ret = ASSIGN_ERR_NO_MEMORY; goto error; }
+    ret = c_assign(chunk, centers, dtraj, metric, N_frames, N_centers, dim);
+    if(ret!=ASSIGN_SUCCESS) goto error;
+
+    minrmsd = strcmp(metric,"minRMSD")==0;
+    if(minrmsd) {
+        /* center the cluster centers once */
+        centered = malloc(N_centers*dim*sizeof(float));
+        traces = malloc(N_centers*sizeof(float));
+        if(!centered || !traces) { ret = ASSIGN_ERR_NO_MEMORY; goto error; }
+        memcpy(centered, centers, N_centers*dim*sizeof(float));
+        inplace_center_and_trace_atom_major(centered, traces, N_centers, n_atoms);
+    }
+
+    #pragma omp parallel
+    {
+        double *local_sums;
+        npy_int64 *local_counts;
+        float *frame;
+        float trace, rot[9];
+        Py_ssize_t i, j, k;
+
+        /* per-thread buffers, so the threads don't compete for the sums */
+        local_sums = calloc(N_centers*dim, sizeof(double));
+        local_counts = calloc(N_centers, sizeof(npy_int64));
+        frame = malloc(dim*sizeof(float));
+        if(!local_sums || !local_counts || !frame) {
+            #pragma omp critical
+            ret = ASSIGN_ERR_NO_MEMORY;
+        }
+
+        #pragma omp for
+        for(i = 0; i < N_frames; ++i) {
+            if(!local_sums || !local_counts || !frame) continue;
+            j = dtraj[i];
+            memcpy(frame, &chunk[i*dim], dim*sizeof(float));
+            if(minrmsd) {
+                inplace_center_and_trace_atom_major(frame, &trace, 1, n_atoms);
+                msd_atom_major(n_atoms, n_atoms, &centered[j*dim], frame, traces[j], trace, 1, rot);
+                rotate_atom_major(frame, rot, n_atoms);
+            }
+            for(k = 0; k < dim; ++k) {
+                local_sums[j*dim + k] += frame[k];
+            }
+            local_counts[j]++;
+        }
+
+        if(local_sums && local_counts) {
+            #pragma omp critical
+            {
+                for(k = 0; k < N_centers*dim; ++k) sums[k] += local_sums[k];
+                for(k = 0; k < N_centers; ++k) counts[k] += local_counts[k];
+            }
+        }
+        free(local_sums);
+        free(local_counts);
+        free(frame);
+    }
+
+error:
+    free(dtraj);
+    free(centered);
+    free(traces);
+    return ret;
+}
+
+PyObject *kmeans_accumulate(PyObject *self, PyObject *args) {
+
+    PyObject *py_res;
+    PyArrayObject *np_chunk, *np_centers, *np_sums, *np_counts;
+    Py_ssize_t N_centers, N_frames, dim;
+    char *metric;
+
+    py_res = NULL;
+    np_chunk = NULL; np_centers = NULL; np_sums = NULL; np_counts = NULL;
+    metric = "";
+
+    if (!PyArg_ParseTuple(args, "O!O!O!O!s", &PyArray_Type, &np_chunk, &PyArray_Type, &np_centers,
+                          &PyArray_Type, &np_sums, &PyArray_Type, &np_counts, &metric)) goto error; /* ref:borr. */
+
+    /* import chunk */
+    if(PyArray_TYPE(np_chunk)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"chunk\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY_RO(np_chunk) ) { PyErr_SetString(PyExc_ValueError, "\"chunk\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_chunk)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"chunk\" isn\'t 2."); goto error;  };
+    N_frames = np_chunk->dimensions[0];
+    dim = np_chunk->dimensions[1];
+    if(dim==0) {
+        PyErr_SetString(PyExc_ValueError, "chunk dimension must be larger than zero.");
+        goto error;
+    }
+
+    /* import cluster centers */
+    if(PyArray_TYPE(np_centers)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"centers\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY_RO(np_centers) ) { PyErr_SetString(PyExc_ValueError, "\"centers\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_centers)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"centers\" isn\'t 2."); goto error;  };
+    N_centers = np_centers->dimensions[0];
+    if(N_centers==0) {
+        PyErr_SetString(PyExc_ValueError, "centers must contain at least one element.");
+        goto error;
+    }
+    if(np_centers->dimensions[1]!=dim) {
+        PyErr_SetString(PyExc_ValueError, "Dimension of cluster centers doesn\'t match dimension of frames.");
+        goto error;
+    }
+
+    /* import sums and counts */
+    if(PyArray_TYPE(np_sums)!=NPY_FLOAT64) { PyErr_SetString(PyExc_ValueError, "dtype of \"sums\" isn\'t float (64)."); goto error; };
+    if(!PyArray_ISCARRAY(np_sums) ) { PyErr_SetString(PyExc_ValueError, "\"sums\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_sums)!=2 || np_sums->dimensions[0]!=N_centers || np_sums->dimensions[1]!=dim) {
+        PyErr_SetString(PyExc_ValueError, "Shape of \"sums\" has to be the shape of \"centers\".");
+        goto error;
+    }
+    if(PyArray_TYPE(np_counts)!=NPY_INT64) { PyErr_SetString(PyExc_ValueError, "dtype of \"counts\" isn\'t int (64)."); goto error; };
+    if(!PyArray_ISCARRAY(np_counts) ) { PyErr_SetString(PyExc_ValueError, "\"counts\" isn\'t C-style contiguous or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_counts)!=1 || np_counts->dimensions[0]!=N_centers) {
+        PyErr_SetString(PyExc_ValueError, "\"counts\" must contain one element per cluster center.");
+        goto error;
+    }
+
+    switch(c_kmeans_accumulate((float*)PyArray_DATA(np_chunk), (float*)PyArray_DATA(np_centers),
+                               (double*)PyArray_DATA(np_sums), (npy_int64*)PyArray_DATA(np_counts),
+                               metric, N_frames, N_centers, dim)) {
+        case ASSIGN_ERR_INVALID_METRIC:
+            PyErr_SetString(PyExc_ValueError, "metric must be one of \"euclidean\" or \"minRMSD\".");
+            goto error;
+        case ASSIGN_ERR_NO_MEMORY:
+            PyErr_NoMemory();
+            goto error;
+    }
+
+    py_res = Py_BuildValue(""); /* =None */
+    /* fall through */
+error:
+    return py_res;
+}
@@ -24,26 +24,54 @@
  */
 
 #include <clustering.h>
+#include <float.h>
+
+/* Slack of the triangle inequality pruning against rounding errors, in units
+ * of FLT_EPSILON. The rounding error of a single precision distance grows
+ * with its magnitude, so the slack is relative to the pivot distances and
+ * not only to the cutoff. */
+#define PRUNE_SLACK 16.0f
+
+/* Is frame x within cutoff of any of the centers [begin, end)? Centers are
+ * skipped without computing their distance if the triangle inequality
+ * |d(x,pivot) - d(c,pivot)| <= d(x,c) already proves them too far away. */
+static int covered(float *x, float *centers, float *center_pivot, Py_ssize_t begin, Py_ssize_t end,
+                   float x_pivot, float cutoff, size_t dim, float *buffer_a, float *buffer_b,
+                   float (*distance)(float*, float*, size_t, float*, float*))
+{
+    Py_ssize_t j;
+    float prune;
+
+    for(j = begin; j < end; ++j) {
+        prune = cutoff + PRUNE_SLACK*FLT_EPSILON*(cutoff + x_pivot + center_pivot[j]);
+        if(fabsf(x_pivot - center_pivot[j]) > prune) continue;
+        if(distance(x, &centers[j*dim], dim, buffer_a, buffer_b) <= cutoff) return 1;
+    }
+    return 0;
+}
 
 static PyObject *cluster(PyObject *self, PyObject *args) {
-    PyObject *py_centers, *py_item, *py_res;
-    PyArrayObject *np_chunk, *np_item, *np_new_center;
-    Py_ssize_t N_centers, N_frames, dim, i, j, max_clusters;
-    npy_intp new_dims[1];
+    PyObject *py_res;
+    PyArrayObject *np_chunk, *np_centers, *np_pivots;
+    Py_ssize_t N_centers, N_old_centers, N_frames, capacity, dim, i, max_clusters;
     float *chunk;
-    float **centers;
+    float *centers;
     char *metric;
-    float cutoff, mindist;
-    float d;
+    float cutoff;
     float *buffer_a, *buffer_b;
+    float *center_pivot, *frame_pivot;
+    char *is_covered;
+    int no_memory;
     float (*distance)(float*, float*, size_t, float*, float*);
 
-    py_centers = NULL; py_item = NULL; py_res = NULL;
-    np_chunk = NULL; np_item = NULL;
+    py_res = NULL;
+    np_chunk = NULL; np_centers = NULL; np_pivots = NULL;
     centers = NULL; metric=""; chunk = NULL;
     buffer_a = NULL; buffer_b = NULL;
+    center_pivot = NULL; frame_pivot = NULL; is_covered = NULL;
 
-    if (!PyArg_ParseTuple(args, "O!O!fsn", &PyArray_Type, &np_chunk, &PyList_Type, &py_centers, &cutoff, &metric, &max_clusters)) goto error; /* ref:borr. */
+    if (!PyArg_ParseTuple(args, "O!O!O!nfsn", &PyArray_Type, &np_chunk, &PyArray_Type, &np_centers,
+                          &PyArray_Type, &np_pivots, &N_centers, &cutoff, &metric, &max_clusters)) goto error; /* ref:borr. */
 
     if(cutoff<=0.0) {
         PyErr_SetString(PyExc_ValueError, "cutoff can\'t be zero or negative.");
@@ -62,6 +90,31 @@ static PyObject *cluster(PyObject *self, PyObject *args) {
     }
     chunk = PyArray_DATA(np_chunk);
 
+    /* import center buffer, its first N_centers rows are the centers found so far */
+    if(PyArray_TYPE(np_centers)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"centers\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY(np_centers) ) { PyErr_SetString(PyExc_ValueError, "\"centers\" isn\'t C-style contiguous, writeable or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_centers)!=2) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"centers\" isn\'t 2."); goto error;  };
+    if(np_centers->dimensions[1]!=dim) {
+        PyErr_SetString(PyExc_ValueError, "Dimension of cluster centers doesn\'t match dimension of frames.");
+        goto error;
+    }
+    capacity = np_centers->dimensions[0];
+    if(N_centers<0 || N_centers>capacity) {
+        PyErr_SetString(PyExc_ValueError, "n_centers must be between zero and the number of rows of \"centers\".");
+        goto error;
+    }
+    centers = PyArray_DATA(np_centers);
+
+    /* import pivot distances of the centers, kept by the caller between calls */
+    if(PyArray_TYPE(np_pivots)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of \"center_pivots\" isn\'t float (32)."); goto error; };
+    if(!PyArray_ISCARRAY(np_pivots) ) { PyErr_SetString(PyExc_ValueError, "\"center_pivots\" isn\'t C-style contiguous, writeable or isn\'t behaved."); goto error; };
+    if(PyArray_NDIM(np_pivots)!=1) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of \"center_pivots\" isn\'t 1."); goto error;  };
+    if(np_pivots->dimensions[0]!=capacity) {
+        PyErr_SetString(PyExc_ValueError, "Length of \"center_pivots\" doesn\'t match the number of rows of \"centers\".");
+        goto error;
+    }
+    center_pivot = PyArray_DATA(np_pivots);
+
     if(strcmp(metric,"euclidean")==0)
         distance = euclidean_distance;
     else if(strcmp(metric,"minRMSD")==0) {
@@ -75,57 +128,74 @@ static PyObject *cluster(PyObject *self, PyObject *args) {
         goto error;
     }
 
-    /* import list of cluster centers */
-    N_centers = PyList_Size(py_centers);
-    centers = malloc(N_centers*sizeof(float*));
-    if(!centers) { PyErr_NoMemory(); goto error; }
-
-    for(i = 0; i < N_centers; ++i) {
-        py_item = PyList_GetItem(py_centers,i); /* ref:borr. */
-        if(!py_item) goto error;
-        if(!PyArray_Check(py_item)) { PyErr_SetString(PyExc_ValueError, "Elements of centers must be numpy arrays."); goto error; }
-        np_item = (PyArrayObject*)py_item;
-        if(PyArray_TYPE(np_item)!=NPY_FLOAT32) { PyErr_SetString(PyExc_ValueError, "dtype of cluster center isn\'t float (32)."); goto error; };
-        if(!PyArray_ISBEHAVED_RO(np_item) ) { PyErr_SetString(PyExc_ValueError, "cluster center isn\'t behaved."); goto error; };
-        if(PyArray_NDIM(np_item)!=1) { PyErr_SetString(PyExc_ValueError, "Number of dimensions of cluster centers must be 1."); goto error;  };
-        if(np_item->dimensions[0]!=dim) {
-          PyErr_SetString(PyExc_ValueError, "Dimension of cluster centers doesn\'t match dimension of frames.");
-          goto error;
+    frame_pivot = malloc((N_frames+1)*sizeof(float));
+    is_covered = calloc(N_frames+1, sizeof(char));
+    if(!frame_pivot || !is_covered) { PyErr_NoMemory(); goto error; }
+    N_old_centers = N_centers;
+
+    /* The first center is the pivot of the triangle inequality pruning. The
+     * pivot distances of the previous centers are already in center_pivot,
+     * only those of new centers are written below. */
+    /* Test all frames against the existing centers in parallel. Only frames
+     * not covered by them are candidates for new centers. */
+    if(N_old_centers > 0) {
+        no_memory = 0;
+        #pragma omp parallel private(i)
+        {
+            float *local_a, *local_b;
+            local_a = NULL; local_b = NULL;
+            if(buffer_a) {
+                /* minRMSD needs scratch buffers of its own in every thread */
+                local_a = malloc(dim*sizeof(float));
+                local_b = malloc(dim*sizeof(float));
+                if(!local_a || !local_b) {
+                    #pragma omp critical
+                    no_memory = 1;
+                }
+            }
+            #pragma omp for
+            for(i = 0; i < N_frames; ++i) {
+                if(buffer_a && (!local_a || !local_b)) continue;
+                frame_pivot[i] = distance(&chunk[i*dim], centers, dim, local_a, local_b);
+                is_covered[i] = covered(&chunk[i*dim], centers, center_pivot, 0, N_old_centers, frame_pivot[i],
+                                        cutoff, dim, local_a, local_b, distance);
+            }
+            free(local_a);
+            free(local_b);
         }
-        centers[i] = (float*)PyArray_DATA(np_item);
+        if(no_memory) { PyErr_NoMemory(); goto error; }
     }
 
-    /* do the clustering */
+    /* Accepting new centers is sequential: a frame only becomes a center if
+     * it isn't covered by the centers accepted before it in this chunk. */
     for(i = 0; i < N_frames; ++i) {
-        mindist = FLT_MAX;
-        for(j = 0; j < N_centers; ++j) {
-            d = distance(&chunk[i*dim], centers[j], dim, buffer_a, buffer_b);
-            if(d<mindist) mindist = d;
+        if(is_covered[i]) continue;
+        if(N_centers == 0) {
+            frame_pivot[i] = 0.0f;
+        } else if(N_old_centers == 0) {
+            frame_pivot[i] = distance(&chunk[i*dim], centers, dim, buffer_a, buffer_b);
         }
-        if(mindist > cutoff) {
-            if(N_centers+1>max_clusters) {
-                PyErr_SetString(PyExc_RuntimeError, "Maximum number of cluster centers reached. "\
-                                                    "Consider increasing max_clusters or choose "\
-                                                    "a larger minimum distance, dmin.");
-                goto error;
-            }
-            new_dims[0] = dim;
-            np_new_center = (PyArrayObject*) PyArray_SimpleNew(1, new_dims, NPY_FLOAT32); /* ref:new */
-            if(!np_new_center) goto error;
-            memcpy(PyArray_DATA(np_new_center), &chunk[i*dim], sizeof(float)*dim);
-            if(PyList_Append(py_centers, (PyObject*)np_new_center)!=0) goto error; /* ref:not stolen */
-            Py_DECREF(np_new_center);
-            centers = realloc(centers, (N_centers+1)*sizeof(float*));
-            if(!centers) { PyErr_NoMemory(); goto error; }
-            centers[N_centers] = (float*)PyArray_DATA(np_new_center);
-            N_centers++;
+        if(covered(&chunk[i*dim], centers, center_pivot, N_old_centers, N_centers, frame_pivot[i],
+                   cutoff, dim, buffer_a, buffer_b, distance)) continue;
+
+        if(N_centers+1>max_clusters) {
+            PyErr_SetString(PyExc_RuntimeError, "Maximum number of cluster centers reached. "\
+                                                "Consider increasing max_clusters or choose "\
+                                                "a larger minimum distance, dmin.");
+            goto error;
         }
+        /* buffer full: hand back, the caller grows it and continues at frame i */
+        if(N_centers==capacity) break;
+        memcpy(&centers[N_centers*dim], &chunk[i*dim], sizeof(float)*dim);
+        center_pivot[N_centers] = frame_pivot[i];
+        N_centers++;
     }
 
-    py_res = Py_BuildValue(""); /* =None */
+    py_res = Py_BuildValue("nn", N_centers, i);
     /* fall through */
 error:
-    free(centers);
+    free(frame_pivot);
+    free(is_covered);
     free(buffer_a);
     free(buffer_b);
     return py_res;
@@ -133,16 +203,23 @@ error:
 
 #define MOD_USAGE "Chunked regular spatial clustering"
 
-#define CLUSTER_USAGE "cluster(chunk, centers, mindist, metric)\n"\
-"Given a chunk of data and a list of cluster centers, update the list of cluster centers with the newly found centers.\n"\
+#define CLUSTER_USAGE "cluster(chunk, centers, center_pivots, n_centers, mindist, metric, max_clusters)\n"\
+"Given a chunk of data and a buffer of cluster centers, append the newly found centers to the buffer.\n"\
 "\n"\
 "Parameters\n"\
 "----------\n"\
 "chunk : (N,M) C-style contiguous and behaved ndarray of np.float32\n"\
 "    (input) array of N frames, each frame having dimension M\n"\
-"centers : list of (M) behaved ndarrays of np.float32\n"\
-"    (input/output) Possibly empty list of previously found cluster\n"\
-"    centers. New centers are appended to this list.\n"\
+"centers : (K,M) C-style contiguous and writeable ndarray of np.float32\n"\
+"    (input/output) Buffer with room for K cluster centers. Its first\n"\
+"    `n_centers` rows hold the previously found centers, new centers are\n"\
+"    written to the following rows.\n"\
+"center_pivots : (K,) C-style contiguous and writeable ndarray of np.float32\n"\
+"    (input/output) Distances of the centers to the first center. The first\n"\
+"    `n_centers` entries must be those of the previous call, the entries of\n"\
+"    new centers are written to the following positions.\n"\
+"n_centers : integer\n"\
+"    (input) Number of previously found cluster centers in `centers`.\n"\
 "dmin : float\n"\
 "    (input) Distance parameter for regular spatial clustering. Whenever\n"\
 "    a frame is at least `dmin` away form all cluster centers it is added\n"\
@@ -155,7 +232,10 @@ error:
 "\n"\
 "Returns\n"\
 "-------\n"\
-"None. The input parameter `centers` is updated instead.\n"\
+"(n_centers, n_processed) : tuple of integers\n"\
+"    The number of cluster centers in `centers` and the number of frames of\n"\
+"    `chunk` that were processed. If `n_processed` is smaller than N, the\n"\
+"    buffer was full: grow it and call again with the remaining frames.\n"\
 "\n"\
 "Note\n"\
 "----\n"\
@@ -166,6 +246,8 @@ static PyMethodDef regspatialMethods[] =
 {
      {"cluster", cluster, METH_VARARGS, CLUSTER_USAGE},
      {"assign",  assign,  METH_VARARGS, ASSIGN_USAGE},
+     {"minRMSD_distances", minRMSD_distances, METH_VARARGS, MINRMSD_DISTANCES_USAGE},
+     {"kmeans_accumulate", kmeans_accumulate, METH_VARARGS, KMEANS_ACCUMULATE_USAGE},
      {NULL, NULL, 0, NULL}
 };
 
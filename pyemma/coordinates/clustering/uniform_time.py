@@ -31,25 +31,56 @@ import numpy as np
 __all__ = ['UniformTimeClustering']
 
 
+def _random_subset(n, k):
+    """ k distinct random integers from [0, n), sorted in ascending order.
+
+    Uses Floyd's algorithm, which draws k numbers from numpy's random
+    generator instead of permuting all n of them.
+    """
+    selected = set()
+    for j in xrange(n - k, n):
+        t = np.random.randint(j + 1)
+        selected.add(j if t in selected else t)
+    return np.array(sorted(selected), dtype=int)
+
+
 class UniformTimeClustering(AbstractClustering):
 
     """
     Uniform time clustering
 
+    Selects k frames as cluster centers, either at uniform time intervals
+    through the concatenated trajectories or as a uniform random subset of
+    all frames.
+
+    If the data source supports random access (data in memory, NumPy files
+    and trajectory files read by a FeatureReader, also through transformers
+    like TICA), the positions of the centers are computed from the trajectory
+    lengths and only these k frames are read. Otherwise the centers are
+    harvested in a pass over the data.
+
     Parameters
     ----------
     k : int
-        TODO: super unknown parameter
+        number of cluster centers
     metric : str
         metric to use during clustering ('euclidean', 'minRMSD')
+    sampling : str
+        'uniform' to select frames at uniform time intervals, 'random' to
+        select a uniform random subset of frames
     """
 
-    def __init__(self, k=2, metric='euclidean'):
+    _SAMPLINGS = ('uniform', 'random')
+
+    def __init__(self, k=2, metric='euclidean', sampling='uniform'):
         super(UniformTimeClustering, self).__init__(metric=metric)
+        if sampling not in self._SAMPLINGS:
+            raise ValueError("sampling must be one of %s" % (self._SAMPLINGS,))
         self.n_clusters = k
+        self.sampling = sampling
 
     def describe(self):
-        return "[Uniform time clustering, k = %i]" % self.n_clusters
+        return "[Uniform time clustering, k = %i, sampling = %s]" % (self.n_clusters, self.sampling)
 
     def _get_memory_per_frame(self):
         """
@@ -69,6 +100,41 @@ class UniformTimeClustering(AbstractClustering):
         # memory for cluster centers and discrete trajectories
         return self.n_clusters * 4 * self.data_producer.dimension() + 4 * self.data_producer.n_frames_total()
 
+    def _center_positions(self, stride):
+        """ positions of the cluster centers in the concatenated (strided)
+        trajectories, sorted in ascending order """
+        T = self.data_producer.n_frames_total(stride=stride)
+        if self.n_clusters > T:
+            self._logger.info('Requested more clusters (k = %i'
+                              ' than there are total data points %i)'
+                              '. Will do clustering with k = %i'
+                              % (self.n_clusters, T, T))
+            self.n_clusters = T
+        if self.sampling == 'random':
+            return _random_subset(T, self.n_clusters)
+        # time segment length between cluster centers, first center in the
+        # middle of the first segment
+        dt = T // self.n_clusters
+        return dt // 2 + dt * np.arange(self.n_clusters)
+
+    def parametrize(self, stride=1):
+        if (self.data_producer is None or not self.data_producer._has_random_access()
+                or (self._parametrized and stride == self._param_with_stride)):
+            return super(UniformTimeClustering, self).parametrize(stride=stride)
+        # random access: read only the frames of the centers
+        positions = self._center_positions(stride)
+        self._param_init()
+        offsets = np.cumsum([0] + self.data_producer.trajectory_lengths(stride=stride))
+        itrajs = np.searchsorted(offsets, positions, side='right') - 1
+        for itraj in np.unique(itrajs):
+            selected = np.where(itrajs == itraj)[0]
+            frames = (positions[selected] - offsets[itraj]) * stride
+            self.clustercenters[selected] = self.data_producer._frames(itraj, frames)
+        self._param_with_stride = stride
+        self._parametrized = True
+        if self.in_memory:
+            self._map_to_memory()
+
     def _param_init(self):
         """
         Initializes the parametrization.
@@ -105,31 +171,19 @@ class UniformTimeClustering(AbstractClustering):
         if ipass == 0:
             # initialize
             if (first_chunk):
-                # initialize time counters
-                T = self.data_producer.n_frames_total(stride=stride)
-                if self.n_clusters > T:
-                    self.n_clusters = T
-                    self._logger.info('Requested more clusters (k = %i'
-                                      ' than there are total data points %i)'
-                                      '. Will do clustering with k = %i'
-                                      % (self.n_clusters, T, T))
-
+                self._positions = self._center_positions(stride)
+                self.clustercenters = self.clustercenters[:self.n_clusters]
                 # time in previous trajectories
                 self._tprev = 0
                 # number of clusters yet
                 self._n = 0
-                # time segment length between cluster centers
-                self._dt = T / self.n_clusters
-                # first data point in the middle of the time segment
-                self._nextt = self._dt / 2
             # final time we can go to with this chunk
             maxt = self._tprev + t + L
             # harvest cluster centers from this chunk until we have left it
-            while (self._nextt < maxt and self._n < self.n_clusters):
-                i = self._nextt - self._tprev - t
+            while (self._n < self.n_clusters and self._positions[self._n] < maxt):
+                i = self._positions[self._n] - self._tprev - t
                 self.clustercenters[self._n] = X[i]
                 self._n += 1
-                self._nextt += self._dt
             if last_chunk_in_traj:
                 self._tprev += self.data_producer.trajectory_length(
                     itraj, stride=stride)
@@ -37,6 +37,7 @@ Order parameters
 
     MDFeaturizer - selects and computes features from MD trajectories
     CustomFeature - define arbitrary function to extract features
+    CustomKernelFeature - define arbitrary in-place kernel to extract features
 
 Reader
 ======
@@ -51,7 +52,7 @@ Reader
 
 """
 from .feature_reader import FeatureReader
-from .featurizer import MDFeaturizer, CustomFeature
+from .featurizer import MDFeaturizer, CustomFeature, CustomKernelFeature
 from .data_in_memory import DataInMemory
 from .numpy_filereader import NumPyFileReader
 from .py_csv_reader import PyCSVReader
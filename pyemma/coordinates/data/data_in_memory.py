@@ -27,6 +27,7 @@ __author__ = 'noe, marscher'
 import numpy as np
 
 from pyemma.coordinates.data.interface import ReaderInterface
+from pyemma.coordinates.util.precision import stream_array
 
 
 class DataInMemory(ReaderInterface):
@@ -57,7 +58,8 @@ class DataInMemory(ReaderInterface):
         # everything is an array
         if all(isinstance(d, np.ndarray) for d in data):
             for d in data:
-                self._add_array_to_storage(d)
+                # convert once, instead of every chunk in every pass
+                self._add_array_to_storage(stream_array(d))
         else:
             raise ValueError("supply 2d ndarray, list of 2d ndarray"
                              " or list of filenames storing 2d arrays."
@@ -102,6 +104,12 @@ class DataInMemory(ReaderInterface):
 
         self._ndim = ndims[0]
 
+    def _has_random_access(self):
+        return True
+
+    def _frames(self, itraj, frames):
+        return self._data[itraj][frames]
+
     def _reset(self, stride=1):
         """Resets the data producer
         """
@@ -146,8 +154,8 @@ class DataInMemory(ReaderInterface):
                 # its okay to return empty chunks
                 upper_bound = min(
                     self._t + (lag + self._chunksize + 1) * stride, traj_len)
-                slice_y = slice(self._t + lag, upper_bound, stride)
-                self._t += X.shape[0]
+                slice_y = slice(self._t + lag * stride, upper_bound, stride)
+                self._t += X.shape[0] * stride
 
                 if self._t >= traj_len:
                     self._itraj += 1
@@ -30,6 +30,7 @@ import mdtraj
 from pyemma.coordinates.util import patches
 from pyemma.coordinates.data.interface import ReaderInterface
 from pyemma.coordinates.data.featurizer import MDFeaturizer
+from pyemma.coordinates.util.dtraj_cache import files_identity
 
 __all__ = ['FeatureReader']
 
@@ -135,6 +136,13 @@ class FeatureReader(ReaderInterface):
         """
         return ["Feature reader with following features"] + self.featurizer.describe()
 
+    def _cache_identity(self):
+        features = self.featurizer._cache_identity()
+        if features is None:
+            return None
+        return "[FeatureReader files=%s topology=%s features=%s]" \
+            % (files_identity(self.trajfiles), files_identity([self.topfile]), features)
+
     def parametrize(self, stride=1):
         """
         Parametrizes this transformer
@@ -201,6 +209,47 @@ class FeatureReader(ReaderInterface):
             # increment trajectory
             itraj += 1
 
+    def _has_random_access(self):
+        return True
+
+    def _frames(self, itraj, frames):
+        # Seeking is expensive in some formats (XTC rescans the file), so the
+        # frames are picked from a single pass up to the last requested one.
+        frames = np.asarray(frames, dtype=int)
+        wanted = np.unique(frames)
+        xyz, boxes = [], []
+        t = 0
+        it = patches.iterload(self.trajfiles[itraj], chunk=self.chunksize,
+                              top=self.featurizer.topology)
+        try:
+            for chunk in it:
+                L = chunk.n_frames
+                selected = wanted[(wanted >= t) & (wanted < t + L)]
+                if len(selected) > 0:
+                    # keep the arrays only, slicing trajectories copies the topology
+                    xyz.append(chunk.xyz[selected - t])
+                    if chunk.unitcell_vectors is not None:
+                        boxes.append(chunk.unitcell_vectors[selected - t])
+                t += L
+                if t > wanted[-1]:
+                    break
+        finally:
+            it.close()
+        if t <= wanted[-1]:
+            raise IndexError('frame %i exceeds the length %i of trajectory %i' % (wanted[-1], t, itraj))
+        traj = mdtraj.Trajectory(np.concatenate(xyz), self.featurizer.topology)
+        if boxes:
+            traj.unitcell_vectors = np.concatenate(boxes)
+        return self._featurize(traj)[np.searchsorted(wanted, frames)]
+
+    def _featurize(self, traj):
+        """ maps an mdtraj.Trajectory to features, or to flattened coordinates
+        if no features are active """
+        if len(self.featurizer.active_features) == 0:
+            shape = traj.xyz.shape
+            return traj.xyz.reshape((shape[0], shape[1] * shape[2]))
+        return self.featurizer.map(traj)
+
     def _create_iter(self, filename, skip=0, stride=1):
         return patches.iterload(filename, chunk=self.chunksize,
                                 top=self.topfile, skip=skip, stride=stride)
@@ -267,18 +316,6 @@ class FeatureReader(ReaderInterface):
 
         # map data
         if lag == 0:
-            if len(self.featurizer.active_features) == 0:
-                shape_2d = (shape[0], shape[1] * shape[2])
-                return chunk.xyz.reshape(shape_2d)
-            else:
-                return self.featurizer.map(chunk)
+            return self._featurize(chunk)
         else:
-            if len(self.featurizer.active_features) == 0:
-                shape_Y = adv_chunk.xyz.shape
-
-                X = chunk.xyz.reshape((shape[0], shape[1] * shape[2]))
-                Y = adv_chunk.xyz.reshape((shape_Y[0], shape_Y[1] * shape_Y[2]))
-            else:
-                X = self.featurizer.map(chunk)
-                Y = self.featurizer.map(adv_chunk)
-            return X, Y
+            return self._featurize(chunk), self._featurize(adv_chunk)
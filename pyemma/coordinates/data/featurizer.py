@@ -31,11 +31,14 @@ from mdtraj.geometry.dihedral import _get_indices_phi, \
 import numpy as np
 import warnings
 
+from pyemma.coordinates.clustering import regspatial
+from pyemma.coordinates.util.dtraj_cache import arrays_digest
 from pyemma.util.log import getLogger
 from pyemma.util.annotators import deprecated
 
 __all__ = ['MDFeaturizer',
            'CustomFeature',
+           'CustomKernelFeature',
            ]
 
 
@@ -75,6 +78,33 @@ def _hash_numpy_array(x):
     return hash_value
 
 
+def _feature_identity(feature, arrays, **params):
+    """ identifies a feature by its type, a digest of its index or coordinate
+    arrays and its parameters, e.g. for the persistent dtraj cache """
+    return '%s(%s%s)' % (type(feature).__name__, arrays_digest(*arrays),
+                         ''.join(', %s=%r' % kv for kv in sorted(params.items())))
+
+
+def _evaluate_kernel(kernel, traj, indexes):
+    """
+    Evaluates a geometric kernel of mdtraj for the given atom index tuples.
+
+    :param kernel: tuple, first element is the kernel name ('distances',
+        'angles', 'dihedrals'), the remaining elements are its options.
+    :param traj: mdtraj.Trajectory
+    :param indexes: ndarray of atom index tuples
+    :return: ndarray((T, len(indexes)))
+    """
+    name = kernel[0]
+    if name == 'distances':
+        return mdtraj.compute_distances(traj, indexes, periodic=kernel[1])
+    elif name == 'angles':
+        return mdtraj.compute_angles(traj, indexes)
+    elif name == 'dihedrals':
+        return compute_dihedrals(traj, indexes)
+    raise ValueError("unknown kernel %s" % str(kernel))
+
+
 class CustomFeature(object):
 
     """
@@ -90,6 +120,10 @@ class CustomFeature(object):
     ----------
     func : function
         will be invoked with given args and kwargs on mapping traj
+    dim : int
+        output dimension of func
+    validate : bool, optional, default = True
+        check the shape and dtype of the output on the first chunk
     args : list of positional args (optional) passed to func
     kwargs : named arguments (optional) passed to func
 
@@ -106,24 +140,71 @@ class CustomFeature(object):
     >>> data = reader.get_output()
 
     """
+    # defaults for derived classes, which do not call this constructor
+    validate = True
+    _validated = False
 
     def __init__(self, func=None, *args, **kwargs):
         self._func = func
         self._args = args
         self._kwargs = kwargs
         self.dimension = kwargs.pop('dim', 0)
+        self.validate = kwargs.pop('validate', True)
+        self._validated = False
 
     def describe(self):
         return ["CustomFeature calling %s with args %s" % (str(self._func),
                                                            str(self._args) +
                                                            str(self._kwargs))]
 
+    def _cache_identity(self):
+        # an arbitrary function can not be identified across sessions
+        return None
+
     def map(self, traj):
         feature = self._func(traj, *self._args, **self._kwargs)
         if not isinstance(feature, np.ndarray):
             raise ValueError("your function should return a NumPy array!")
         return feature
 
+    def map_into(self, traj, out):
+        """ evaluates the feature for traj and writes the result into out
+
+        The output of map is checked on the first chunk only (if validation
+        is enabled).
+        """
+        vec = self.map(traj)
+        if self.validate and not self._validated:
+            self.check_output(vec, traj.xyz.shape[0])
+            self._validated = True
+        out[:] = vec
+        return out
+
+    def check_output(self, vec, n_frames):
+        """ raises a ValueError, if vec is not a valid output of this feature
+        for a chunk of n_frames frames """
+        if not isinstance(vec, np.ndarray):
+            raise ValueError('Your custom feature %s did not return'
+                             ' a numpy.ndarray!' % str(self.describe()))
+        # NOTE: casting=safe raises in numpy>=1.9
+        vec = vec.astype(np.float32, casting='safe')
+        if not vec.ndim == 2:
+            raise ValueError('Your custom feature %s did not return'
+                             ' a 2d array. Shape was %s'
+                             % (str(self.describe()),
+                                str(vec.shape)))
+        if not vec.shape[0] == n_frames:
+            raise ValueError('Your custom feature %s did not return'
+                             ' as many frames as it received!'
+                             'Input was %i, output was %i'
+                             % (str(self.describe()),
+                                n_frames,
+                                vec.shape[0]))
+        if not vec.shape[1] == self.dimension:
+            raise ValueError('Your custom feature %s returned %i dimensions,'
+                             ' but declared %i.'
+                             % (str(self.describe()), vec.shape[1], self.dimension))
+
     def __hash__(self):
         hash_value = hash(self._func)
         # if key contains numpy arrays, we hash their data arrays
@@ -136,6 +217,134 @@ class CustomFeature(object):
         return self.__hash__() == other.__hash__()
 
 
+class CustomKernelFeature(object):
+
+    """
+    A user-defined feature with an output dimension and dtype declared up front.
+
+    In contrast to :class:`CustomFeature`, the kernel does not return a new
+    array, but writes its result in place into a preallocated output array
+    of shape (T, dim), where T is the number of frames in the given
+    trajectory chunk. The featurizer passes a view on its own output buffer,
+    so no intermediate arrays need to be allocated, casted or stacked.
+
+    The output is validated once on the first chunk (every element has to be
+    written); afterwards the kernel is called without any further checks.
+
+    Parameters
+    ----------
+    kernel : function
+        will be invoked as kernel(traj, out, *args, **kwargs) and has to fill
+        out, an ndarray of shape (T, dim) and dtype dtype.
+    dim : int
+        output dimension of kernel
+    dtype : numpy dtype, optional, default = np.float32
+        dtype of the values written by kernel, a floating point or integer
+        type which can be safely casted to np.float32. If it is not
+        np.float32, the kernel writes into an intermediate buffer, which gets
+        copied into the output. For integer types, the smallest value of the
+        type marks unwritten elements during validation, so the kernel must
+        not write it on the first chunk.
+    desc : str, optional
+        description of the feature
+    args : list of positional args (optional) passed to kernel
+    kwargs : named arguments (optional) passed to kernel
+
+    Examples
+    --------
+    We define a feature that computes the squared distance of every atom to the
+    origin:
+
+    >>> def sq_norm(traj, out):
+    ...     np.sum(traj.xyz**2, axis=2, out=out)
+    >>> feat = CustomKernelFeature(sq_norm, dim=reader.featurizer.topology.n_atoms)
+    >>> reader.featurizer.add_custom_feature(feat)
+
+    """
+
+    def __init__(self, kernel, dim, dtype=np.float32, desc='', *args, **kwargs):
+        if not callable(kernel):
+            raise ValueError("kernel has to be callable")
+        dtype = np.dtype(dtype)
+        if not np.can_cast(dtype, np.float32):
+            raise ValueError("kernel output dtype %s can not be safely casted"
+                             " to float32" % dtype)
+        if not (np.issubdtype(dtype, np.floating) or np.issubdtype(dtype, np.integer)):
+            raise ValueError("kernel output dtype %s is neither a floating point"
+                             " nor an integer type" % dtype)
+        self._kernel = kernel
+        self._args = args
+        self._kwargs = kwargs
+        self.dimension = int(dim)
+        self.dtype = dtype
+        self.desc = desc
+        self._validated = False
+        self._buffer = None
+
+    def describe(self):
+        if self.desc:
+            return [self.desc]
+        return ["CustomKernelFeature calling %s with args %s" % (str(self._kernel),
+                                                                 str(self._args) +
+                                                                 str(self._kwargs))]
+
+    def _cache_identity(self):
+        # an arbitrary kernel can not be identified across sessions
+        return None
+
+    def map_into(self, traj, out):
+        """ evaluates the kernel for traj and writes the result into out """
+        n_frames = traj.xyz.shape[0]
+        if self.dtype == np.float32 and self._validated:
+            self._kernel(traj, out, *self._args, **self._kwargs)
+            return out
+
+        if self.dtype == np.float32:
+            buff = out
+        else:
+            if self._buffer is None or self._buffer.shape[0] < n_frames:
+                self._buffer = np.empty((n_frames, self.dimension), dtype=self.dtype)
+            buff = self._buffer[:n_frames]
+
+        if not self._validated:
+            # mark all elements as unwritten
+            if np.issubdtype(self.dtype, np.floating):
+                buff.fill(np.nan)
+            else:
+                buff.fill(np.iinfo(self.dtype).min)
+            self._kernel(traj, buff, *self._args, **self._kwargs)
+            if np.issubdtype(self.dtype, np.floating):
+                unwritten = np.any(np.isnan(buff))
+            else:
+                unwritten = np.any(buff == np.iinfo(self.dtype).min)
+            if unwritten:
+                raise ValueError('Your custom kernel %s did not fill all %i'
+                                 ' output dimensions for all frames.'
+                                 % (str(self.describe()), self.dimension))
+            self._validated = True
+        else:
+            self._kernel(traj, buff, *self._args, **self._kwargs)
+
+        if buff is not out:
+            out[:] = buff
+        return out
+
+    def map(self, traj):
+        out = np.empty((traj.xyz.shape[0], self.dimension), dtype=np.float32)
+        return self.map_into(traj, out)
+
+    def __hash__(self):
+        hash_value = hash(self._kernel)
+        key = tuple(map(_catch_unhashable, self._args) +
+                    map(_catch_unhashable, sorted(self._kwargs.items())))
+        hash_value ^= hash(key)
+        hash_value ^= hash(self.dimension)
+        return hash_value
+
+    def __eq__(self, other):
+        return self.__hash__() == other.__hash__()
+
+
 class SelectionFeature(object):
 
     """
@@ -165,6 +374,9 @@ class SelectionFeature(object):
     def dimension(self):
         return 3 * self.indexes.shape[0]
 
+    def _cache_identity(self):
+        return _feature_identity(self, [self.indexes])
+
     def map(self, traj):
         newshape = (traj.xyz.shape[0], 3 * self.indexes.shape[0])
         return np.reshape(traj.xyz[:, self.indexes, :], newshape)
@@ -199,8 +411,22 @@ class DistanceFeature(object):
     def dimension(self):
         return self.distance_indexes.shape[0]
 
+    @property
+    def _kernel_key(self):
+        return ('distances', self.periodic)
+
+    @property
+    def _kernel_indexes(self):
+        return self.distance_indexes
+
+    def _postprocess(self, dists):
+        return dists
+
+    def _cache_identity(self):
+        return _feature_identity(self, [self.distance_indexes], periodic=self.periodic)
+
     def map(self, traj):
-        return mdtraj.compute_distances(traj, self.distance_indexes, periodic=self.periodic)
+        return self._postprocess(_evaluate_kernel(self._kernel_key, traj, self._kernel_indexes))
 
     def __hash__(self):
         hash_value = _hash_numpy_array(self.distance_indexes)
@@ -219,8 +445,8 @@ class InverseDistanceFeature(DistanceFeature):
             self, top, distance_indexes, periodic=periodic)
         self.prefix_label = "INVDIST:"
 
-    def map(self, traj):
-        return 1.0 / mdtraj.compute_distances(traj, self.distance_indexes, periodic=self.periodic)
+    def _postprocess(self, dists):
+        return 1.0 / dists
 
     # does not need own hash impl, since we take prefix label into account
 
@@ -233,14 +459,12 @@ class ContactFeature(DistanceFeature):
         self.threshold = threshold
         self.periodic = periodic
 
-    def map(self, traj):
-        dists = mdtraj.compute_distances(
-            traj, self.distance_indexes, periodic=self.periodic)
-        res = np.zeros(
-            (len(traj), self.distance_indexes.shape[0]), dtype=np.float32)
-        I = np.argwhere(dists <= self.threshold)
-        res[I[:, 0], I[:, 1]] = 1.0
-        return res
+    def _postprocess(self, dists):
+        return (dists <= self.threshold).astype(np.float32)
+
+    def _cache_identity(self):
+        return _feature_identity(self, [self.distance_indexes], periodic=self.periodic,
+                                 threshold=self.threshold)
 
     def __hash__(self):
         hash_value = DistanceFeature.__hash__(self)
@@ -269,13 +493,24 @@ class AngleFeature(object):
     def dimension(self):
         return self.angle_indexes.shape[0]
 
-    def map(self, traj):
-        rad = mdtraj.compute_angles(traj, self.angle_indexes)
+    _kernel_key = ('angles',)
+
+    @property
+    def _kernel_indexes(self):
+        return self.angle_indexes
+
+    def _postprocess(self, rad):
         if self.deg:
             return np.rad2deg(rad)
         else:
             return rad
 
+    def map(self, traj):
+        return self._postprocess(_evaluate_kernel(self._kernel_key, traj, self._kernel_indexes))
+
+    def _cache_identity(self):
+        return _feature_identity(self, [self.angle_indexes], deg=self.deg)
+
     def __hash__(self):
         hash_value = _hash_numpy_array(self.angle_indexes)
         hash_value ^= hash(self.top)
@@ -308,13 +543,24 @@ class DihedralFeature(object):
     def dimension(self):
         return self.dih_indexes.shape[0]
 
-    def map(self, traj):
-        rad = mdtraj.compute_dihedrals(traj, self.dih_indexes)
+    _kernel_key = ('dihedrals',)
+
+    @property
+    def _kernel_indexes(self):
+        return self.dih_indexes
+
+    def _postprocess(self, rad):
         if self.deg:
             return np.rad2deg(rad)
         else:
             return rad
 
+    def map(self, traj):
+        return self._postprocess(_evaluate_kernel(self._kernel_key, traj, self._kernel_indexes))
+
+    def _cache_identity(self):
+        return _feature_identity(self, [self.dih_indexes], deg=self.deg)
+
     def __hash__(self):
         hash_value = _hash_numpy_array(self.dih_indexes)
         hash_value ^= hash(self.top)
@@ -348,6 +594,8 @@ class BackboneTorsionFeature(object):
         self._psi_inds = indices
 
         self._dim = len(self._phi_inds) + len(self._psi_inds)
+        self._kernel_indexes = np.concatenate((np.reshape(self._phi_inds, (-1, 4)),
+                                               np.reshape(self._psi_inds, (-1, 4))))
 
     def describe(self):
         top = self.topology
@@ -365,17 +613,21 @@ class BackboneTorsionFeature(object):
     def dimension(self):
         return self._dim
 
-    def map(self, traj):
-        # TODO: can we merge phi_inds and psi_inds to only call
-        # compute_dihedrals once?
-        y1 = compute_dihedrals(traj, self._phi_inds).astype(np.float32)
-        y2 = compute_dihedrals(traj, self._psi_inds).astype(np.float32)
-        rad = np.hstack((y1, y2))
+    _kernel_key = ('dihedrals',)
+
+    def _postprocess(self, rad):
         if self.deg:
             return np.rad2deg(rad)
         else:
             return rad
 
+    def map(self, traj):
+        rad = _evaluate_kernel(self._kernel_key, traj, self._kernel_indexes).astype(np.float32)
+        return self._postprocess(rad)
+
+    def _cache_identity(self):
+        return _feature_identity(self, [self._kernel_indexes], deg=self.deg)
+
     def __hash__(self):
         hash_value = _hash_numpy_array(self._phi_inds)
         hash_value ^= _hash_numpy_array(self._psi_inds)
@@ -387,6 +639,172 @@ class BackboneTorsionFeature(object):
         return self.__hash__() == other.__hash__()
 
 
+class MinRmsdFeature(object):
+
+    """
+    Minimal RMSD (after optimal superposition) of every frame to a set of
+    reference structures. The result of a chunk is a block of shape
+    (n_frames, n_references).
+
+    The references are centered once on construction, every frame is
+    centered once per chunk. The pairwise RMSDs are then computed in parallel
+    by the QCP kernel also used for minRMSD clustering.
+
+    Parameters
+    ----------
+    top : mdtraj.Topology
+        topology of the trajectories this feature is applied to
+    ref : mdtraj.Trajectory
+        reference structures, one per frame
+    atom_indices : ndarray((n), dtype=int), optional
+        atoms to superpose and to compute the RMSD for. Default: all atoms.
+
+    """
+
+    def __init__(self, top, ref, atom_indices=None):
+        self.top = top
+        if atom_indices is None:
+            atom_indices = np.arange(ref.n_atoms)
+        self.atom_indices = np.array(atom_indices)
+        self.ref = ref
+
+        refs = np.array(ref.xyz[:, self.atom_indices, :], dtype=np.float32)
+        refs -= refs.mean(axis=1)[:, np.newaxis, :]
+        refs = refs.reshape((refs.shape[0], 3 * refs.shape[1]))
+        self._refs = np.require(refs, dtype=np.float32, requirements='C')
+        self._ref_traces = np.sum(self._refs.astype(np.float64) ** 2, axis=1).astype(np.float32)
+
+    def describe(self):
+        return ["MINRMSD to reference frame %i (%i atoms)" % (i, len(self.atom_indices))
+                for i in xrange(self.dimension)]
+
+    @property
+    def dimension(self):
+        return self._refs.shape[0]
+
+    def map_into(self, traj, out):
+        """ computes the minRMSDs of the frames in traj and writes them into out """
+        if self.atom_indices.shape[0] == traj.n_atoms:
+            xyz = traj.xyz
+        else:
+            xyz = traj.xyz[:, self.atom_indices, :]
+        chunk = np.require(xyz.reshape((xyz.shape[0], 3 * xyz.shape[1])),
+                           dtype=np.float32, requirements='C')
+        regspatial.minRMSD_distances(chunk, self._refs, self._ref_traces, out)
+        return out
+
+    def map(self, traj):
+        out = np.empty((traj.xyz.shape[0], self.dimension), dtype=np.float32)
+        return self.map_into(traj, out)
+
+    def _cache_identity(self):
+        # the RMSD does not depend on the position of the references
+        return _feature_identity(self, [self._refs, self.atom_indices])
+
+    def __hash__(self):
+        hash_value = _hash_numpy_array(self._refs)
+        hash_value ^= _hash_numpy_array(self.atom_indices)
+        hash_value ^= hash(self.top)
+        return hash_value
+
+    def __eq__(self, other):
+        return self.__hash__() == other.__hash__()
+
+
+class FeaturizationPlan(object):
+
+    """
+    Execution plan for a list of features.
+
+    Features based on the same geometric kernel of mdtraj (distances with the
+    same periodicity, angles, dihedrals) are merged: the atom index tuples of
+    all of them are deduplicated and sorted, so every distinct pair, triple or
+    quadruple is evaluated exactly once per chunk by a single kernel call.
+    Every feature then picks its columns from the kernel result and applies
+    its own post-processing (inversion, contact threshold, conversion to
+    degrees). All other features are mapped one after another.
+
+    All results are written into a preallocated output array.
+
+    Parameters
+    ----------
+    features : list
+        the active features of a featurizer, in output order.
+
+    """
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.dimension = sum(f.dimension for f in self.features)
+
+        # distinct index tuples per kernel: kernel -> {tuple: position}
+        kernel_rows = {}
+        for f in self.features:
+            if hasattr(f, '_kernel_key') and f.dimension > 0:
+                rows = kernel_rows.setdefault(f._kernel_key, {})
+                for row in f._kernel_indexes:
+                    rows.setdefault(tuple(row), None)
+
+        # sort tuples by atom indexes for memory locality
+        self.kernels = []
+        positions = {}
+        for kernel in sorted(kernel_rows.keys()):
+            rows = sorted(kernel_rows[kernel].keys())
+            indexes = np.array(rows, dtype=int)
+            self.kernels.append((kernel, indexes))
+            positions[kernel] = dict((row, i) for i, row in enumerate(rows))
+
+        # every step writes the columns [start, stop) of the output
+        self.steps = []
+        start = 0
+        for f in self.features:
+            stop = start + f.dimension
+            if f.dimension == 0:
+                continue
+            if hasattr(f, '_kernel_key'):
+                pos = np.array([positions[f._kernel_key][tuple(row)]
+                                for row in f._kernel_indexes], dtype=int)
+                # prefer views over fancy indexing
+                if np.all(np.diff(pos) == 1):
+                    pos = slice(pos[0], pos[-1] + 1)
+                self.steps.append((f, start, stop, f._kernel_key, pos))
+            else:
+                self.steps.append((f, start, stop, None, None))
+            start = stop
+
+    def map(self, traj):
+        """
+        Evaluates the plan for the given trajectory.
+
+        Parameters
+        ----------
+        traj : mdtraj.Trajectory
+
+        Returns
+        -------
+        out : ndarray((T, n), dtype=float32)
+        """
+        res = np.empty((traj.xyz.shape[0], self.dimension), dtype=np.float32)
+
+        # evaluate every kernel once
+        results = dict((kernel, _evaluate_kernel(kernel, traj, indexes))
+                       for kernel, indexes in self.kernels)
+
+        # TODO: consider parallel evaluation computation here, this effort is
+        # only worth it, if computation time dominates memory transfers
+        for f, start, stop, kernel, pos in self.steps:
+            out = res[:, start:stop]
+            if kernel is not None:
+                out[:] = f._postprocess(results[kernel][:, pos])
+            elif hasattr(f, 'map_into'):
+                # custom features check their own output
+                f.map_into(traj, out)
+            else:
+                out[:] = f.map(traj)
+
+        return res
+
+
 class MDFeaturizer(object):
 
     """extracts features from MD trajectories.
@@ -403,12 +821,14 @@ class MDFeaturizer(object):
         self.topology = (mdtraj.load(topfile)).topology
         self.active_features = []
         self._dim = 0
+        self._plan = None
         self._logger = getLogger("%s[%s]" %
                                  (self.__class__.__name__, hex(id(self))))
 
     def __add_feature(self, f):
         if f not in self.active_features:
             self.active_features.append(f)
+            self._plan = None
         else:
             self._logger.warning("tried to re-add the same feature %s"
                                  % f.__class__.__name__)
@@ -430,6 +850,18 @@ class MDFeaturizer(object):
             all_labels += f.describe()
         return all_labels
 
+    def _cache_identity(self):
+        """ identifies the computation of the active features by their types
+        and full parameters. None if a feature can't be identified, like a
+        custom feature calling an arbitrary function. """
+        identities = []
+        for f in self.active_features:
+            identity = f._cache_identity() if hasattr(f, '_cache_identity') else None
+            if identity is None:
+                return None
+            identities.append(identity)
+        return '[%s]' % ', '.join(identities)
+
     def select(self, selstring):
         """
         Returns the indexes of atoms matching the given selection
@@ -684,6 +1116,34 @@ class MDFeaturizer(object):
         f = BackboneTorsionFeature(self.topology, deg=deg)
         self.__add_feature(f)
 
+    def add_minrmsd_to_ref(self, ref, ref_frames=None, atom_indices=None):
+        """
+        Adds the minimal RMSD of every frame to a set of reference structures
+        to the feature list. Every reference structure yields one feature.
+
+        Parameters
+        ----------
+        ref : mdtraj.Trajectory or str
+            reference structures or a filename to load them from (using the
+            topology of this featurizer)
+        ref_frames : int or list of int, optional
+            frames of ref to use as reference structures. Default: all frames.
+        atom_indices : ndarray((n), dtype=int), optional
+            atoms used for superposition and RMSD. Default: all atoms.
+
+        """
+        if isinstance(ref, basestring):
+            ref = mdtraj.load(ref, top=self.topologyfile)
+        if ref_frames is not None:
+            ref = ref[np.atleast_1d(ref_frames)]
+        if ref.n_atoms != self.topology.n_atoms:
+            raise ValueError("reference has %i atoms, but topology has %i"
+                             % (ref.n_atoms, self.topology.n_atoms))
+        if atom_indices is not None:
+            atom_indices = self._check_indices(np.atleast_2d(atom_indices).T, pair_n=1)[:, 0]
+        f = MinRmsdFeature(self.topology, ref, atom_indices)
+        self.__add_feature(f)
+
     def add_custom_feature(self, feature):
         """
         Adds a custom feature to the feature list.
@@ -730,6 +1190,36 @@ class MDFeaturizer(object):
 
         self.add_custom_feature(f)
 
+    def add_custom_kernel(self, kernel, dim, dtype=np.float32, desc='', *args, **kwargs):
+        """ adds a user defined kernel, which writes its features in place
+
+        The output dimension and dtype are declared here, so the featurizer
+        can hand out a view on its preallocated output array to the kernel.
+        See :class:`CustomKernelFeature` for details.
+
+        Parameters
+        ----------
+        kernel : function
+            a user-defined function, which accepts an mdtraj.Trajectory object
+            and an output ndarray of shape (T, dim) as first parameters and
+            as many optional and named arguments as desired. It has to write
+            its result into the output array.
+        dim : int
+            output dimension of kernel
+        dtype : numpy dtype, optional, default = np.float32
+            dtype of the values written by kernel. Has to be safely castable
+            to np.float32.
+        desc : str
+            description of your feature kernel
+        args : list
+            positional arguments passed to kernel
+        kwargs : dictionary
+            named arguments passed to kernel
+
+        """
+        f = CustomKernelFeature(kernel, dim, dtype, desc, *args, **kwargs)
+        self.add_custom_feature(f)
+
     def dimension(self):
         """ current dimension due to selected features
 
@@ -768,38 +1258,22 @@ class MDFeaturizer(object):
 
         # TODO: define preprocessing step (RMSD etc.)
 
-        # otherwise build feature vector.
-        feature_vec = []
+        # otherwise evaluate the compiled plan of the active features.
+        return self.compile().map(traj)
 
-        # TODO: consider parallel evaluation computation here, this effort is
-        # only worth it, if computation time dominates memory transfers
-        for f in self.active_features:
-            # perform sanity checks for custom feature input
-            if isinstance(f, CustomFeature):
-                # NOTE: casting=safe raises in numpy>=1.9
-                vec = f.map(traj).astype(np.float32, casting='safe')
-
-                if not isinstance(vec, np.ndarray):
-                    raise ValueError('Your custom feature %s did not return'
-                                     ' a numpy.ndarray!' % str(f.describe()))
-                if not vec.ndim == 2:
-                    raise ValueError('Your custom feature %s did not return'
-                                     ' a 2d array. Shape was %s'
-                                     % (str(f.describe()),
-                                        str(vec.shape)))
-                if not vec.shape[0] == traj.xyz.shape[0]:
-                    raise ValueError('Your custom feature %s did not return'
-                                     ' as many frames as it received!'
-                                     'Input was %i, output was %i'
-                                     % (str(f.describe()),
-                                        traj.xyz.shape[0],
-                                        vec.shape[0]))
-            else:
-                vec = f.map(traj).astype(np.float32)
-            feature_vec.append(vec)
+    def compile(self):
+        """
+        Compiles the active features into a :class:`FeaturizationPlan`.
 
-        if len(feature_vec) > 1:
-            res = np.hstack(feature_vec)
-        else:
-            res = feature_vec[0]
-        return res
+        Features sharing the same kind of geometric computation are merged and
+        their atom index tuples are deduplicated. The plan is cached and only
+        recompiled if the active features have changed.
+
+        Returns
+        -------
+        plan : FeaturizationPlan
+
+        """
+        if self._plan is None or self._plan.features != self.active_features:
+            self._plan = FeaturizationPlan(self.active_features)
+        return self._plan
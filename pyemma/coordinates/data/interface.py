@@ -134,6 +134,10 @@ class ReaderInterface(Transformer):
 
         self._data.append(array)
 
+    def _has_random_access(self):
+        """ readers support random access if they override :func:`_frames` """
+        return False
+
     # handle abstract methods and special cases
     def map(self, X):
         raise NotImplementedError("a read can not map data, it is a data source")
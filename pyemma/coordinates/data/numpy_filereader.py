@@ -31,6 +31,7 @@ Created on 07.04.2015
 import numpy as np
 
 from pyemma.coordinates.data.interface import ReaderInterface
+from pyemma.coordinates.util.dtraj_cache import files_identity
 
 
 class NumPyFileReader(ReaderInterface):
@@ -82,6 +83,15 @@ class NumPyFileReader(ReaderInterface):
         return "[NumpyFileReader arrays with shape %s]" % [np.shape(x)
                                                            for x in self._data]
 
+    def _cache_identity(self):
+        return "[NumpyFileReader files=%s]" % files_identity(self._filenames)
+
+    def _has_random_access(self):
+        return True
+
+    def _frames(self, itraj, frames):
+        return self._data[itraj][frames]
+
     def __load_file(self, filename):
         assert filename in self._filenames
 
@@ -28,6 +28,7 @@ Created on 11.04.2015
 @author: marscher
 '''
 from pyemma.coordinates.data.interface import ReaderInterface
+from pyemma.coordinates.util.dtraj_cache import files_identity
 import numpy as np
 import csv
 
@@ -128,6 +129,9 @@ class PyCSVReader(ReaderInterface):
     def describe(self):
         return "[CSVReader files=%s]" % self._filenames
 
+    def _cache_identity(self):
+        return "[CSVReader files=%s skip=%i]" % (files_identity(self._filenames), self._skip)
+
     def __set_dimensions_and_lenghts(self):
         # number of trajectories/data sets
         self._ntraj = len(self._filenames)
@@ -145,7 +145,7 @@ class TestCluster(unittest.TestCase):
 
     def test_output_type(self):
         c = self.ass
-        assert c.output_type() == np.int64
+        assert c.output_type() == np.int16
 
     def test_parametrize(self):
         c = self.ass
@@ -178,6 +178,85 @@ class TestCluster(unittest.TestCase):
         assert len(c.trajectory_lengths()) == 1
         assert c.trajectory_lengths()[0] == c.trajectory_length(0)
 
+    def test_blocked_euclidean(self):
+        from pyemma.coordinates.clustering import interface, regspatial
+        rs = np.random.RandomState(0)
+        X = rs.randn(3000, 7).astype(np.float32) + 100
+        centers = X[rs.permutation(3000)[:400]]
+        ref = np.empty(len(X), dtype=np.int32)
+        regspatial.assign(X, centers, ref, 'euclidean')
+        block_elements = interface._ASSIGN_BLOCK_ELEMENTS
+        try:
+            # several blocks, the last one incomplete
+            interface._ASSIGN_BLOCK_ELEMENTS = 400 * 128
+            dtraj = np.empty(len(X), dtype=np.int64)
+            interface._assign_euclidean(X, centers, dtraj)
+        finally:
+            interface._ASSIGN_BLOCK_ELEMENTS = block_elements
+        np.testing.assert_equal(dtraj, ref)
+        assign = coor.assign_to_centers(X.astype(np.float64), centers)
+        np.testing.assert_equal(assign[0], ref)
+
+    def test_compact_dtype(self):
+        X = np.random.RandomState(0).rand(100, 9).astype(np.float32)
+        assign = coor.assign_to_centers(X, X[:10], metric='minRMSD')
+        assert assign[0].dtype == np.int16
+        assert 0 <= assign[0].min() and assign[0].max() < 10
+        # more centers than int16 can index
+        centers = np.random.RandomState(1).rand(2 ** 15, 2).astype(np.float32)
+        assign = coor.assign_to_centers(centers[-100:], centers)
+        assert assign[0].dtype == np.int32
+        np.testing.assert_equal(assign[0], np.arange(2 ** 15 - 100, 2 ** 15))
+
+    def test_minRMSD(self):
+        rs = np.random.RandomState(3)
+        n_atoms = 20
+        centers = rs.randn(30, n_atoms, 3)
+        labels = rs.randint(0, 30, size=2000)
+        # random rotations, translations and small perturbations of the centers
+        X = np.empty((len(labels), n_atoms, 3))
+        for i, l in enumerate(labels):
+            q, _ = np.linalg.qr(rs.randn(3, 3))
+            X[i] = np.dot(centers[l], q.T) + rs.randn(3) * 10 + rs.randn(n_atoms, 3) * 0.01
+        X = X.reshape(len(X), -1).astype(np.float32)
+        reader = coor.source(X)
+        reader.chunksize = 300
+        assign = coor.assign_to_centers(reader, centers.reshape(30, -1), metric='minRMSD')
+        np.testing.assert_equal(assign[0], labels)
+
+    def test_kdtree(self):
+        rs = np.random.RandomState(1)
+        X = rs.randn(5000, 2)
+        centers = X[rs.permutation(5000)[:1000]]
+        ref = np.argmin(((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+        reader = coor.source(X)
+        reader.chunksize = 700
+        assign = coor.assign_to_centers(reader, centers=centers, return_dtrajs=False)
+        np.testing.assert_equal(assign.dtrajs[0], ref)
+        # the tree is built once and reused
+        tree = assign._kdtree
+        assert tree is not None
+        np.testing.assert_equal(assign.assign(X[:10]), ref[:10])
+        assert assign._kdtree is tree
+        # new centers discard it
+        assign.clustercenters = centers[:100]
+        assert assign._kdtree is None
+
+    def test_kdtree_selection(self):
+        from pyemma.coordinates.clustering.interface import _use_kdtree, _KDTREE_MAX_DIM, _KDTREE_MIN_CENTERS
+        assert len(_KDTREE_MIN_CENTERS) == _KDTREE_MAX_DIM
+        for dim in xrange(1, _KDTREE_MAX_DIM + 1):
+            n = _KDTREE_MIN_CENTERS[dim - 1]
+            assert not _use_kdtree(n - 1, dim)
+            assert _use_kdtree(n, dim)
+        assert not _use_kdtree(10 ** 6, _KDTREE_MAX_DIM + 1)
+        # a clustering uses the tree only above the cutoff
+        X = np.random.RandomState(2).randn(2000, 2)
+        for n_centers, uses_tree in ((_KDTREE_MIN_CENTERS[1] - 1, False), (_KDTREE_MIN_CENTERS[1], True)):
+            assign = coor.assign_to_centers(X, centers=X[:n_centers], return_dtrajs=False)
+            assign.dtrajs
+            assert (assign._kdtree is not None) == uses_tree
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
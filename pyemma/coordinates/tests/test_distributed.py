@@ -0,0 +1,122 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy as np
+
+from pyemma.coordinates import pca, tica
+from pyemma.coordinates.util.distributed import LocalCommunicator, run_local
+
+
+def _shard(trajs, comm):
+    return trajs[comm.rank::comm.size]
+
+
+def _tica(comm, trajs, lag, dim):
+    t = tica(_shard(trajs, comm), lag=lag, dim=dim, comm=comm)
+    return t.mu, t.cov, t.cov_tau, t.eigenvalues, t.eigenvectors, t.get_output()
+
+
+def _pca(comm, trajs, dim):
+    p = pca(_shard(trajs, comm), dim=dim, comm=comm)
+    return p.mu, p.cov, p.eigenvalues, p.eigenvectors, p.get_output()
+
+
+def _tica_partial_fit(comm, trajs, lag, dim):
+    shard = _shard(trajs, comm)
+    t = tica(lag=lag, dim=dim, comm=comm)
+    # partial_fit is collective, so all ranks call it equally often
+    t.partial_fit(shard[:1])
+    t.partial_fit(shard[1:])
+    return t.cov, t.cov_tau, t.eigenvalues
+
+
+def _collectives(comm):
+    gathered = [comm.allgather(comm.rank * i) for i in xrange(3)]
+    return gathered, comm.bcast(comm.rank + 10, root=1)
+
+
+def _fail(comm):
+    if comm.rank == 1:
+        raise ValueError('failure on rank 1')
+    return comm.allgather(comm.rank)
+
+
+class TestDistributed(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rs = np.random.RandomState(17)
+        cls.trajs = [np.cumsum(rs.randn(n, 4), axis=0) for n in (300, 120, 250, 80, 400)]
+        cls.lag = 5
+        cls.dim = 2
+
+    def test_collectives(self):
+        res = run_local(_collectives, 3)
+        for gathered, b in res:
+            self.assertEqual(gathered, [[0, 0, 0], [0, 1, 2], [0, 2, 4]])
+            self.assertEqual(b, 11)
+
+    def test_failure(self):
+        with self.assertRaises(RuntimeError):
+            run_local(_fail, 3)
+
+    def test_tica(self):
+        ref = tica(self.trajs, lag=self.lag, dim=self.dim)
+        res = run_local(_tica, 3, (self.trajs, self.lag, self.dim))
+        for rank, (mu, cov, cov_tau, ev, evec, Y) in enumerate(res):
+            np.testing.assert_allclose(mu, ref.mu)
+            np.testing.assert_allclose(cov, ref.cov, rtol=1e-10)
+            np.testing.assert_allclose(cov_tau, ref.cov_tau, rtol=1e-10)
+            # identical on all ranks, as broadcast from rank 0
+            np.testing.assert_array_equal(ev, res[0][3])
+            np.testing.assert_array_equal(evec, res[0][4])
+            np.testing.assert_allclose(ev, ref.eigenvalues, rtol=1e-8)
+            # the output of every rank is the projection of its shard
+            for y, x in zip(Y, self.trajs[rank::3]):
+                signs = np.sign(np.dot(ref.eigenvectors[:, :self.dim].T, evec[:, :self.dim]).diagonal())
+                np.testing.assert_allclose(y * signs, ref.map(x), rtol=1e-3, atol=1e-3)
+
+    def test_tica_partial_fit(self):
+        ref = tica(self.trajs, lag=self.lag, dim=self.dim)
+        res = run_local(_tica_partial_fit, 2, (self.trajs, self.lag, self.dim))
+        for cov, cov_tau, ev in res:
+            np.testing.assert_allclose(cov, ref.cov, rtol=1e-10)
+            np.testing.assert_allclose(cov_tau, ref.cov_tau, rtol=1e-10)
+            np.testing.assert_allclose(ev, ref.eigenvalues, rtol=1e-8)
+
+    def test_pca(self):
+        ref = pca(self.trajs, dim=self.dim)
+        res = run_local(_pca, 4, (self.trajs, self.dim))
+        for mu, cov, ev, evec, Y in res:
+            np.testing.assert_allclose(mu, ref.mu)
+            np.testing.assert_allclose(cov, ref.cov, rtol=1e-10)
+            np.testing.assert_allclose(ev, ref.eigenvalues, rtol=1e-8)
+            np.testing.assert_array_equal(evec, res[0][3])
+
+
+if __name__ == "__main__":
+    unittest.main()
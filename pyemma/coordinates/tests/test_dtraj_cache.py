@@ -0,0 +1,167 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import mdtraj
+
+from pyemma.coordinates import api
+from pyemma.coordinates.util import dtraj_cache
+from pyemma.util.config import conf_values
+
+path = os.path.join(os.path.split(__file__)[0], 'data')
+xtcfile = os.path.join(path, 'bpti_mini.xtc')
+pdbfile = os.path.join(path, 'bpti_ca.pdb')
+
+
+class TestDtrajCache(unittest.TestCase):
+
+    def setUp(self):
+        self._cache = conf_values['pyemma'].get('coordinates_dtraj_cache')
+        self.tmpdir = tempfile.mkdtemp()
+        conf_values['pyemma']['coordinates_dtraj_cache'] = os.path.join(self.tmpdir, 'cache')
+        rs = np.random.RandomState(4)
+        self.files = []
+        for i, n in enumerate((400, 250)):
+            f = os.path.join(self.tmpdir, '%i.npy' % i)
+            np.save(f, rs.randn(n, 3))
+            self.files.append(f)
+
+    def tearDown(self):
+        if self._cache is None:
+            del conf_values['pyemma']['coordinates_dtraj_cache']
+        else:
+            conf_values['pyemma']['coordinates_dtraj_cache'] = self._cache
+        shutil.rmtree(self.tmpdir)
+
+    def _entries(self):
+        return os.listdir(dtraj_cache.cache_dir())
+
+    def test_roundtrip(self):
+        clustering = api.cluster_regspace(api.source(self.files), dmin=1.0)
+        ref = clustering.dtrajs
+        assert len(self._entries()) == 1
+        # the same discretization of the same files is read from the cache
+        assigned = api.assign_to_centers(api.source(self.files), centers=clustering.clustercenters)
+        assert len(self._entries()) == 1
+        for d, r in zip(assigned, ref):
+            np.testing.assert_array_equal(d, r)
+            assert d.dtype == r.dtype
+        # and not computed again
+        key = self._entries()[0][:-len('.npz')]
+        dtraj_cache.store(key, [r[::-1] for r in ref])
+        assigned = api.assign_to_centers(api.source(self.files), centers=clustering.clustercenters)
+        np.testing.assert_array_equal(assigned[0], ref[0][::-1])
+        # another stride is another entry
+        clustering.assign(stride=3)
+        assert len(self._entries()) == 2
+
+    def test_unwritable_cache(self):
+        # the cache directory can't be created below a regular file
+        blocker = os.path.join(self.tmpdir, 'blocker')
+        open(blocker, 'w').close()
+        conf_values['pyemma']['coordinates_dtraj_cache'] = os.path.join(blocker, 'cache')
+        clustering = api.cluster_regspace(api.source(self.files), dmin=1.0)
+        ref = clustering.dtrajs
+        assert [len(d) for d in ref] == [400, 250]
+        assigned = api.assign_to_centers(api.source(self.files), centers=clustering.clustercenters)
+        for d, r in zip(assigned, ref):
+            np.testing.assert_array_equal(d, r)
+
+    def test_key(self):
+        reader = api.source(self.files)
+        centers = np.zeros((2, 3))
+        key = dtraj_cache.cache_key(centers, 'euclidean', 1, reader)
+        assert key != dtraj_cache.cache_key(centers + 1, 'euclidean', 1, reader)
+        assert key != dtraj_cache.cache_key(centers, 'minRMSD', 1, reader)
+        assert key != dtraj_cache.cache_key(centers, 'euclidean', 2, reader)
+        # modified files get a new key
+        np.save(self.files[0], np.ones((10, 3)))
+        os.utime(self.files[0], (0, 0))
+        assert key != dtraj_cache.cache_key(centers, 'euclidean', 1, api.source(self.files))
+        # data in memory is not cached
+        assert dtraj_cache.cache_key(centers, 'euclidean', 1, api.source(np.ones((10, 3)))) is None
+        conf_values['pyemma']['coordinates_dtraj_cache'] = ''
+        assert dtraj_cache.cache_key(centers, 'euclidean', 1, reader) is None
+
+    def test_tica_source(self):
+        tica_obj = api.tica(api.source(self.files), lag=2, dim=2)
+        key = dtraj_cache.cache_key(np.zeros((2, 2)), 'euclidean', 1, tica_obj)
+        assert key is not None
+        tica_obj.scaling = 'kinetic_map'
+        assert key != dtraj_cache.cache_key(np.zeros((2, 2)), 'euclidean', 1, tica_obj)
+
+    def _feature_key(self, add_features):
+        feat = api.featurizer(pdbfile)
+        add_features(feat)
+        return dtraj_cache.cache_key(np.zeros((2, feat.dimension())), 'euclidean', 1,
+                                     api.source(xtcfile, features=feat))
+
+    def test_feature_key(self):
+        pairs = np.array([[0, 10], [3, 15], [5, 20]])
+        key = self._feature_key(lambda f: f.add_distances(pairs, periodic=True))
+        assert key is not None
+        assert key == self._feature_key(lambda f: f.add_distances(pairs, periodic=True))
+        # features differing only in their parameters have different keys
+        assert key != self._feature_key(lambda f: f.add_distances(pairs, periodic=False))
+        assert key != self._feature_key(lambda f: f.add_distances(pairs[::-1], periodic=True))
+        assert key != self._feature_key(lambda f: f.add_inverse_distances(pairs, periodic=True))
+        assert self._feature_key(lambda f: f.add_contacts(pairs, threshold=3.0)) != \
+            self._feature_key(lambda f: f.add_contacts(pairs, threshold=9.0))
+        triples = np.array([[0, 1, 2], [5, 6, 7]])
+        assert self._feature_key(lambda f: f.add_angles(triples, deg=True)) != \
+            self._feature_key(lambda f: f.add_angles(triples, deg=False))
+        ref = mdtraj.load(xtcfile, top=pdbfile)
+        assert self._feature_key(lambda f: f.add_minrmsd_to_ref(ref[0])) != \
+            self._feature_key(lambda f: f.add_minrmsd_to_ref(ref[1]))
+        # custom functions can't be identified across sessions
+        assert self._feature_key(lambda f: f.add_custom_func(lambda t: t.xyz[:, :, 0], 58)) is None
+
+    def test_feature_roundtrip(self):
+        pairs = np.array([[0, 10], [3, 15], [5, 20]])
+        centers = np.array([[1.0, 1.0, 1.0], [2.0, 2.0, 2.0]])
+        for periodic in (True, False):
+            feat = api.featurizer(pdbfile)
+            feat.add_distances(pairs, periodic=periodic)
+            api.assign_to_centers(api.source(xtcfile, features=feat), centers=centers)
+        # the second featurization does not read the entry of the first
+        assert len(self._entries()) == 2
+
+    def test_compact_storage(self):
+        dtrajs = [np.arange(10), np.array([], dtype=np.int64)]
+        dtraj_cache.store('a', dtrajs)
+        dtraj_cache.store('b', [np.array([0, 40000])])
+        assert dtraj_cache.load('a')[0].dtype == np.int16
+        assert len(dtraj_cache.load('a')[1]) == 0
+        assert dtraj_cache.load('b')[0].dtype == np.int32
+        np.testing.assert_array_equal(dtraj_cache.load('a')[0], dtrajs[0])
+        assert dtraj_cache.load('c') is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,7 +30,7 @@ import os
 import mdtraj
 
 # from pyemma.coordinates.data import featurizer as ft
-from pyemma.coordinates.data.featurizer import MDFeaturizer, CustomFeature
+from pyemma.coordinates.data.featurizer import MDFeaturizer, CustomFeature, CustomKernelFeature
 # from pyemma.coordinates.tests.test_discretizer import create_water_topology_on_disc
 
 path = os.path.join(os.path.split(__file__)[0], 'data')
@@ -154,6 +154,24 @@ class TestFeaturizer(unittest.TestCase):
         assert(np.alltrue(Y >= -180.0))
         assert(np.alltrue(Y <= 180.0))
 
+    def test_minrmsd(self):
+        ref_frames = [0, 5, 10]
+        self.feat.add_minrmsd_to_ref(self.traj, ref_frames=ref_frames)
+        assert(self.feat.dimension() == len(ref_frames))
+        Y = self.feat.map(self.traj)
+        for j, frame in enumerate(ref_frames):
+            ref = mdtraj.rmsd(self.traj, self.traj, frame)
+            np.testing.assert_allclose(Y[:, j], ref, atol=1e-3)
+
+    def test_minrmsd_atom_indices(self):
+        atoms = np.array([1, 2, 5, 20, 30], dtype=int)
+        self.feat.add_distances([[0, 10], [3, 15]], periodic=False)
+        self.feat.add_minrmsd_to_ref(xtcfile, ref_frames=2, atom_indices=atoms)
+        assert(self.feat.dimension() == 3)
+        Y = self.feat.map(self.traj)
+        ref = mdtraj.rmsd(self.traj, self.traj, 2, atom_indices=atoms)
+        np.testing.assert_allclose(Y[:, 2], ref, atol=1e-3)
+
     def test_backbone_dihedrals(self):
         # TODO: test me
         pass
@@ -163,9 +181,97 @@ class TestFeaturizer(unittest.TestCase):
         pass
 
     def test_custom_feature(self):
-        # TODO: test me
-        pass
+        self.feat.add_custom_feature(CustomFeature(lambda t: t.xyz[:, :, 0], dim=self.traj.n_atoms))
+        Y = self.feat.map(self.traj)
+        assert(Y.dtype == np.float32)
+        assert(np.all(Y == self.traj.xyz[:, :, 0]))
+
+    def test_custom_feature_wrong_dimension(self):
+        self.feat.add_custom_feature(CustomFeature(lambda t: t.xyz[:, :, 0], dim=3))
+        with self.assertRaises(ValueError):
+            self.feat.map(self.traj)
+
+    def test_custom_feature_validation(self):
+        # float64 output can not be safely casted to float32
+        f = CustomFeature(lambda t: t.xyz[:, :, 0].astype(np.float64), dim=self.traj.n_atoms)
+        self.feat.add_custom_feature(f)
+        with self.assertRaises((TypeError, ValueError)):
+            self.feat.map(self.traj)
+        f = CustomFeature(lambda t: t.xyz[:, :, 0].astype(np.float64), dim=self.traj.n_atoms,
+                          validate=False)
+        feat = MDFeaturizer(self.pdbfile)
+        feat.add_custom_feature(f)
+        np.testing.assert_allclose(feat.map(self.traj), self.traj.xyz[:, :, 0])
+
+    def test_custom_kernel(self):
+        def kernel(traj, out, axis):
+            np.sum(traj.xyz ** 2, axis=axis, out=out)
+        sel = np.array([1, 2, 5, 20], dtype=int)
+        self.feat.add_selection(sel)
+        self.feat.add_custom_kernel(kernel, self.traj.n_atoms, np.float32, 'squared norms', 2)
+        assert(self.feat.dimension() == sel.shape[0] * 3 + self.traj.n_atoms)
+        Y = self.feat.map(self.traj)
+        assert(np.all(Y[:, :12] == np.reshape(self.traj.xyz[:, sel, :], (len(self.traj), 12))))
+        assert(np.allclose(Y[:, 12:], np.sum(self.traj.xyz ** 2, axis=2)))
+        # second call skips validation, result has to stay the same
+        assert(np.all(Y == self.feat.map(self.traj)))
+
+    def test_custom_kernel_dtype(self):
+        def kernel(traj, out):
+            out[:] = np.arange(out.shape[1])
+        f = CustomKernelFeature(kernel, 3, dtype=np.int16)
+        self.feat.add_custom_feature(f)
+        Y = self.feat.map(self.traj)
+        assert(Y.dtype == np.float32)
+        assert(np.all(Y == np.arange(3)))
+
+        with self.assertRaises(ValueError):
+            CustomKernelFeature(kernel, 3, dtype=np.float64)
+        with self.assertRaises(ValueError):
+            CustomKernelFeature(kernel, 3, dtype=np.bool_)
+
+    def test_custom_kernel_integer_validation(self):
+        def kernel(traj, out):
+            out[:, 0] = 1
+        self.feat.add_custom_kernel(kernel, 2, np.int16)
+        with self.assertRaises(ValueError):
+            self.feat.map(self.traj)
+
+    def test_custom_kernel_validation(self):
+        def kernel(traj, out):
+            out[:, 0] = 1
+        self.feat.add_custom_kernel(kernel, 2)
+        with self.assertRaises(ValueError):
+            self.feat.map(self.traj)
+
+
+    def test_plan_shared_pairs(self):
+        pairs = np.array([[0, 10], [3, 15], [5, 20]])
+        self.feat.add_distances(pairs, periodic=False)
+        self.feat.add_inverse_distances(pairs[::-1], periodic=False)
+        self.feat.add_contacts(pairs[1:], threshold=0.5, periodic=False)
+        self.feat.add_angles([[0, 1, 2], [2, 3, 4]])
+        self.feat.add_dihedrals([[0, 1, 2, 3]], deg=True)
+
+        plan = self.feat.compile()
+        # every distinct pair is computed exactly once
+        kernels = dict(plan.kernels)
+        assert(kernels[('distances', False)].shape == (3, 2))
 
+        Y = self.feat.map(self.traj)
+        ref = np.hstack([f.map(self.traj) for f in self.feat.active_features])
+        assert(Y.shape == (len(self.traj), self.feat.dimension()))
+        np.testing.assert_allclose(Y, ref, rtol=1e-5)
+
+    def test_plan_recompiled(self):
+        self.feat.add_distances([[0, 10]], periodic=False)
+        plan = self.feat.compile()
+        assert(self.feat.compile() is plan)
+        self.feat.add_distances([[3, 15]], periodic=False)
+        assert(self.feat.compile() is not plan)
+        Y = self.feat.map(self.traj)
+        ref = mdtraj.compute_distances(self.traj, [[0, 10], [3, 15]], periodic=False)
+        np.testing.assert_allclose(Y, ref)
 
 class TestFeaturizerNoDubs(unittest.TestCase):
 
@@ -32,7 +32,11 @@ import unittest
 import tempfile
 import os
 import numpy as np
-from pyemma.coordinates.api import cluster_kmeans
+from pyemma.coordinates.api import cluster_kmeans, cluster_mini_batch_kmeans, cluster_coreset_kmeans, \
+    cluster_hierarchical_kmeans
+from pyemma.coordinates.clustering import kmeans as kmeans_module
+from pyemma.coordinates.clustering.kmeans import KmeansClustering, _split_clusters
+from pyemma.coordinates.data.data_in_memory import DataInMemory
 import shutil
 
 
@@ -98,5 +102,210 @@ class TestKmeans(unittest.TestCase):
         for f in names:
             os.stat(f)
 
+    def test_lloyd(self):
+        np.random.seed(1)
+        means = np.array([[-4.0, 0.0], [0.0, 4.0], [4.0, 0.0]])
+        X = np.vstack([m + 0.5 * np.random.randn(200, 2) for m in means])
+        reader = DataInMemory([X[:250], X[250:]])
+        reader.chunksize = 40
+        kmeans = cluster_kmeans(reader, k=3, max_iter=50)
+        cc = kmeans.clustercenters
+        # centers are the means of their Voronoi cells
+        dtraj = np.concatenate(kmeans.dtrajs)
+        for j in xrange(3):
+            np.testing.assert_allclose(cc[j], X[dtraj == j].mean(axis=0), rtol=1e-4, atol=1e-4)
+        for m in means:
+            assert np.min(np.linalg.norm(cc - m, axis=1)) < 0.2
+
+    def test_lloyd_pass(self):
+        rs = np.random.RandomState(5)
+        X = rs.randn(1000, 4)
+        centers = X[:20].copy()
+        kmeans = KmeansClustering(20)
+        kmeans._centers = centers.copy()
+        kmeans.clustercenters = np.array(centers, dtype=np.float32)
+        kmeans._sums = np.zeros_like(centers)
+        kmeans._counts = np.zeros(20, dtype=np.int64)
+
+        def fail(*args):
+            raise AssertionError('euclidean frames are assigned by matrix products')
+        accumulate = kmeans_module.regspatial.kmeans_accumulate
+        kmeans_module.regspatial.kmeans_accumulate = fail
+        try:
+            kmeans._begin_pass()
+            for start in xrange(0, len(X), 300):
+                kmeans._add_chunk(X[start:start + 300])
+            kmeans._end_pass()
+        finally:
+            kmeans_module.regspatial.kmeans_accumulate = accumulate
+        dtraj = np.argmin(((X[:, None, :] - centers[None]) ** 2).sum(axis=2), axis=1)
+        np.testing.assert_equal(kmeans._counts, np.bincount(dtraj, minlength=20))
+        for j in xrange(20):
+            np.testing.assert_allclose(kmeans.clustercenters[j], X[dtraj == j].mean(axis=0), rtol=1e-5)
+
+    def test_minRMSD(self):
+        np.random.seed(2)
+        n_atoms = 6
+        refs = [np.random.randn(n_atoms, 3) for _ in xrange(2)]
+        frames = []
+        for i in xrange(100):
+            q, _ = np.linalg.qr(np.random.randn(3, 3))
+            x = refs[i % 2] + 0.01 * np.random.randn(n_atoms, 3)
+            frames.append((np.dot(x, q) + np.random.randn(3)).ravel())
+        X = np.array(frames, dtype=np.float32)
+        kmeans = cluster_kmeans(X, k=2, max_iter=10, metric='minRMSD')
+        dtraj = kmeans.dtrajs[0]
+        # frames of the same structure share a state, irrespective of rotation and translation
+        assert len(np.unique(dtraj[::2])) == 1
+        assert len(np.unique(dtraj[1::2])) == 1
+        assert dtraj[0] != dtraj[1]
+        # and the centers are the mean structures
+        for j in xrange(2):
+            center = kmeans.clustercenters[dtraj[j]].reshape(n_atoms, 3)
+            ref = refs[j] - refs[j].mean(axis=0)
+            dists = np.linalg.norm(center, axis=1)
+            np.testing.assert_allclose(np.sort(dists), np.sort(np.linalg.norm(ref, axis=1)), atol=0.02)
+
+
+class TestMiniBatchKmeans(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(42)
+        self.means = np.array([[-5.0, 0.0], [0.0, 5.0], [5.0, 0.0]])
+        self.trajs = [np.vstack([m + 0.3 * np.random.randn(n, 2) for m in self.means])
+                      for n in (400, 150)]
+
+    def test_3gaussian_2d_multitraj(self):
+        reader = DataInMemory(self.trajs)
+        reader.chunksize = 50
+        kmeans = cluster_mini_batch_kmeans(reader, k=3, max_iter=20, reservoir_size=100)
+        cc = kmeans.clustercenters
+        assert cc.shape == (3, 2)
+        assert cc.dtype == np.float32
+        # every true mean is found
+        for m in self.means:
+            assert np.min(np.linalg.norm(cc - m, axis=1)) < 0.1
+
+        dtrajs = kmeans.dtrajs
+        assert len(dtrajs) == 2
+        # frames of the same gaussian share a state
+        assert len(np.unique(dtrajs[0][:400])) == 1
+        assert len(np.unique(dtrajs[0])) == 3
+
+    def test_too_many_clusters(self):
+        kmeans = cluster_mini_batch_kmeans(np.random.randn(5, 2), k=10)
+        assert kmeans.n_clusters == 5
+        assert kmeans.clustercenters.shape == (5, 2)
+
+    def test_reservoir_size(self):
+        with self.assertRaises(ValueError):
+            cluster_mini_batch_kmeans(k=10, reservoir_size=5)
+
+
+class TestCoresetKmeans(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(43)
+        self.means = np.array([[-5.0, 0.0], [0.0, 5.0], [5.0, 0.0]])
+        self.trajs = [np.vstack([m + 0.3 * np.random.randn(n, 2) for m in self.means])
+                      for n in (400, 150)]
+
+    def test_3gaussian_2d_multitraj(self):
+        reader = DataInMemory(self.trajs)
+        reader.chunksize = 50
+        kmeans = cluster_coreset_kmeans(reader, k=3, coreset_size=300, reservoir_size=100)
+        cc = kmeans.clustercenters
+        assert cc.shape == (3, 2)
+        for m in self.means:
+            assert np.min(np.linalg.norm(cc - m, axis=1)) < 0.1
+        dtrajs = kmeans.dtrajs
+        assert len(np.unique(dtrajs[0][:400])) == 1
+        assert len(np.unique(dtrajs[0])) == 3
+
+    def test_full_coreset(self):
+        # a coreset of all frames gives k-means on the full data
+        X = np.vstack(self.trajs)
+        kmeans = cluster_coreset_kmeans(X, k=3, coreset_size=len(X))
+        dtraj = kmeans.dtrajs[0]
+        for j in xrange(3):
+            np.testing.assert_allclose(kmeans.clustercenters[j], X[dtraj == j].mean(axis=0), rtol=1e-5, atol=1e-5)
+
+    def test_cost(self):
+        # the k-means cost is close to the one of k-means on all data
+        X = np.random.RandomState(0).randn(20000, 3)
+        reader = DataInMemory(X)
+        reader.chunksize = 1000
+
+        def cost(kmeans):
+            dtraj = kmeans.dtrajs[0]
+            return np.sum((X - kmeans.clustercenters[dtraj]) ** 2)
+        full = cluster_kmeans(reader, k=10, max_iter=50)
+        coreset = cluster_coreset_kmeans(reader, k=10, coreset_size=2000)
+        assert cost(coreset) < 1.05 * cost(full)
+
+    def test_sizes(self):
+        with self.assertRaises(ValueError):
+            cluster_coreset_kmeans(k=10, coreset_size=5)
+        kmeans = cluster_coreset_kmeans(np.random.randn(5, 2), k=10)
+        assert kmeans.clustercenters.shape == (5, 2)
+
+
+class TestHierarchicalKmeans(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(44)
+        # 4 well separated blobs, each with 4 sub-blobs
+        coarse = np.array([[-20.0, 0.0], [0.0, 20.0], [20.0, 0.0], [0.0, -20.0]])
+        fine = np.array([[-2.0, -2.0], [-2.0, 2.0], [2.0, -2.0], [2.0, 2.0]])
+        self.means = (coarse[:, None, :] + fine[None, :, :]).reshape(-1, 2)
+        self.X = np.vstack([m + 0.2 * np.random.randn(100, 2) for m in self.means])
+
+    def test_blobs(self):
+        reader = DataInMemory(self.X)
+        reader.chunksize = 150
+        kmeans = cluster_hierarchical_kmeans(reader, k=16, n_coarse=4, max_iter=10)
+        cc = kmeans.clustercenters
+        assert cc.shape == (16, 2)
+        for m in self.means:
+            assert np.min(np.linalg.norm(cc - m, axis=1)) < 0.1
+        dtraj = kmeans.dtrajs[0]
+        for i in xrange(16):
+            assert len(np.unique(dtraj[100 * i:100 * (i + 1)])) == 1
+        # the centers are the means of their frames
+        for j in xrange(16):
+            np.testing.assert_allclose(cc[j], self.X[dtraj == j].mean(axis=0), atol=1e-4)
+        np.testing.assert_equal(kmeans.assign(self.X[::7]), dtraj[::7])
+
+    def test_two_level_assignment(self):
+        kmeans = cluster_hierarchical_kmeans(self.X, k=40, max_iter=2)
+        assert kmeans.n_clusters == 40
+        assert kmeans.n_coarse == 7
+        # frames are assigned to the closest center within their coarse cell
+        Y = np.random.randn(500, 2) * 15
+        cells = np.argmin(np.sum((Y[:, None, :] - kmeans._coarse_centers[None]) ** 2, axis=2), axis=1)
+        dtraj = kmeans.assign(Y)
+        for y, c, s in zip(Y, cells, dtraj):
+            begin, end = kmeans._cell_offsets[c], kmeans._cell_offsets[c + 1]
+            assert begin <= s < end
+            d = np.sum((kmeans.clustercenters[begin:end] - y) ** 2, axis=1)
+            assert d[s - begin] <= d.min() + 1e-4
+
+    def test_split_clusters(self):
+        n = _split_clusters(10, np.array([50, 0, 30, 1, 19]))
+        np.testing.assert_equal(n, [5, 0, 3, 1, 1])
+        n = _split_clusters(4, np.array([1, 1, 1, 1, 100]))
+        np.testing.assert_equal(n, [1, 1, 1, 1, 1])
+        n = _split_clusters(100, np.array([3, 200]))
+        np.testing.assert_equal(n, [1, 99])
+        n = _split_clusters(100, np.array([3, 5]))
+        np.testing.assert_equal(n, [3, 5])
+
+    def test_too_many_clusters(self):
+        kmeans = cluster_hierarchical_kmeans(np.random.randn(5, 2), k=10)
+        assert kmeans.clustercenters.shape == (5, 2)
+        with self.assertRaises(ValueError):
+            cluster_hierarchical_kmeans(k=10, n_coarse=11)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -33,6 +33,7 @@ import unittest
 import numpy as np
 
 from pyemma.coordinates import pca
+from pyemma.coordinates.data.data_in_memory import DataInMemory
 from pyemma.util.log import getLogger
 import pyemma.util.types as types
 
@@ -158,5 +159,23 @@ class TestPCAExtensive(unittest.TestCase):
         assert len(self.pca_obj.trajectory_lengths()) == 1
         assert self.pca_obj.trajectory_lengths()[0] == self.pca_obj.trajectory_length(0)
 
+    def test_mean_cov(self):
+        np.testing.assert_allclose(self.pca_obj.mean, np.mean(self.X, axis=0))
+        np.testing.assert_allclose(self.pca_obj.cov, np.cov(self.X.T))
+
+    def test_partial_fit(self):
+        pca_obj = pca(data=self.X[:4000], dim=1)
+        pca_obj.partial_fit([self.X[4000:7000], self.X[7000:]])
+        np.testing.assert_allclose(pca_obj.mean, np.mean(self.X, axis=0))
+        np.testing.assert_allclose(pca_obj.cov, np.cov(self.X.T))
+        np.testing.assert_allclose(pca_obj.eigenvalues, self.pca_obj.eigenvalues)
+
+    def test_n_jobs(self):
+        d = DataInMemory([self.X[:3000], self.X[3000:]])
+        d.chunksize = 100
+        pca_obj = pca(data=d, dim=1, n_jobs=3)
+        np.testing.assert_allclose(pca_obj.mean, self.pca_obj.mean)
+        np.testing.assert_allclose(pca_obj.cov, self.pca_obj.cov)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
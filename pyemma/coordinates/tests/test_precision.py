@@ -0,0 +1,87 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy as np
+
+from pyemma.coordinates import api
+from pyemma.coordinates.data.data_in_memory import DataInMemory
+from pyemma.coordinates.util.precision import precision_policy, stream_array
+from pyemma.util.config import conf_values
+
+
+class TestPrecisionPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self._policy = conf_values['pyemma'].get('coordinates_precision')
+        rs = np.random.RandomState(3)
+        self.trajs = [np.cumsum(rs.randn(n, 4), axis=0) for n in (500, 300)]
+
+    def tearDown(self):
+        if self._policy is None:
+            del conf_values['pyemma']['coordinates_precision']
+        else:
+            conf_values['pyemma']['coordinates_precision'] = self._policy
+
+    def _output(self, precision):
+        conf_values['pyemma']['coordinates_precision'] = precision
+        reader = DataInMemory(self.trajs)
+        reader.chunksize = 50
+        tica_obj = api.tica(reader, lag=3, dim=2)
+        clustering = api.cluster_regspace(tica_obj, dmin=1.0)
+        chunks = [X for _, X in tica_obj.iterator()]
+        return reader, tica_obj, chunks, clustering.dtrajs
+
+    def test_mixed(self):
+        reader, tica_obj, chunks, _ = self._output('mixed')
+        assert precision_policy() == 'mixed'
+        assert reader._data[0].dtype == np.float64
+        assert all(X.dtype == np.float64 for X in chunks)
+
+    def test_float32(self):
+        _, ref, _, _ = self._output('mixed')
+        reader, tica_obj, chunks, dtrajs = self._output('float32')
+        assert reader._data[0].dtype == np.float32
+        assert all(X.dtype == np.float32 for X in chunks)
+        # moments are still accumulated in double precision
+        assert tica_obj.cov.dtype == np.float64
+        np.testing.assert_allclose(tica_obj.cov, ref.cov, rtol=1e-5)
+        np.testing.assert_allclose(tica_obj.eigenvalues, ref.eigenvalues, rtol=1e-5)
+        assert len(dtrajs) == len(self.trajs)
+
+    def test_stream_array(self):
+        X = np.ones((3, 2), dtype=np.float32)
+        conf_values['pyemma']['coordinates_precision'] = 'float32'
+        assert stream_array(X) is X
+        assert stream_array(X.astype(np.float64)).dtype == np.float32
+        assert stream_array(None) is None
+        conf_values['pyemma']['coordinates_precision'] = 'double'
+        with self.assertRaises(ValueError):
+            stream_array(X)
+
+
+if __name__ == "__main__":
+    unittest.main()
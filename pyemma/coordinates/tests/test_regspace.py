@@ -122,5 +122,26 @@ class TestRegSpaceClustering(unittest.TestCase):
 
         self.clustering.assign(data_to_cluster, stride=1)
 
+    def _assert_sequential_reference(self, X, dmin):
+        centers = [X[0]]
+        for x in X[1:]:
+            if np.min(np.linalg.norm(np.array(centers) - x, axis=1)) > dmin:
+                centers.append(x)
+        reader = DataInMemory(X)
+        reader.chunksize = 300
+        clustering = cluster_regspace(reader, dmin=dmin, max_centers=10000)
+        np.testing.assert_allclose(clustering.clustercenters, np.array(centers), rtol=1e-6)
+
+    def test_sequential_reference(self):
+        # the parallel and pruned search finds the same centers as a plain
+        # sequential scan, also across chunks
+        X = np.random.RandomState(1).randn(2000, 4)
+        self._assert_sequential_reference(X, dmin=1.2)
+        # a pivot far away from the data makes the pivot distances large
+        # compared to dmin, pruning must not skip centers within reach
+        X = (np.random.RandomState(8).rand(2000, 2) * 8).astype(np.float32)
+        X[0] = -1e6
+        self._assert_sequential_reference(X, dmin=1.)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
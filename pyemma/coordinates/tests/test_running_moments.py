@@ -0,0 +1,137 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy as np
+
+from pyemma.coordinates import pca, tica, tica_multilag
+from pyemma.coordinates.util import running_moments
+from pyemma.coordinates.util.running_moments import MomentsPool, RunningMoments, combine_moments, \
+    moments_XX, moments_XY
+
+
+class TestRunningMoments(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        np.random.seed(0)
+        cls.X = np.random.randn(1000, 5) + 1e5
+        cls.lag = 3
+        cls.chunks = [cls.X[i:i + 70] for i in xrange(0, len(cls.X), 70)]
+
+    def test_moments_XX(self):
+        rm = RunningMoments(5)
+        for chunk in self.chunks:
+            rm.add(moments_XX(chunk))
+        m = rm.moments()
+        assert m.w == len(self.X)
+        np.testing.assert_allclose(m.mean_x, np.mean(self.X, axis=0))
+        np.testing.assert_allclose(m.Mxy / (m.w - 1), np.cov(self.X.T), rtol=1e-8)
+        # at most nsave partial moments are stored
+        assert len(rm.storage) <= rm.nsave
+
+    def test_moments_XY(self):
+        X = self.X[:-self.lag]
+        Y = self.X[self.lag:]
+        m = combine_moments([moments_XY(X[i:i + 70], Y[i:i + 70], weight=2.0)
+                             for i in xrange(0, len(X), 70)])
+        assert m.w == 2 * len(X)
+        mu = np.mean(self.X, axis=0)
+        ref = 2 * np.dot((X - mu).T, Y - mu)
+        np.testing.assert_allclose(m.shifted_Mxy(mu), ref, rtol=1e-8)
+
+    def test_precision(self):
+        X = np.random.randn(300, 6).astype(np.float32)
+        Y = X[::-1, ::-1]  # not contiguous
+        X64 = X.astype(np.float64)
+        Y64 = Y.astype(np.float64)
+        ref_xx = np.cov(X64.T, bias=True) * len(X)
+        ref_xy = np.dot((X64 - X64.mean(axis=0)).T, Y64 - Y64.mean(axis=0))
+        for dtype, rtol in ((np.float64, 1e-10), (np.float32, 1e-4)):
+            m = moments_XX(X, dtype=dtype)
+            assert m.Mxy.dtype == np.float64
+            np.testing.assert_allclose(m.Mxy, ref_xx, rtol=rtol, atol=rtol)
+            # only one triangle is computed by BLAS
+            np.testing.assert_array_equal(m.Mxy, m.Mxy.T)
+            m = moments_XY(X, Y, weight=2.0, dtype=dtype)
+            np.testing.assert_allclose(m.Mxy, 2 * ref_xy, rtol=rtol, atol=rtol)
+        # per frame weights
+        w = np.random.rand(len(X))
+        ref_w = np.dot((X64 - np.dot(w, X64) / w.sum()).T * w, X64 - np.dot(w, X64) / w.sum())
+        np.testing.assert_allclose(moments_XX(X, w, dtype=np.float32).Mxy, ref_w, rtol=1e-4, atol=1e-4)
+
+    def test_estimator_precision(self):
+        # record the dtype of the centered chunks which enter the matrix products
+        syrk, gemm = running_moments._syrk, running_moments._gemm
+        used = []
+
+        def recording_syrk(Xc, alpha):
+            used.append(Xc.dtype)
+            return syrk(Xc, alpha)
+
+        def recording_gemm(Xc, Yc, alpha):
+            used.extend((Xc.dtype, Yc.dtype))
+            return gemm(Xc, Yc, alpha)
+
+        X = np.random.randn(500, 4)
+        running_moments._syrk, running_moments._gemm = recording_syrk, recording_gemm
+        try:
+            ref_t = tica(X, lag=2, dim=2)
+            ref_p = pca(X, dim=2)
+            assert set(used) == set([np.dtype(np.float64)])
+            del used[:]
+            t = tica(X, lag=2, dim=2, n_jobs=2, precision=np.float32)
+            p = pca(X, dim=2, precision='float32')
+            m = tica_multilag(X, lags=[1, 2], dim=2, precision=np.float32)
+            assert len(used) > 0 and set(used) == set([np.dtype(np.float32)])
+        finally:
+            running_moments._syrk, running_moments._gemm = syrk, gemm
+        np.testing.assert_allclose(t.cov_tau, ref_t.cov_tau, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(m.models[1].cov_tau, ref_t.cov_tau, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(p.cov, ref_p.cov, rtol=1e-4, atol=1e-5)
+        with self.assertRaises(ValueError):
+            tica(lag=2, precision=np.int32)
+
+    def test_combine_empty(self):
+        assert combine_moments([]) is None
+        m = RunningMoments(5).moments()
+        assert m.w == 0
+        assert m.Mxy.shape == (5, 5)
+
+    def test_pool(self):
+        ref = RunningMoments(5)
+        res = RunningMoments(5)
+        pool = MomentsPool(n_jobs=4)
+        for chunk in self.chunks:
+            ref.add(moments_XX(chunk))
+            pool.submit(res, moments_XX, chunk, 1.0)
+        pool.join()
+        np.testing.assert_allclose(res.moments().mean_x, ref.moments().mean_x)
+        np.testing.assert_allclose(res.moments().Mxy, ref.moments().Mxy, rtol=1e-10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -109,6 +109,160 @@ class TestTICA_Basic(unittest.TestCase):
         np.testing.assert_allclose(tica_obj.cov, cov)
 
 
+    def _two_pass_reference(self, trajs, lag, le_one=False):
+        mu = np.mean(np.vstack(trajs), axis=0)
+        C0 = np.zeros((trajs[0].shape[1],) * 2)
+        Ctau = np.zeros_like(C0)
+        N0 = 0
+        Ntau = 0
+        for X in trajs:
+            if len(X) <= lag:
+                continue
+            X = X - mu
+            if le_one:
+                w = np.ones(len(X))
+                w[lag:len(X) - lag] = 2
+                w[len(X) - lag:lag] = 0
+            else:
+                w = 2 * np.ones(len(X))
+            C0 += np.dot(X.T * w, X)
+            N0 += w.sum()
+            Ctau += 2 * np.dot(X[:-lag].T, X[lag:])
+            Ntau += 2 * (len(X) - lag)
+        C0 /= N0 - 1
+        Ctau = 0.5 * (Ctau + Ctau.T) / (Ntau - 1)
+        return mu, C0, Ctau
+
+    def test_single_pass(self):
+        np.random.seed(0)
+        # large offset to challenge the numerical stability
+        trajs = [np.random.randn(n, 4) + 1e4 for n in (1000, 257, 5, 600)]
+        lag = 7
+        for le_one, stride in ((False, 1), (True, 1), (False, 2)):
+            strided = [X[::stride] for X in trajs]
+            mu, C0, Ctau = self._two_pass_reference(strided, lag, le_one=le_one)
+            for chunksize in (0, 30):
+                d = DataInMemory(trajs)
+                d.chunksize = chunksize
+                tica_obj = tica(data=d, lag=lag, stride=stride, force_eigenvalues_le_one=le_one)
+                np.testing.assert_allclose(tica_obj.mu, mu)
+                np.testing.assert_allclose(tica_obj.cov, C0, rtol=1e-6, atol=1e-8)
+                np.testing.assert_allclose(tica_obj.cov_tau, Ctau, rtol=1e-6, atol=1e-8)
+
+    def test_n_jobs(self):
+        np.random.seed(0)
+        trajs = [np.random.randn(n, 4) for n in (1000, 257, 600)]
+        d = DataInMemory(trajs)
+        d.chunksize = 50
+        ref = tica(data=d, lag=5)
+        tica_obj = tica(data=d, lag=5, n_jobs=3)
+        np.testing.assert_allclose(tica_obj.cov, ref.cov)
+        np.testing.assert_allclose(tica_obj.cov_tau, ref.cov_tau)
+
+    def test_partial_fit(self):
+        rs = np.random.RandomState(0)
+        trajs = [rs.randn(n, 3) + 5 for n in (400, 3, 250, 120)]
+        for le_one in (False, True):
+            ref = tica(data=trajs, lag=4, dim=2, force_eigenvalues_le_one=le_one)
+            tica_obj = tica(data=trajs[:2], lag=4, dim=2, force_eigenvalues_le_one=le_one)
+            tica_obj.partial_fit(trajs[2])
+            tica_obj.partial_fit(trajs[3:])
+            np.testing.assert_allclose(tica_obj.mu, ref.mu)
+            np.testing.assert_allclose(tica_obj.cov, ref.cov, rtol=1e-10, atol=1e-12)
+            np.testing.assert_allclose(tica_obj.cov_tau, ref.cov_tau, rtol=1e-10, atol=1e-12)
+            np.testing.assert_allclose(tica_obj.eigenvalues, ref.eigenvalues)
+
+            # start from scratch
+            tica_obj = api.tica(lag=4, dim=2, force_eigenvalues_le_one=le_one).partial_fit(trajs)
+            np.testing.assert_allclose(tica_obj.cov_tau, ref.cov_tau, rtol=1e-10, atol=1e-12)
+            Y = tica_obj.map(trajs[0])
+            np.testing.assert_allclose(np.abs(Y), np.abs(ref.map(trajs[0])), rtol=1e-4, atol=1e-5)
+
+        with self.assertRaises(ValueError):
+            tica_obj.partial_fit(rs.randn(100, 2))
+
+    def test_scaling(self):
+        X = np.cumsum(np.random.RandomState(1).randn(2000, 3), axis=0)
+        tica_obj = tica(data=X, lag=10, dim=2)
+        Y = tica_obj.get_output()[0]
+        ev = tica_obj.eigenvalues[:2]
+        ts = tica_obj.timescales[:2]
+
+        tica_obj.scaling = 'kinetic_map'
+        np.testing.assert_allclose(tica_obj.get_output()[0], Y * ev, rtol=1e-4, atol=1e-4)
+        tica_obj.scaling = 'commute_map'
+        np.testing.assert_allclose(tica_obj.get_output()[0], Y * np.sqrt(0.5 * ts), rtol=1e-4, atol=1e-4)
+
+        # passed through the api and kept when more data is added
+        ref = tica(data=[X[:1000], X[1000:]], lag=10, dim=2)
+        tica_obj = api.tica(data=X[:1000], lag=10, dim=2, scaling='kinetic_map').partial_fit(X[1000:])
+        np.testing.assert_allclose(np.abs(tica_obj.map(X)), np.abs(ref.map(X) * ref.eigenvalues[:2]),
+                                   rtol=1e-4, atol=1e-4)
+
+        with self.assertRaises(ValueError):
+            tica_obj.scaling = 'diffusion_map'
+
+
+class TestMultiLagTICA(unittest.TestCase):
+
+    def test_equals_tica(self):
+        rs = np.random.RandomState(0)
+        trajs = [rs.randn(n, 3) + 10 for n in (500, 37, 4, 200)]
+        lags = [1, 5, 20, 50]
+        for le_one in (False, True):
+            for chunksize in (0, 15):
+                d = DataInMemory(trajs)
+                d.chunksize = chunksize
+                multi = api.tica_multilag(d, lags=lags, dim=2, force_eigenvalues_le_one=le_one)
+                assert len(multi.models) == len(lags)
+                assert multi.timescales.shape == (len(lags), 2)
+                for lag, model in zip(lags, multi.models):
+                    ref = tica(data=d, lag=lag, dim=2, force_eigenvalues_le_one=le_one)
+                    assert model.lag == lag
+                    np.testing.assert_allclose(model.mu, ref.mu)
+                    np.testing.assert_allclose(model.cov, ref.cov, rtol=1e-6, atol=1e-10)
+                    np.testing.assert_allclose(model.cov_tau, ref.cov_tau, rtol=1e-6, atol=1e-10)
+                    np.testing.assert_allclose(model.timescales, ref.timescales, rtol=1e-5)
+                    np.testing.assert_allclose(np.abs(model.map(trajs[0])), np.abs(ref.map(trajs[0])),
+                                               rtol=1e-4, atol=1e-5)
+
+    def test_partial_fit_models(self):
+        rs = np.random.RandomState(0)
+        trajs = [rs.randn(n, 3) for n in (300, 200)]
+        multi = api.tica_multilag(trajs[0], lags=[1, 5], dim=1)
+        model = multi.models[1].partial_fit(trajs[1])
+        ref = tica(data=trajs, lag=5, dim=1)
+        np.testing.assert_allclose(model.cov_tau, ref.cov_tau, rtol=1e-10, atol=1e-12)
+
+    def test_too_long_lag(self):
+        X = np.random.RandomState(0).randn(100, 2)
+        multi = api.tica_multilag(X, lags=[1, 10, 100, 200], dim=1)
+        assert list(multi.lagtimes) == [1, 10]
+        assert len(multi.models) == 2
+        multi = api.tica_multilag(X, lags=[1, 10, 200], dim=1, lag=200)
+        assert multi.lag == 10
+
+    def test_output(self):
+        rs = np.random.RandomState(0)
+        trajs = [rs.randn(n, 3) for n in (300, 200)]
+        multi = api.tica_multilag(trajs, lags=[1, 5, 10], dim=2)
+        assert multi.lag == 1
+        for y, x in zip(multi.get_output(), trajs):
+            np.testing.assert_allclose(y, multi.models[0].map(x))
+        multi.lag = 5
+        for y, x in zip(multi.get_output(), trajs):
+            np.testing.assert_allclose(y, multi.models[1].map(x))
+        # random access and use as input of further stages
+        np.testing.assert_allclose(multi._frames(1, np.array([3, 7])), multi.models[1].map(trajs[1][[3, 7]]))
+        kmeans = api.cluster_kmeans(multi, k=3, max_iter=2)
+        assert len(kmeans.dtrajs) == 2
+        # the in-memory output follows the selected lag time
+        multi.in_memory = True
+        multi.lag = 10
+        np.testing.assert_allclose(multi.get_output()[0], multi.models[2].map(trajs[0]))
+        with self.assertRaises(ValueError):
+            multi.lag = 2
+
 class TestTICAExtensive(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -28,14 +28,27 @@ Created on 09.04.2015
 
 @author: marscher
 '''
+import os
+import shutil
+import tempfile
 import unittest
 
+import mdtraj
 import numpy as np
 
 from pyemma.coordinates import api
+from pyemma.coordinates.clustering.uniform_time import _random_subset
+from pyemma.coordinates.data import feature_reader
 from pyemma.coordinates.data.data_in_memory import DataInMemory
 
 
+class StreamedDataInMemory(DataInMemory):
+    """ data in memory that can only be iterated """
+
+    def _has_random_access(self):
+        return False
+
+
 class TestUniformTimeClustering(unittest.TestCase):
 
     def test_1d(self):
@@ -69,6 +82,96 @@ class TestUniformTimeClustering(unittest.TestCase):
         c.data_producer = reader
         c.parametrize()
 
+    def test_more_clusters_than_frames(self):
+        x = np.random.random((30, 3))
+        for reader in (DataInMemory(x), StreamedDataInMemory(x)):
+            c = api.cluster_uniform_time(reader, k=50)
+            assert c.n_clusters == 30
+            np.testing.assert_allclose(np.sort(c.clustercenters, axis=0), np.sort(x, axis=0), rtol=1e-6)
+
+    def test_random_access(self):
+        # reading the centers directly gives the same centers as a pass over the data
+        trajs = [np.random.random((n, 3)) for n in (100, 37, 250)]
+        for stride in (1, 3):
+            ref = api.cluster_uniform_time(StreamedDataInMemory(trajs), k=20, stride=stride)
+            c = api.cluster_uniform_time(DataInMemory(trajs), k=20, stride=stride)
+            np.testing.assert_equal(c.clustercenters, ref.clustercenters)
+            X = np.vstack([t[::stride] for t in trajs])
+            dt = len(X) // 20
+            np.testing.assert_allclose(c.clustercenters, X[dt // 2::dt][:20], rtol=1e-6)
+        # also through a transformer
+        ref = api.cluster_uniform_time(api.tica(StreamedDataInMemory(trajs), lag=2, dim=2), k=20)
+        c = api.cluster_uniform_time(api.tica(DataInMemory(trajs), lag=2, dim=2), k=20)
+        np.testing.assert_allclose(c.clustercenters, ref.clustercenters, rtol=1e-5)
+
+    def test_random_subset(self):
+        trajs = [np.arange(n * 2, dtype=np.float64).reshape(n, 2) + 1000 * i for i, n in enumerate((100, 37))]
+        for reader in (DataInMemory(trajs), StreamedDataInMemory(trajs)):
+            c = api.cluster_uniform_time(reader, k=30, sampling='random')
+            X = np.vstack(trajs)
+            # distinct frames of the data
+            rows = set(map(tuple, X))
+            assert len(set(map(tuple, c.clustercenters))) == 30
+            assert all(tuple(row) in rows for row in c.clustercenters)
+        with self.assertRaises(ValueError):
+            api.cluster_uniform_time(k=3, sampling='other')
+
+    def test_random_subset_sampler(self):
+        np.random.seed(0)
+        s = _random_subset(10 ** 12, 50)
+        assert len(np.unique(s)) == 50
+        assert np.all(np.diff(s) > 0) and s[0] >= 0 and s[-1] < 10 ** 12
+        np.testing.assert_array_equal(_random_subset(7, 7), np.arange(7))
+        # every position is selected with probability k/n
+        counts = np.bincount(np.concatenate([_random_subset(10, 3) for _ in xrange(3000)]), minlength=10)
+        np.testing.assert_allclose(counts / 3000., 0.3, atol=0.05)
+
+    def test_feature_reader(self):
+        path = os.path.join(os.path.dirname(__file__), 'data')
+        reader = api.source(os.path.join(path, 'bpti_mini.xtc'), top=os.path.join(path, 'bpti_ca.pdb'))
+        c = api.cluster_uniform_time(reader, k=5)
+        X = reader.get_output()[0]
+        dt = len(X) // 5
+        np.testing.assert_allclose(c.clustercenters, X[dt // 2::dt][:5], atol=1e-5)
+
+    def test_feature_reader_single_pass(self):
+        # the frames of the centers are read in one pass over each file, not
+        # by opening and seeking the file for every center
+        tmpdir = tempfile.mkdtemp()
+        try:
+            topfile = os.path.join(os.path.dirname(__file__), 'data', 'test.pdb')
+            traj = mdtraj.load(topfile)
+            n_frames = 4321
+            traj.xyz = np.random.RandomState(3).rand(n_frames, traj.n_atoms, 3).astype(np.float32)
+            traj.time = np.arange(n_frames)
+            trajfile = os.path.join(tmpdir, 'traj.xtc')
+            traj.save(trajfile)
+            reader = api.source([trajfile, trajfile], top=topfile)
+            reader.chunksize = 500
+            iterload = feature_reader.patches.iterload
+            calls = []
+
+            def counting_iterload(*args, **kwargs):
+                calls.append(args[0])
+                return iterload(*args, **kwargs)
+            feature_reader.patches.iterload = counting_iterload
+            try:
+                c = api.cluster_uniform_time(reader, k=200)
+                # unsorted and repeated frames are returned in the requested order
+                frames = np.array([4320, 0, 499, 500, 17, 499])
+                Y = reader._frames(1, frames)
+            finally:
+                feature_reader.patches.iterload = iterload
+            assert len(calls) == 3
+            X = np.vstack(reader.get_output())
+            dt = len(X) // 200
+            np.testing.assert_allclose(c.clustercenters, X[dt // 2::dt][:200], atol=1e-5)
+            np.testing.assert_allclose(Y, X[frames], atol=1e-5)
+            with self.assertRaises(IndexError):
+                reader._frames(0, [n_frames])
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
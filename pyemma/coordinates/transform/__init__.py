@@ -34,7 +34,9 @@ transform - Transformation Utilities (:mod:`pyemma.coordinates.transform`)
 
     PCA - principal components
     TICA - time independent components
+    MultiLagTICA - time independent components for a series of lag times
 """
 
 from .pca import *
-from .tica import *
\ No newline at end of file
+from .tica import *
+from .tica_multilag import *
\ No newline at end of file
@@ -29,8 +29,14 @@ import numpy as np
 from .transformer import Transformer
 
 from pyemma.util.annotators import doc_inherit
+from pyemma.util.linalg import eig_cov, projection_matrix
+from pyemma.util.types import ensure_traj_list
 from pyemma.util.progressbar import ProgressBar
 from pyemma.util.progressbar.gui import show_progressbar
+from pyemma.coordinates.util.running_moments import MomentsPool, RunningMoments, accumulation_dtype, moments_XX
+from pyemma.coordinates.util.precision import stream_array
+from pyemma.coordinates.util.dtraj_cache import arrays_digest
+from pyemma.coordinates.util.distributed import allreduce_moments
 
 __all__ = ['PCA']
 
@@ -53,21 +59,42 @@ class PCA(Transformer):
 
     When used as a dimension reduction method, the input data is projected onto
     the dominant principal components.
+    For high-dimensional input and few output dimensions, only the dominant
+    principal components are computed, by Lanczos iteration.
 
     Parameters
     ----------
     output_dimension : int
         number of principal components to project onto
+    n_jobs : int, default = 1
+        number of threads computing the partial moments of the data chunks.
+    comm : communicator, optional, default = None
+        for a distributed estimation, e.g. ``mpi4py.MPI.COMM_WORLD`` or a
+        :class:`LocalCommunicator <pyemma.coordinates.util.distributed.LocalCommunicator>`.
+        Every rank is parametrized with its own shard of the trajectories.
+        The partial moments of all ranks are combined, the eigenvalue problem
+        is solved on rank 0 and its solution is broadcast to all ranks.
+    precision : numpy dtype, optional, default = np.float64
+        precision of the matrix products of the data chunks, np.float32 or
+        np.float64. Means and moments are always combined in double precision.
 
     """
 
-    def __init__(self, output_dimension):
+    def __init__(self, output_dimension, n_jobs=1, comm=None, precision=np.float64):
         super(PCA, self).__init__()
         self._output_dimension = output_dimension
-        self._dot_prod_tmp = None
+        self.n_jobs = n_jobs
+        self.comm = comm
+        self.precision = accumulation_dtype(precision)
         self.Y = None
+        # projection matrices and offsets per input dtype
+        self._projections = {}
+
+        # partial moments of the data. These are kept after the estimation, so
+        # more data can be added by partial_fit.
+        self._moments = None
+        self._moments_pool = None
 
-        self._progress_mean = None
         self._progress_cov = None
 
     @doc_inherit
@@ -85,10 +112,10 @@ class PCA(Transformer):
     @doc_inherit
     def _get_constant_memory(self):
         """Returns the constant memory requirements, in bytes."""
-        # memory for mu, C, v, R
+        # memory for mu, C, v, R and the stored partial moments
         dim = self.data_producer.dimension()
 
-        cov_elements = dim ** 2
+        cov_elements = (1 + RunningMoments(dim).nsave) * dim ** 2
         mu_elements = dim
 
         v_elements = dim
@@ -115,27 +142,33 @@ class PCA(Transformer):
     def covariance_matrix(self):
         return self.cov
 
+    def _init_moments(self, dim):
+        assert dim > 0, "Incoming data of PCA has 0 dimension!"
+        self.N = 0
+        # create mean array, covariance matrix and partial moments
+        self.mu = np.zeros(dim)
+        self.cov = np.zeros((dim, dim))
+        self._moments = RunningMoments(dim)
+        self._moments_pool = MomentsPool(self.n_jobs)
+
     @doc_inherit
     def _param_init(self):
-        self.N = 0
-        # create mean array and covariance matrix
         dim = self.data_producer.dimension()
         self._logger.info("Running PCA on %i dimensional input" % dim)
-        assert dim > 0, "Incoming data of PCA has 0 dimension!"
-        self.mu = np.zeros(dim)
-        self.cov = np.zeros((dim, dim))
+        self._init_moments(dim)
 
         # amount of chunks
         denom = self._n_chunks(self._param_with_stride)
-        self._progress_mean = ProgressBar(denom, description="calculate mean")
-        self._progress_cov = ProgressBar(denom, description="calculate covariances")
+        self._progress_cov = ProgressBar(denom, description="calculate mean and covariances")
 
     def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
                         last_chunk, ipass, Y=None, stride=1):
         """
-        Chunk-based parametrization of PCA. Iterates through all data twice. In the first pass, the
-        data means are estimated, in the second pass the covariance matrix is estimated.
-        Finally, the eigenvalue problem is solved to determine the principal compoennts.
+        Chunk-based parametrization of PCA. Iterates through all data once. The
+        mean and covariance matrix are estimated at the same time by merging
+        the moments of every chunk with a numerically stable pairwise update.
+        Finally, the eigenvalue problem is solved to determine the principal
+        components.
 
         :param X:
             coordinates. axis 0: time, axes 1-..: coordinates
@@ -155,49 +188,100 @@ class PCA(Transformer):
             time-lagged data (if available)
         :return:
         """
-        # pass 1: means
-        if ipass == 0:
-            if t == 0:
-                self._logger.debug("start to calculate mean for traj nr %i" % itraj)
-                self._sum_tmp = np.empty(X.shape[1])
-            np.sum(X, axis=0, out=self._sum_tmp)
-            self.mu += self._sum_tmp
-            self.N += np.shape(X)[0]
-
-            # counting chunks and log of eta
-            self._progress_mean.numerator += 1
-            show_progressbar(self._progress_mean)
-
-            if last_chunk:
-                self.mu /= self.N
-
-        # pass 2: covariances
-        if ipass == 1:
-            if t == 0:
-                self._logger.debug("start calculate covariance for traj nr %i" % itraj)
-                self._dot_prod_tmp = np.empty_like(self.cov)
-            Xm = X - self.mu
-            np.dot(Xm.T, Xm, self._dot_prod_tmp)
-            self.cov += self._dot_prod_tmp
-
-            self._progress_cov.numerator += 1
-            show_progressbar(self._progress_cov)
-
-            if last_chunk:
-                self.cov /= self.N - 1
-                self._logger.debug("finished")
-                return True  # finished!
+        if t == 0:
+            self._logger.debug("start to calculate mean and covariance for traj nr %i" % itraj)
+        self._moments_pool.submit(self._moments, moments_XX, X, 1.0, dtype=self.precision)
+
+        # counting chunks and log of eta
+        self._progress_cov.numerator += 1
+        show_progressbar(self._progress_cov)
+
+        if last_chunk:
+            self._logger.debug("finished")
+            return True  # finished!
 
         # by default, continue
         return False
 
     @doc_inherit
     def _param_finish(self):
-        (v, R) = np.linalg.eigh(self.cov)
-        # sort
-        I = np.argsort(v)[::-1]
-        self.eigenvalues = v[I]
-        self.eigenvectors = R[:, I]
+        self._moments_pool.join()
+        self._estimate()
+
+    def partial_fit(self, X):
+        """ Adds new trajectories to the estimation and updates the model
+
+        The moments accumulated so far, either by :meth:`parametrize` or by
+        previous calls of this method, are kept. Only the moments of the new
+        trajectories are computed, then the eigenvalue problem is solved again.
+
+        Parameters
+        ----------
+        X : ndarray(T, n) or list of ndarray(T_i, n)
+            new trajectories
+
+        Returns
+        -------
+        self : PCA
+            the updated model
+
+        Notes
+        -----
+        Reparametrizing the model, e.g. with another stride or data producer,
+        discards all moments, including those of trajectories added by this
+        method.
+
+        In a distributed estimation, every rank adds its own trajectories, and
+        all ranks have to call this method equally often.
+        """
+        X = ensure_traj_list(X)
+        if self._moments is None:
+            self._init_moments(X[0].shape[1])
+        dim = self._moments.dim
+        chunksize = self.chunksize if self.chunksize > 0 else max(len(x) for x in X)
+        for x in X:
+            if x.shape[1] != dim:
+                raise ValueError("new data has dimension %i, but PCA was estimated on dimension %i"
+                                 % (x.shape[1], dim))
+            for t in xrange(0, len(x), chunksize):
+                self._moments_pool.submit(self._moments, moments_XX, x[t:t + chunksize], 1.0,
+                                          dtype=self.precision)
+        self._moments_pool.join()
+        self._estimate()
+        self._parametrized = True
+        return self
+
+    def _estimate(self):
+        moments = self._moments.moments()
+        if self.comm is not None:
+            moments = allreduce_moments(self.comm, moments)
+        self.N = int(moments.w)
+        self.mu = moments.mean_x
+        self.cov = moments.Mxy / (self.N - 1)
+
+        if self.comm is None or self.comm.rank == 0:
+            eig = eig_cov(self.cov, neig=self._output_dimension)
+        else:
+            eig = None
+        if self.comm is not None:
+            # all ranks have to project onto the same basis
+            eig = self.comm.bcast(eig, root=0)
+        self.eigenvalues, self.eigenvectors = eig
+        self._projections = {}
+
+    def _projection(self, dtype):
+        """ cached projection matrix and offset for input of the given dtype """
+        if dtype not in self._projections:
+            self._projections[dtype] = projection_matrix(
+                self.mu, self.eigenvectors[:, 0:self._output_dimension], self.cov, dtype)
+        return self._projections[dtype]
+
+    def _cache_identity(self):
+        source = self.data_producer._cache_identity()
+        if source is None or not self._parametrized:
+            return None
+        return "[%s projection=%s input=%s]" % (self.__class__.__name__,
+                                               arrays_digest(*self._projection(np.dtype(np.float64))), source)
 
     def _map_array(self, X):
         """
@@ -206,6 +290,8 @@ class PCA(Transformer):
         :param X: the input data
         :return: the projected data
         """
-        X_meanfree = X - self.mu
-        Y = np.dot(X_meanfree, self.eigenvectors[:, 0:self._output_dimension])
-        return Y
\ No newline at end of file
+        W, offset = self._projection(X.dtype)
+        Y = np.dot(X, W)
+        Y -= offset
+        # single precision data might be projected in double precision
+        return stream_array(Y)
@@ -30,8 +30,14 @@ from .transformer import Transformer
 
 from pyemma.util.progressbar import ProgressBar
 from pyemma.util.progressbar.gui import show_progressbar
-from pyemma.util.linalg import eig_corr
+from pyemma.util.linalg import eig_corr, projection_matrix
 from pyemma.util.annotators import doc_inherit
+from pyemma.util.types import ensure_traj_list
+from pyemma.coordinates.util.running_moments import MomentsPool, RunningMoments, accumulation_dtype, \
+    moments_XX, moments_XY
+from pyemma.coordinates.util.precision import stream_array
+from pyemma.coordinates.util.dtraj_cache import arrays_digest
+from pyemma.coordinates.util.distributed import allreduce_moments, allreduce_sum
 
 import numpy as np
 
@@ -56,6 +62,33 @@ class TICA(Transformer):
     force_eigenvalues_le_one : boolean
         Compute covariance matrix and time-lagged covariance matrix such
         that the generalized eigenvalues are always guaranteed to be <= 1.
+    n_jobs : int, default = 1
+        number of threads computing the partial moments of the data chunks.
+    comm : communicator, optional, default = None
+        for a distributed estimation, e.g. ``mpi4py.MPI.COMM_WORLD`` or a
+        :class:`LocalCommunicator <pyemma.coordinates.util.distributed.LocalCommunicator>`.
+        Every rank is parametrized with its own shard of the trajectories.
+        The partial moments of all ranks are combined, the eigenvalue problem
+        is solved on rank 0 and its solution is broadcast to all ranks, so
+        every rank can transform its own shard.
+    scaling : str, optional, default = None
+        scaling of the independent components in the output:
+
+        * None: unscaled independent components
+        * 'kinetic_map': scaled by their eigenvalues :math:`\lambda_i`, such
+          that Euclidean distances in the output approximate kinetic
+          distances [1]_
+        * 'commute_map': scaled by :math:`\sqrt{t_i / 2}`, with the implied
+          timescales :math:`t_i`, such that Euclidean distances in the output
+          approximate commute distances [2]_
+
+        The scaling is folded into the projection matrix and does not cost
+        any extra computation when mapping data.
+    precision : numpy dtype, optional, default = np.float64
+        precision of the matrix products of the data chunks, np.float32 or
+        np.float64. Single precision halves the memory traffic of the
+        accumulation. Means and moments are always combined in double
+        precision.
 
     Notes
     -----
@@ -78,31 +111,56 @@ class TICA(Transformer):
     .. math:: t_i = -\tau / \ln |\lambda_i|
 
     When used as a dimension reduction method, the input data is projected
-    onto the dominant independent components.
+    onto the dominant independent components. For high-dimensional input and
+    few output dimensions, only the dominant independent components are
+    computed, by Lanczos iteration (see :func:`pyemma.util.linalg.eig_corr`).
+
+    References
+    ----------
+    .. [1] Noe, F. and C. Clementi. 2015. Kinetic distance and kinetic maps
+        from molecular dynamics simulation. J. Chem. Theory Comput. 11, 5002-5011.
+    .. [2] Noe, F., R. Banisch and C. Clementi. 2016. Commute maps: separating
+        slowly-mixing molecular configurations for kinetic modeling.
+        J. Chem. Theory Comput. 12, 5620-5630.
 
     """
 
-    def __init__(self, lag, output_dimension, epsilon=1e-6, force_eigenvalues_le_one=False):
+    _SCALINGS = (None, 'kinetic_map', 'commute_map')
+
+    def __init__(self, lag, output_dimension, epsilon=1e-6, force_eigenvalues_le_one=False, n_jobs=1,
+                 comm=None, scaling=None, precision=np.float64):
         super(TICA, self).__init__()
 
-        # store lag time to set it appropriatly in second pass of parametrize
+        # lag time, requested from the data producer right from the start
         self._lag = lag
         self._output_dimension = output_dimension
         self._epsilon = epsilon
         self._force_eigenvalues_le_one = force_eigenvalues_le_one
+        self.n_jobs = n_jobs
+        self.comm = comm
+        self.scaling = scaling
+        self.precision = accumulation_dtype(precision)
 
         # covariances
         self.cov = None
         self.cov_tau = None
-        # mean
+        # mean and sum of input data
         self.mu = None
+        self._sum = None
         self._N_mean = 0
         self._N_cov = 0
         self._N_cov_tau = 0
         self.eigenvalues = None
         self.eigenvectors = None
+        # projection matrices and offsets per input dtype
+        self._projections = {}
+
+        # partial moments of instantaneous and time-lagged data. These are kept
+        # after the estimation, so more data can be added by partial_fit.
+        self._moments_0 = None
+        self._moments_tau = None
+        self._moments_pool = None
 
-        self._progress_mean = None
         self._progress_cov = None
 
     @property
@@ -115,6 +173,20 @@ class TICA(Transformer):
         self._parametrized = False
         self._lag = new_tau
 
+    @property
+    def scaling(self):
+        """ scaling of the independent components in the output, one of None,
+        'kinetic_map' and 'commute_map' """
+        return self._scaling
+
+    @scaling.setter
+    def scaling(self, value):
+        if value not in self._SCALINGS:
+            raise ValueError("unknown scaling %s, use one of %s" % (value, self._SCALINGS))
+        self._scaling = value
+        # the scaling does not change the estimate, only the projection
+        self._projections = {}
+
     @doc_inherit
     def describe(self):
         return "[TICA, tau = %i; output dimension = %i]" \
@@ -138,8 +210,9 @@ class TICA(Transformer):
     def _get_constant_memory(self):
         dim = self.data_producer.dimension()
 
-        # memory for covariance matrices (lagged, non-lagged)
-        cov_elements = 2 * dim ** 2
+        # memory for covariance matrices (lagged, non-lagged), including the
+        # stored partial moments
+        cov_elements = 2 * (1 + RunningMoments(dim).nsave) * dim ** 2
         mu_elements = dim
 
         # TODO: shall memory req of diagonalize method go here?
@@ -151,9 +224,16 @@ class TICA(Transformer):
         """ mean of input features """
         return self.mu
 
-    @doc_inherit
-    def _param_init(self):
-        dim = self.data_producer.dimension()
+    @property
+    def timescales(self):
+        r""" implied timescales of the independent components
+
+        .. math:: t_i = -\tau / \ln |\lambda_i|
+
+        """
+        return -self._lag / np.log(np.abs(self.eigenvalues))
+
+    def _init_moments(self, dim):
         assert dim > 0, "zero dimension from data producer"
         assert self._output_dimension <= dim, \
             ("requested more output dimensions (%i) than dimension"
@@ -162,29 +242,35 @@ class TICA(Transformer):
         self._N_mean = 0
         self._N_cov = 0
         self._N_cov_tau = 0
-        # create mean array and covariance matrices
-        self.mu = np.zeros(dim)
+        # create sum array and partial moments
+        self._sum = np.zeros(dim)
+        self._moments_0 = RunningMoments(dim)
+        self._moments_tau = RunningMoments(dim)
+        self._moments_pool = MomentsPool(self.n_jobs)
 
-        self.cov = np.zeros((dim, dim))
-        self.cov_tau = np.zeros_like(self.cov)
+    @doc_inherit
+    def _param_init(self):
+        dim = self.data_producer.dimension()
+        self._init_moments(dim)
 
         self._logger.info("Running TICA with tau=%i; Estimating two covariance matrices"
                           " with dimension (%i, %i)" % (self._lag, dim, dim))
 
         # amount of chunks
         denom = self._n_chunks(self._param_with_stride)
-        self._progress_mean = ProgressBar(denom, description="calculate mean")
         self._progress_cov = ProgressBar(denom, description="calculate covariances")
 
-        return 0  # in zero'th pass don't request lagged data
+        # request lagged data right away, everything is estimated in one pass
+        return self._lag
 
     def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
                         last_chunk, ipass, Y=None, stride=1):
         """
-        Chunk-based parameterization of TICA. Iterates through all data twice. In the first pass, the
-        data means are estimated, in the second pass the covariance and time-lagged covariance
-        matrices are estimated. Finally, the generalized eigenvalue problem is solved to determine
-        the independent components.
+        Chunk-based parameterization of TICA. Iterates through all data once. The
+        mean, covariance and time-lagged covariance matrices are estimated at
+        the same time by merging the moments of every chunk with a numerically
+        stable pairwise update. Finally, the generalized eigenvalue problem is
+        solved to determine the independent components.
 
         :param X:
             coordinates. axis 0: time, axes 1-..: coordinates
@@ -204,79 +290,145 @@ class TICA(Transformer):
             time-lagged data (if available)
         :return:
         """
-        if ipass == 0:
-            self.mu += np.sum(X, axis=0, dtype=np.float64)
-            self._N_mean += np.shape(X)[0]
-            # counting chunks and log of eta
-            self._progress_mean.numerator += 1
-            show_progressbar(self._progress_mean)
-
-            if last_chunk:
-                self.mu /= self._N_mean
-                self._logger.info("calculated mean.")
-
-                # now we request real lagged data, since we are finished
-                # with first pass
-                return False, self._lag
-
-        elif ipass == 1:
-            if first_chunk:
-                self._logger.info("start to calculate covariance...")
-
-            if self.trajectory_length(itraj, stride=stride) > self._lag:
-                self._N_cov_tau += 2.0 * np.shape(Y)[0]
-                X_meanfree = X - self.mu
-                Y_meanfree = Y - self.mu
-                # update the time-lagged covariance matrix
-                end = min(X_meanfree.shape[0], Y_meanfree.shape[0])
-                self.cov_tau += 2.0 * np.dot(X_meanfree[0:end].T,
-                                             Y_meanfree[0:end])
-
-                # update the instantaneous covariance matrix
-                if self._force_eigenvalues_le_one:
-                    # MSM-like counting
-                    Zptau = self._lag-t  # zero plus tau
-                    Nmtau = self.trajectory_length(itraj, stride=stride)-t-self._lag  # N minus tau
-
-                    # restrict to valid block indices
-                    size = X_meanfree.shape[0]
-                    Zptau = min(max(Zptau, 0), size)
-                    Nmtau = min(max(Nmtau, 0), size)
-
-                    # update covariance matrix
-                    start2 = min(Zptau, Nmtau)
-                    end2 = max(Zptau, Nmtau)
-                    self.cov += np.dot(X_meanfree[0:start2, :].T,
-                                       X_meanfree[0:start2, :])
-                    self._N_cov += start2
-
-                    if Nmtau > Zptau:
-                        self.cov += 2.0 * np.dot(X_meanfree[start2:end2, :].T,
-                                                 X_meanfree[start2:end2, :])
-                        self._N_cov += 2.0 * (end2 - start2)
-
-                    self.cov += np.dot(X_meanfree[end2:, :].T,
-                                       X_meanfree[end2:, :])
-                    self._N_cov += (size - end2)
-                else:
-                    # traditional counting
-                    self.cov += 2.0 * np.dot(X_meanfree.T, X_meanfree)
-                    self._N_cov += 2.0 * np.shape(X)[0]
-
-                self._progress_cov.numerator += 1
-                show_progressbar(self._progress_cov)
+        if first_chunk:
+            self._logger.info("start to calculate mean and covariances...")
 
-            else:
-                self._logger.warning("trajectory nr %i too short, skipping it" % itraj)
+        traj_len = self.trajectory_length(itraj, stride=stride)
+        self._add_data(X, Y, t, traj_len)
+        if traj_len <= self._lag and last_chunk_in_traj:
+            self._logger.warning("trajectory nr %i too short, skipping it" % itraj)
+
+        self._progress_cov.numerator += 1
+        show_progressbar(self._progress_cov)
 
-            if last_chunk:
-                self._logger.info("finished calculation of Cov and Cov_tau.")
-                return True  # finished!
+        if last_chunk:
+            self._logger.info("finished calculation of mean, Cov and Cov_tau.")
+            return True  # finished!
 
         return False  # not finished yet.
 
+    def _add_data(self, X, Y, t, traj_len):
+        """ Adds the moments of a chunk X, starting at time t of a trajectory
+        with traj_len frames, and of its time-lagged chunk Y """
+        # the mean is taken over all frames, also of too short trajectories
+        self._sum += np.sum(X, axis=0, dtype=np.float64)
+        self._N_mean += np.shape(X)[0]
+
+        if traj_len > self._lag:
+            # update the time-lagged moments
+            end = min(np.shape(X)[0], np.shape(Y)[0])
+            self._moments_pool.submit(self._moments_tau, moments_XY, X[0:end], Y[0:end], 2.0,
+                                      dtype=self.precision)
+
+            # update the instantaneous moments
+            if self._force_eigenvalues_le_one:
+                # MSM-like counting
+                Zptau = self._lag-t  # zero plus tau
+                Nmtau = traj_len-t-self._lag  # N minus tau
+
+                # restrict to valid block indices
+                size = X.shape[0]
+                Zptau = min(max(Zptau, 0), size)
+                Nmtau = min(max(Nmtau, 0), size)
+
+                # update moments with weights 1, 2, 1 on the three blocks
+                start2 = min(Zptau, Nmtau)
+                end2 = max(Zptau, Nmtau)
+                if start2 > 0:
+                    self._moments_pool.submit(self._moments_0, moments_XX, X[0:start2, :], 1.0,
+                                              dtype=self.precision)
+                if Nmtau > Zptau:
+                    self._moments_pool.submit(self._moments_0, moments_XX, X[start2:end2, :], 2.0,
+                                              dtype=self.precision)
+                if size > end2:
+                    self._moments_pool.submit(self._moments_0, moments_XX, X[end2:, :], 1.0,
+                                              dtype=self.precision)
+            else:
+                # traditional counting
+                self._moments_pool.submit(self._moments_0, moments_XX, X, 2.0, dtype=self.precision)
+
     @doc_inherit
     def _param_finish(self):
+        self._estimate_accumulated()
+
+    def partial_fit(self, X):
+        """ Adds new trajectories to the estimation and updates the model
+
+        The moments accumulated so far, either by :meth:`parametrize` or by
+        previous calls of this method, are kept. Only the moments of the new
+        trajectories are computed, then the eigenvalue problem is solved again.
+
+        Parameters
+        ----------
+        X : ndarray(T, n) or list of ndarray(T_i, n)
+            new trajectories. The lag time applies within every trajectory.
+
+        Returns
+        -------
+        self : TICA
+            the updated model
+
+        Notes
+        -----
+        Reparametrizing the model, e.g. with another stride or data producer,
+        discards all moments, including those of trajectories added by this
+        method.
+
+        In a distributed estimation, every rank adds its own trajectories, and
+        all ranks have to call this method equally often.
+        """
+        X = ensure_traj_list(X)
+        if self._moments_0 is None:
+            self._init_moments(X[0].shape[1])
+        dim = self._sum.shape[0]
+        chunksize = self.chunksize if self.chunksize > 0 else max(len(x) for x in X)
+        for x in X:
+            if x.shape[1] != dim:
+                raise ValueError("new data has dimension %i, but TICA was estimated on dimension %i"
+                                 % (x.shape[1], dim))
+            if len(x) <= self._lag:
+                self._logger.warning("trajectory of length %i too short, skipping it" % len(x))
+            for t in xrange(0, len(x), chunksize):
+                self._add_data(x[t:t + chunksize], x[t + self._lag:t + self._lag + chunksize], t, len(x))
+        self._estimate_accumulated()
+        self._parametrized = True
+        return self
+
+    def _estimate_accumulated(self):
+        """ Estimates the model from the moments accumulated so far. In a
+        distributed estimation, these are the moments of this rank, which
+        are combined with those of all other ranks first. """
+        self._moments_pool.join()
+        sum_x, N = self._sum, self._N_mean
+        moments_0, moments_tau = self._moments_0.moments(), self._moments_tau.moments()
+        if self.comm is not None:
+            sum_x = allreduce_sum(self.comm, sum_x)
+            N = allreduce_sum(self.comm, N)
+            moments_0 = allreduce_moments(self.comm, moments_0)
+            moments_tau = allreduce_moments(self.comm, moments_tau)
+        self._estimate(sum_x / N, moments_0, moments_tau)
+
+    def _estimate(self, mu, moments_0, moments_tau):
+        """ Estimates the covariance matrices from the accumulated moments and
+        solves the generalized eigenvalue problem.
+
+        Parameters
+        ----------
+        mu : ndarray(n,)
+            mean of all input data
+        moments_0 : Moments
+            moments of the instantaneous data
+        moments_tau : Moments
+            moments of the time-lagged pairs
+        """
+        self.mu = mu
+
+        # shift the moments to the global mean
+        self._N_cov = moments_0.w
+        self._N_cov_tau = moments_tau.w
+        self.cov = moments_0.shifted_Mxy(self.mu)
+        self.cov_tau = moments_tau.shifted_Mxy(self.mu)
+
         if self._force_eigenvalues_le_one:
             assert self._N_cov == self._N_cov_tau, 'inconsistency in C(0) and C(tau)'
 
@@ -292,10 +444,35 @@ class TICA(Transformer):
         self.cov_tau /= self._N_cov_tau - 1
 
         # diagonalize with low rank approximation
-        self._logger.info("diagonalize Cov and Cov_tau.")
-        self.eigenvalues, self.eigenvectors = \
-            eig_corr(self.cov, self.cov_tau, self._epsilon)
-        self._logger.info("finished diagonalisation.")
+        if self.comm is None or self.comm.rank == 0:
+            self._logger.info("diagonalize Cov and Cov_tau.")
+            eig = eig_corr(self.cov, self.cov_tau, self._epsilon, neig=self._output_dimension)
+            self._logger.info("finished diagonalisation.")
+        else:
+            eig = None
+        if self.comm is not None:
+            # all ranks have to project onto the same basis
+            eig = self.comm.bcast(eig, root=0)
+        self.eigenvalues, self.eigenvectors = eig
+        self._projections = {}
+
+    def _projection(self, dtype):
+        """ cached projection matrix and offset for input of the given dtype """
+        if dtype not in self._projections:
+            W = self.eigenvectors[:, 0:self._output_dimension]
+            if self._scaling == 'kinetic_map':
+                W = W * self.eigenvalues[0:self._output_dimension]
+            elif self._scaling == 'commute_map':
+                W = W * np.sqrt(0.5 * self.timescales[0:self._output_dimension])
+            self._projections[dtype] = projection_matrix(self.mu, W, self.cov, dtype)
+        return self._projections[dtype]
+
+    def _cache_identity(self):
+        source = self.data_producer._cache_identity()
+        if source is None or not self._parametrized:
+            return None
+        return "[%s projection=%s input=%s]" % (self.__class__.__name__,
+                                               arrays_digest(*self._projection(np.dtype(np.float64))), source)
 
     def _map_array(self, X):
         """Projects the data onto the dominant independent components.
@@ -310,10 +487,11 @@ class TICA(Transformer):
         Y : ndarray(n,)
             the projected data
         """
-        # TODO: consider writing an extension to avoid temporary Xmeanfree
-        X_meanfree = X - self.mu
-        Y = np.dot(X_meanfree, self.eigenvectors[:, 0:self._output_dimension])
-        return Y
+        W, offset = self._projection(X.dtype)
+        Y = np.dot(X, W)
+        Y -= offset
+        # single precision data might be projected in double precision
+        return stream_array(Y)
 
 
     @property
@@ -0,0 +1,360 @@
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from .transformer import Transformer
+from .tica import TICA
+
+from pyemma.util.progressbar import ProgressBar
+from pyemma.util.progressbar.gui import show_progressbar
+from pyemma.util.annotators import doc_inherit
+from pyemma.coordinates.util.running_moments import MomentsPool, RunningMoments, accumulation_dtype, \
+    moments_XX, moments_XY
+
+__all__ = ['MultiLagTICA']
+
+
+class MultiLagTICA(Transformer):
+
+    r"""
+    Time-lagged independent component analysis (TICA) for a series of lag times
+
+    The mean, instantaneous and time-lagged covariance matrices for all lag
+    times are accumulated in a single pass over the data. To pair frames
+    across chunk boundaries, the last frames of the current trajectory are
+    kept in a history buffer as deep as the largest lag time. After the
+    pass, one :class:`TICA <pyemma.coordinates.transform.TICA>` model is
+    estimated per lag time, which equals the model estimated by TICA itself
+    for this lag time. The data is projected with the model of the lag time
+    selected by :attr:`lag`.
+
+    Parameters
+    ----------
+    lags : array-like of int
+        lag times
+    output_dimension : int
+        how many significant TICS to use to reduce dimension of input data
+    epsilon : float
+        eigenvalue norm cutoff. Eigenvalues of C0 with norms <= epsilon will be
+        cut off. The remaining number of Eigenvalues define the size
+        of the output.
+    force_eigenvalues_le_one : boolean
+        Compute covariance matrix and time-lagged covariance matrix such
+        that the generalized eigenvalues are always guaranteed to be <= 1.
+    n_jobs : int, default = 1
+        number of threads computing the partial moments of the data chunks.
+    lag : int, optional, default = None
+        the lag time whose TICA model projects the data, one of lags. By
+        default the smallest lag time.
+    precision : numpy dtype, optional, default = np.float64
+        precision of the matrix products of the data chunks, np.float32 or
+        np.float64. Means and moments are always combined in double precision.
+
+    """
+
+    def __init__(self, lags, output_dimension, epsilon=1e-6, force_eigenvalues_le_one=False, n_jobs=1,
+                 lag=None, precision=np.float64):
+        super(MultiLagTICA, self).__init__()
+
+        lags = np.unique(np.asarray(lags, dtype=int))
+        if len(lags) == 0 or lags[0] < 1:
+            raise ValueError("lag times have to be positive integers, but got %s" % str(lags))
+        self._lags = lags
+        self._lag = None
+        if lag is not None:
+            self.lag = lag
+        self._output_dimension = output_dimension
+        self._epsilon = epsilon
+        self._force_eigenvalues_le_one = force_eigenvalues_le_one
+        self.n_jobs = n_jobs
+        self.precision = accumulation_dtype(precision)
+
+        self.models = None
+        self.mu = None
+        self._N_mean = 0
+
+        # partial moments per lag time
+        self._moments_0 = None
+        self._moments_tau = None
+        self._moments_pool = None
+        # last frames of the current trajectory
+        self._history = None
+
+        self._progress_cov = None
+
+    @property
+    def lagtimes(self):
+        r"""Return the list of lag times for which TICA models are estimated.
+
+        """
+        return self._lags
+
+    @property
+    def lag(self):
+        r"""The lag time whose TICA model is used to project the data.
+
+        """
+        return self._lags[0] if self._lag is None else self._lag
+
+    @lag.setter
+    def lag(self, value):
+        if value not in self._lags:
+            raise ValueError("lag time %s is not one of the lag times %s" % (str(value), str(list(self._lags))))
+        changed = self._lag is not None and self._lag != value
+        self._lag = int(value)
+        # the stored output has been projected with the previous model
+        if changed and self.in_memory and self._parametrized:
+            self._map_to_memory()
+
+    @doc_inherit
+    def describe(self):
+        return "[MultiLagTICA, taus = %s; output dimension = %i]" \
+            % (str(list(self._lags)), self._output_dimension)
+
+    def dimension(self):
+        """ output dimension"""
+        return self._output_dimension
+
+    @doc_inherit
+    def _get_memory_per_frame(self):
+        # temporaries
+        dim = self.data_producer.dimension()
+
+        history_and_chunk = dim * self.chunksize
+        mean_free_vectors = 2 * dim * self.chunksize
+
+        return 8 * (history_and_chunk + mean_free_vectors)
+
+    @doc_inherit
+    def _get_constant_memory(self):
+        dim = self.data_producer.dimension()
+
+        # memory for the partial moments of all lag times and the history
+        cov_elements = 2 * len(self._lags) * (1 + RunningMoments(dim).nsave) * dim ** 2
+        history_elements = self._lags[-1] * dim
+
+        return 8 * (cov_elements + history_elements)
+
+    @property
+    def mean(self):
+        """ mean of input features """
+        return self.mu
+
+    @doc_inherit
+    def _param_init(self):
+        dim = self.data_producer.dimension()
+        assert dim > 0, "zero dimension from data producer"
+        assert self._output_dimension <= dim, \
+            ("requested more output dimensions (%i) than dimension"
+             " of input data (%i)" % (self._output_dimension, dim))
+
+        self._N_mean = 0
+        self.mu = np.zeros(dim)
+        self._moments_0 = [RunningMoments(dim) for _ in self._lags]
+        self._moments_tau = [RunningMoments(dim) for _ in self._lags]
+        self._moments_pool = MomentsPool(self.n_jobs)
+        self._history = None
+
+        self._logger.info("Running TICA with taus=%s; Estimating %i pairs of covariance"
+                          " matrices with dimension (%i, %i)"
+                          % (str(list(self._lags)), len(self._lags), dim, dim))
+
+        # amount of chunks
+        denom = self._n_chunks(self._param_with_stride)
+        self._progress_cov = ProgressBar(denom, description="calculate covariances")
+
+    def _param_add_data(self, X, itraj, t, first_chunk, last_chunk_in_traj,
+                        last_chunk, ipass, Y=None, stride=1):
+        """
+        Chunk-based parameterization of TICA for multiple lag times. Iterates
+        through all data once without requesting time-lagged data. Time-lagged
+        pairs are formed from the chunk and the history of the current trajectory.
+
+        :param X:
+            coordinates. axis 0: time, axes 1-..: coordinates
+        :param itraj:
+            index of the current trajectory
+        :param t:
+            time index of first frame within trajectory
+        :param first_chunk:
+            boolean. True if this is the first chunk globally.
+        :param last_chunk_in_traj:
+            boolean. True if this is the last chunk within the trajectory.
+        :param last_chunk:
+            boolean. True if this is the last chunk globally.
+        :param ipass:
+            number of pass through data
+        :param Y:
+            time-lagged data (not used)
+        :return:
+        """
+        if first_chunk:
+            self._logger.info("start to calculate mean and covariances...")
+
+        self.mu += np.sum(X, axis=0, dtype=np.float64)
+        self._N_mean += np.shape(X)[0]
+
+        traj_len = self.trajectory_length(itraj, stride=stride)
+        if t == 0:
+            self._history = X[0:0]
+        Z = np.concatenate((self._history, X)) if len(self._history) > 0 else X
+        h = len(self._history)
+        size = np.shape(X)[0]
+
+        # the instantaneous moments of the chunk are shared by all lag times
+        # with traditional counting
+        shared_moments_0 = None
+
+        for k, lag in enumerate(self._lags):
+            if traj_len <= lag:
+                continue
+            # pairs (Z[i], Z[i + lag]) which end in the current chunk
+            start = max(0, h - lag)
+            end = len(Z) - lag
+            if end > start:
+                self._moments_pool.submit(self._moments_tau[k], moments_XY,
+                                          Z[start:end], Z[start + lag:end + lag], 2.0, dtype=self.precision)
+
+            if self._force_eigenvalues_le_one:
+                # every frame is weighted by the number of pairs it is part of
+                index = np.arange(t, t + size)
+                weights = (index < traj_len - lag).astype(np.float64) + (index >= lag)
+                self._moments_pool.submit(self._moments_0[k], moments_XX, X, weights, dtype=self.precision)
+            else:
+                if shared_moments_0 is None:
+                    shared_moments_0 = moments_XX(X, 2.0, dtype=self.precision)
+                self._moments_0[k].add(shared_moments_0.copy())
+
+        # keep the last frames for the next chunk of this trajectory
+        self._history = Z[-self._lags[-1]:]
+
+        self._progress_cov.numerator += 1
+        show_progressbar(self._progress_cov)
+
+        if last_chunk:
+            self._logger.info("finished calculation of mean, Cov and Cov_tau.")
+            return True  # finished!
+
+        return False  # not finished yet.
+
+    @doc_inherit
+    def _param_finish(self):
+        self._moments_pool.join()
+        self._history = None
+        self.mu /= self._N_mean
+
+        self.models = []
+        for k, lag in enumerate(self._lags):
+            if self._moments_tau[k].weight == 0:
+                self._logger.warning("all trajectories are too short for lag time %i,"
+                                     " ignoring it and larger lag times." % lag)
+                self._lags = self._lags[:k]
+                if self._lag is not None and self._lag >= lag:
+                    self._logger.warning("projecting with the largest remaining lag time %i instead"
+                                         " of %i." % (self._lags[-1], self._lag))
+                    self._lag = int(self._lags[-1])
+                break
+            model = TICA(lag, self._output_dimension, epsilon=self._epsilon,
+                         force_eigenvalues_le_one=self._force_eigenvalues_le_one, precision=self.precision)
+            model.data_producer = self.data_producer
+            model.chunksize = self.chunksize
+            model._param_with_stride = self._param_with_stride
+            # hand over the moments, so the model can be updated by partial_fit
+            model._sum = self.mu * self._N_mean
+            model._N_mean = self._N_mean
+            model._moments_0 = self._moments_0[k]
+            model._moments_tau = self._moments_tau[k]
+            model._moments_pool = MomentsPool(self.n_jobs)
+            model._estimate(self.mu.copy(), self._moments_0[k].moments(), self._moments_tau[k].moments())
+            model._parametrized = True
+            self.models.append(model)
+
+        self._moments_0 = None
+        self._moments_tau = None
+
+    def _map_array(self, X):
+        """Projects the data onto the dominant independent components of the
+        TICA model at the selected lag time.
+
+        Parameters
+        ----------
+        X : ndarray(n, m)
+            the input data
+
+        Returns
+        -------
+        Y : ndarray(n,)
+            the projected data
+        """
+        if self.models is None:
+            raise RuntimeError("MultiLagTICA has not been parametrized yet.")
+        return self.models[list(self._lags).index(self.lag)]._map_array(X)
+
+    @property
+    def number_of_timescales(self):
+        r"""Return the number of timescales.
+
+        """
+        return self._output_dimension
+
+    @property
+    def timescales(self):
+        r"""Returns the implied timescale estimates
+
+        Returns
+        --------
+        timescales : ndarray((l x k), dtype=float)
+            timescales for all processes and lag times.
+            l is the number of lag times and k is the number of computed timescales.
+
+        """
+        return self.get_timescales()
+
+    def get_timescales(self, process=None):
+        r"""Returns the implied timescale estimates
+
+        Parameters
+        ----------
+        process : int or None (default)
+            index in [0:n-1] referring to the process whose timescale will be returned.
+            By default, process = None and all computed process timescales will be returned.
+
+        Returns
+        --------
+        if process is None, will return a (l x k) array, where l is the number of lag times
+        and k is the number of computed timescales.
+        if process is an integer, will return a (l) array with the selected process time scale
+        for every lag time
+
+        """
+        if self.models is None:
+            raise RuntimeError("MultiLagTICA has not been parametrized yet.")
+        # eigenvalues might have been cut off by epsilon at some lag times
+        nits = min([self._output_dimension] + [len(m.eigenvalues) for m in self.models])
+        its = np.array([m.timescales[:nits] for m in self.models])
+        if process is None:
+            return its
+        else:
+            return its[:, process]
@@ -27,6 +27,7 @@ __author__ = 'noe, marscher'
 from pyemma.util.log import getLogger
 from pyemma.util.progressbar import ProgressBar
 from pyemma.util.progressbar.gui import show_progressbar
+from pyemma.coordinates.util.precision import stream_array
 
 from itertools import count
 import numpy as np
@@ -230,6 +231,35 @@ class Transformer(object):
         """ get a representation of this Transformer"""
         pass
 
+    def _has_random_access(self):
+        """ whether single frames of the output can be fetched by :func:`_frames`
+        without iterating over the data. True if the data source supports it,
+        since transformers map frame by frame. """
+        return self.data_producer is not self and self.data_producer._has_random_access()
+
+    def _frames(self, itraj, frames):
+        """ output of the given frames of a trajectory, fetched by random access
+
+        Parameters
+        ----------
+        itraj : int
+            trajectory index
+        frames : ndarray(n, dtype=int)
+            frame indices within the trajectory (without stride)
+
+        Returns
+        -------
+        Y : ndarray(n, d)
+            the mapped frames
+        """
+        return self.map(stream_array(self.data_producer._frames(itraj, frames)))
+
+    def _cache_identity(self):
+        """ a string identifying the output of this transformer across sessions,
+        used to key persistent caches. None (the default) if the output can't
+        be identified, e.g. if it is computed from data in memory. """
+        return None
+
     def output_type(self):
         """ by default transformers return single precision floats """
         return np.float32
@@ -281,6 +311,7 @@ class Transformer(object):
                         Y = None
                     else:
                         X, Y = self.data_producer._next_chunk(lag=lag, stride=stride)
+                    X, Y = stream_array(X), stream_array(Y)
                     L = np.shape(X)[0]
                     # last chunk in traj?
                     last_chunk_in_traj = (
@@ -391,7 +422,7 @@ class Transformer(object):
             last_chunk_in_traj = False
             t = 0
             while not last_chunk_in_traj:
-                X = self.data_producer._next_chunk()
+                X = stream_array(self.data_producer._next_chunk())
                 L = np.shape(X)[0]
                 # last chunk in traj?
                 last_chunk_in_traj = (t + L >= self.trajectory_length(itraj))
@@ -465,14 +496,14 @@ class Transformer(object):
                 if self._t >= self.trajectory_length(self._itraj, stride=stride):
                     self._itraj += 1
                     self._t = 0
-                return self.map(X)
+                return self.map(stream_array(X))
             else:
                 (X0, Xtau) = self.data_producer._next_chunk(lag=lag, stride=stride)
                 self._t += X0.shape[0]
                 if self._t >= self.trajectory_length(self._itraj, stride=stride):
                     self._itraj += 1
                     self._t = 0
-                return (self.map(X0), self.map(Xtau))
+                return (self.map(stream_array(X0)), self.map(stream_array(Xtau)))
 
     def __iter__(self):
         """
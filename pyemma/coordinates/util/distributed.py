@@ -0,0 +1,196 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Reduction of partial moments over several processes (ranks).
+
+Every rank streams its own shard of the trajectories and accumulates partial
+moments. The moments of all ranks are then combined, so every rank holds the
+moments of all data. A communicator is any object providing
+
+* ``rank`` and ``size`` attributes,
+* ``allgather(obj)``, returning the list of objects sent by all ranks,
+  ordered by rank,
+* ``bcast(obj, root=0)``, returning the object sent by the root rank,
+
+which is the interface of the communicators of mpi4py, e.g.
+``mpi4py.MPI.COMM_WORLD``. For using several local processes as ranks,
+see :func:`run_local`.
+'''
+
+import multiprocessing
+import sys
+import traceback
+
+import numpy as np
+
+from pyemma.coordinates.util.running_moments import combine_moments
+
+__all__ = ['LocalCommunicator', 'allreduce_moments', 'allreduce_sum', 'run_local']
+
+
+def allreduce_moments(comm, moments):
+    """ Combines the moments of all ranks
+
+    Parameters
+    ----------
+    comm : communicator
+    moments : Moments
+        the partial moments of this rank
+
+    Returns
+    -------
+    moments : Moments
+        the moments of all ranks. Since they are combined in the order of the
+        ranks, the result is the same on every rank.
+    """
+    combined = combine_moments(comm.allgather(moments))
+    if combined is None:
+        # no rank has data, zero moments can be returned as they are
+        return moments
+    return combined
+
+
+def allreduce_sum(comm, value):
+    """ Sums a number or an array over all ranks """
+    return sum(comm.allgather(value))
+
+
+class LocalCommunicator(object):
+
+    """ Communicator between local processes created by :func:`run_local`
+
+    Parameters
+    ----------
+    rank : int
+        rank of this process
+    queues : list of multiprocessing.Queue
+        one inbox per rank
+
+    """
+
+    def __init__(self, rank, queues):
+        self.rank = rank
+        self.size = len(queues)
+        self._queues = queues
+        self._ncalls = 0
+        # messages of later collective calls, received early
+        self._pending = {}
+
+    def _receive(self, call, nmessages):
+        messages = self._pending.pop(call, {})
+        while len(messages) < nmessages:
+            c, sender, obj = self._queues[self.rank].get()
+            if c == call:
+                messages[sender] = obj
+            else:
+                self._pending.setdefault(c, {})[sender] = obj
+        return messages
+
+    def allgather(self, obj):
+        call = self._ncalls
+        self._ncalls += 1
+        for r in xrange(self.size):
+            if r != self.rank:
+                self._queues[r].put((call, self.rank, obj))
+        messages = self._receive(call, self.size - 1)
+        messages[self.rank] = obj
+        return [messages[r] for r in xrange(self.size)]
+
+    def bcast(self, obj, root=0):
+        call = self._ncalls
+        self._ncalls += 1
+        if self.rank == root:
+            for r in xrange(self.size):
+                if r != self.rank:
+                    self._queues[r].put((call, self.rank, obj))
+            return obj
+        return self._receive(call, 1)[root]
+
+
+def _run_rank(func, rank, queues, results, args):
+    comm = LocalCommunicator(rank, queues)
+    try:
+        results.put((rank, True, func(comm, *args)))
+    except Exception:
+        results.put((rank, False, ''.join(traceback.format_exception(*sys.exc_info()))))
+
+
+def run_local(func, size, args=()):
+    """ Runs a function on several local processes, which act as ranks
+
+    Parameters
+    ----------
+    func : callable
+        called as func(comm, *args) on every rank, where comm is a
+        :class:`LocalCommunicator`. The return value has to be picklable.
+    size : int
+        number of processes
+    args : tuple
+        further arguments of func
+
+    Returns
+    -------
+    results : list
+        the return values of func, ordered by rank
+
+    Examples
+    --------
+    Estimate TICA on two ranks, each of them streaming one trajectory
+
+    >>> import numpy as np
+    >>> from pyemma.coordinates import tica
+    >>> trajs = [np.random.randn(100, 3), np.random.randn(200, 3)]
+    >>> def estimate(comm):
+    ...     return tica(trajs[comm.rank], lag=2, comm=comm).eigenvalues
+    >>> ev = run_local(estimate, 2)
+    >>> np.all(ev[0] == ev[1])
+    True
+
+    """
+    queues = [multiprocessing.Queue() for _ in xrange(size)]
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_run_rank, args=(func, rank, queues, results, args))
+             for rank in xrange(size)]
+    for p in procs:
+        p.start()
+    res = {}
+    errors = []
+    # collect before joining, large results would block the processes otherwise
+    for _ in xrange(size):
+        rank, success, value = results.get()
+        if success:
+            res[rank] = value
+        else:
+            errors.append("rank %i failed:\n%s" % (rank, value))
+            # the other ranks might wait for the failed one
+            for p in procs:
+                p.terminate()
+            break
+    for p in procs:
+        p.join()
+    if errors:
+        raise RuntimeError('\n'.join(errors))
+    return [res[r] for r in xrange(size)]
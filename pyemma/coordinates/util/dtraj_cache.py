@@ -0,0 +1,154 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+Persistent cache of discrete trajectories.
+
+Assigning a data set to cluster centers streams the whole data set through
+the pipeline. The discrete trajectories of such an assignment are therefore
+stored on disk and read back whenever the same data is assigned to the same
+centers again, also in later sessions.
+
+The cache is enabled by setting the value ``coordinates_dtraj_cache`` in the
+``[pyemma]`` section of the configuration file to a directory. It is disabled
+by default.
+
+Entries are keyed by a hash of the cluster centers, the metric, the stride,
+the precision policy and the identity of the data source. The identity is
+given by the ``_cache_identity()`` method of the data producer, e.g. the file
+names, sizes and modification times plus the types and full parameters of
+the features of a
+:class:`FeatureReader <pyemma.coordinates.data.feature_reader.FeatureReader>`.
+Data sources without identity, like data in memory or features calling
+custom functions, are not cached.
+'''
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from pyemma.coordinates.util.precision import precision_policy
+from pyemma.util.config import conf_values
+from pyemma.util.files import mkdir_p
+
+__all__ = ['cache_dir', 'files_identity', 'arrays_digest', 'cache_key', 'load', 'store']
+
+# increase when the layout of the cache files changes
+_FORMAT_VERSION = 1
+
+
+def cache_dir():
+    """ the configured cache directory, or None if the cache is disabled """
+    directory = conf_values['pyemma'].get('coordinates_dtraj_cache', '').strip()
+    if not directory:
+        return None
+    return os.path.expanduser(directory)
+
+
+def files_identity(filenames):
+    """ identifies the given files by absolute path, size and modification time,
+    such that modified files get a new identity """
+    desc = []
+    for f in filenames:
+        st = os.stat(f)
+        desc.append('%s:%i:%r' % (os.path.abspath(f), st.st_size, st.st_mtime))
+    return '[%s]' % ', '.join(desc)
+
+
+def arrays_digest(*arrays):
+    """ sha1 digest of the shapes, types and contents of the given arrays """
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update('%s%s' % (a.dtype.str, a.shape))
+        h.update(a.data)
+    return h.hexdigest()
+
+
+def cache_key(clustercenters, metric, stride, data_producer):
+    """ key of the assignment of the output of data_producer to the given
+    centers, or None if the cache is disabled or the data can't be identified
+
+    Parameters
+    ----------
+    clustercenters : ndarray(k, n)
+        cluster centers
+    metric : str
+        metric of the assignment, or another description of how frames are
+        assigned to the centers
+    stride : int
+        stride of the assignment
+    data_producer : Transformer
+        source of the assigned data
+
+    Returns
+    -------
+    key : str or None
+    """
+    if cache_dir() is None:
+        return None
+    identity = data_producer._cache_identity()
+    if identity is None:
+        return None
+    h = hashlib.sha1()
+    h.update('%i\n%s\n%s\n%i\n%s\n%s' % (_FORMAT_VERSION, arrays_digest(clustercenters), metric,
+                                         stride, precision_policy(), identity))
+    return h.hexdigest()
+
+
+def _filename(key):
+    return os.path.join(cache_dir(), key + '.npz')
+
+
+def load(key):
+    """ the cached discrete trajectories stored under key, or None on a cache miss """
+    try:
+        with np.load(_filename(key)) as f:
+            return [f['dtraj_%i' % i] for i in xrange(int(f['n_dtrajs']))]
+    except (IOError, KeyError, ValueError):
+        return None
+
+
+def store(key, dtrajs):
+    """ stores the discrete trajectories under key
+
+    The trajectories are stored in the smallest of int16 and int32 that holds
+    all states. The file is written under a temporary name first, so that
+    concurrent readers never see a partially written entry.
+    """
+    directory = cache_dir()
+    mkdir_p(directory)
+    n_states = max([int(d.max()) + 1 for d in dtrajs if len(d) > 0] or [0])
+    dtype = np.int16 if n_states <= np.iinfo(np.int16).max else np.int32
+    arrays = dict(('dtraj_%i' % i, d.astype(dtype)) for i, d in enumerate(dtrajs))
+    fd, tmp = tempfile.mkstemp(suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, n_dtrajs=len(dtrajs), **arrays)
+        os.rename(tmp, _filename(key))
+    except:
+        os.remove(tmp)
+        raise
@@ -0,0 +1,74 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Precision policy of the data streamed through the coordinates pipeline.
+
+The policy is configured by the value ``coordinates_precision`` in the
+``[pyemma]`` section of the configuration file:
+
+* ``mixed`` (default): data sources yield data in the precision it is stored
+  in, transformers map it in that precision and store their output in single
+  precision.
+* ``float32``: all data is streamed in single precision, from the data sources
+  through all transformers. Data in memory is converted once, chunks read from
+  files once per chunk. Only moments, e.g. in TICA or PCA, are accumulated in
+  double precision. This halves the memory traffic of every stage.
+'''
+
+import numpy as np
+
+from pyemma.util.config import conf_values
+
+__all__ = ['PRECISION_POLICIES', 'precision_policy', 'stream_array']
+
+PRECISION_POLICIES = ('mixed', 'float32')
+
+
+def precision_policy():
+    """ the configured precision policy, either 'mixed' or 'float32' """
+    policy = conf_values['pyemma'].get('coordinates_precision', 'mixed')
+    if policy not in PRECISION_POLICIES:
+        raise ValueError("unknown coordinates_precision '%s' in configuration, use one of %s"
+                         % (policy, PRECISION_POLICIES))
+    return policy
+
+
+def stream_array(X):
+    """ converts an array to the precision data is streamed with
+
+    Parameters
+    ----------
+    X : ndarray or None
+
+    Returns
+    -------
+    X : ndarray or None
+        X in single precision if the policy is 'float32', otherwise X itself.
+        Data already in single precision is not copied.
+    """
+    if X is None or precision_policy() != 'float32' or X.dtype == np.float32:
+        return X
+    return X.astype(np.float32)
@@ -0,0 +1,386 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+Mergeable first and second moments of (time-lagged) data.
+
+The moments of a data set are stored as total weight :math:`w`, weighted means
+:math:`\bar{x}, \bar{y}` and the centered cross-product
+
+.. math:: M_{xy} = \sum_t w_t (x_t - \bar{x}) (y_t - \bar{y})^T
+
+Two sets of moments are combined with the pairwise update of Chan et al.
+
+.. math:: M_{xy} = M_{xy}^{(1)} + M_{xy}^{(2)} + \frac{w_1 w_2}{w_1 + w_2}
+          (\bar{x}_1 - \bar{x}_2) (\bar{y}_1 - \bar{y}_2)^T
+
+which, unlike the accumulation of raw sums and products, does not suffer
+from cancellation when the data has a large mean. Since the update is
+associative, partial moments of different chunks or trajectories can be
+computed independently, e.g. by a pool of workers, and be reduced afterwards.
+'''
+
+from multiprocessing.pool import ThreadPool
+import threading
+
+import numpy as np
+from scipy.linalg.blas import get_blas_funcs
+
+__all__ = ['Moments', 'MomentsPool', 'RunningMoments', 'accumulation_dtype',
+           'combine_moments', 'moments_XX', 'moments_XY']
+
+
+def accumulation_dtype(precision):
+    """ Checks the precision of the chunk matrix products
+
+    Parameters
+    ----------
+    precision : numpy dtype or str
+        np.float32 or np.float64
+
+    Returns
+    -------
+    dtype : numpy dtype
+
+    """
+    dtype = np.dtype(precision)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError("moments can be accumulated in float32 or float64 precision, but not in %s" % dtype)
+    return dtype
+
+
+class Moments(object):
+
+    """ First and second moments of one set of (x, y) pairs
+
+    Parameters
+    ----------
+    w : float
+        total weight
+    mean_x : ndarray(n,)
+        weighted mean of x
+    mean_y : ndarray(n,)
+        weighted mean of y
+    Mxy : ndarray(n, n)
+        centered cross-product of x and y
+
+    """
+
+    def __init__(self, w, mean_x, mean_y, Mxy):
+        self.w = float(w)
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.Mxy = Mxy
+
+    def copy(self):
+        return Moments(self.w, self.mean_x.copy(), self.mean_y.copy(), self.Mxy.copy())
+
+    def combine(self, other):
+        """ Merges other moments into these moments (in place).
+
+        Parameters
+        ----------
+        other : Moments
+
+        Returns
+        -------
+        self : Moments
+
+        """
+        if other.w == 0:
+            return self
+        if self.w == 0:
+            self.w = other.w
+            self.mean_x = other.mean_x.copy()
+            self.mean_y = other.mean_y.copy()
+            self.Mxy = other.Mxy.copy()
+            return self
+        w = self.w + other.w
+        dx = self.mean_x - other.mean_x
+        dy = self.mean_y - other.mean_y
+        self.Mxy += other.Mxy
+        self.Mxy += (self.w * other.w / w) * np.outer(dx, dy)
+        self.mean_x = (self.w * self.mean_x + other.w * other.mean_x) / w
+        self.mean_y = (self.w * self.mean_y + other.w * other.mean_y) / w
+        self.w = w
+        return self
+
+    def shifted_Mxy(self, mu_x, mu_y=None):
+        r""" Cross-product of the data centered at the given means
+
+        .. math:: \sum_t w_t (x_t - \mu_x) (y_t - \mu_y)^T
+                  = M_{xy} + w (\bar{x} - \mu_x) (\bar{y} - \mu_y)^T
+
+        Parameters
+        ----------
+        mu_x : ndarray(n,)
+        mu_y : ndarray(n,), optional, default = mu_x
+
+        """
+        if mu_y is None:
+            mu_y = mu_x
+        return self.Mxy + self.w * np.outer(self.mean_x - mu_x, self.mean_y - mu_y)
+
+
+def _zero_moments(dim):
+    zero = np.zeros(dim)
+    return Moments(0, zero, zero.copy(), np.zeros((dim, dim)))
+
+
+# per thread workspaces for centered chunks
+_workspaces = threading.local()
+
+
+def _centered(X, mean, dtype, slot):
+    """ Copies X - mean into a reusable workspace of the given dtype """
+    buffers = getattr(_workspaces, 'buffers', None)
+    if buffers is None:
+        buffers = _workspaces.buffers = {}
+    buf = buffers.get(slot)
+    if buf is None or buf.dtype != dtype or buf.shape[1] != X.shape[1] or buf.shape[0] < X.shape[0]:
+        buf = buffers[slot] = np.empty(X.shape, dtype=dtype)
+    Xc = buf[:X.shape[0]]
+    np.subtract(X, mean, out=Xc)
+    return Xc
+
+
+def _symmetrize_upper(M):
+    """ Mirrors the upper triangle of M into its lower triangle (in place) """
+    M += np.triu(M, 1).T
+    return M
+
+
+def _syrk(Xc, alpha):
+    """ alpha * Xc^T Xc by BLAS syrk, only the triangle is computed """
+    syrk = get_blas_funcs('syrk', (Xc,))
+    # Xc.T is Fortran ordered, so BLAS does not need a copy
+    M = syrk(alpha, Xc.T, trans=0)
+    return _symmetrize_upper(M)
+
+
+def _gemm(Xc, Yc, alpha):
+    """ alpha * Xc^T Yc by BLAS gemm """
+    gemm = get_blas_funcs('gemm', (Xc, Yc))
+    return gemm(alpha, Xc.T, Yc.T, trans_b=1)
+
+
+def moments_XX(X, weight=1.0, dtype=np.float64):
+    """ Moments of the instantaneous data X, every frame having the given weight
+
+    Parameters
+    ----------
+    X : ndarray(T, n)
+    weight : float or ndarray(T,)
+        weight of all frames or of every single frame
+    dtype : numpy dtype, np.float32 or np.float64, default = np.float64
+        precision of the matrix product of the chunk. Means and moments are
+        always stored in double precision.
+
+    Returns
+    -------
+    moments : Moments
+
+    """
+    if X.shape[0] == 0:
+        return _zero_moments(X.shape[1])
+    if not np.isscalar(weight):
+        w = np.sum(weight, dtype=np.float64)
+        if w == 0:
+            return _zero_moments(X.shape[1])
+        mean = np.dot(weight, X) / w
+        Xc = _centered(X, mean, dtype, 0)
+        Mxx = np.dot(Xc.T * weight.astype(dtype), Xc)
+        return Moments(w, mean, mean, np.asarray(Mxx, dtype=np.float64))
+    mean = np.mean(X, axis=0, dtype=np.float64)
+    Mxx = _syrk(_centered(X, mean, dtype, 0), weight)
+    return Moments(weight * X.shape[0], mean, mean, np.asarray(Mxx, dtype=np.float64))
+
+
+def moments_XY(X, Y, weight=1.0, dtype=np.float64):
+    """ Moments of the time-lagged pairs (X[t], Y[t]), every pair having the given weight
+
+    Parameters
+    ----------
+    X : ndarray(T, n)
+    Y : ndarray(T, n)
+    weight : float
+    dtype : numpy dtype, np.float32 or np.float64, default = np.float64
+        precision of the matrix product of the chunk. Means and moments are
+        always stored in double precision.
+
+    Returns
+    -------
+    moments : Moments
+
+    """
+    assert X.shape == Y.shape, "X and Y need to have the same shape"
+    if X.shape[0] == 0:
+        return _zero_moments(X.shape[1])
+    mean_x = np.mean(X, axis=0, dtype=np.float64)
+    mean_y = np.mean(Y, axis=0, dtype=np.float64)
+    Mxy = _gemm(_centered(X, mean_x, dtype, 0), _centered(Y, mean_y, dtype, 1), weight)
+    return Moments(weight * X.shape[0], mean_x, mean_y, np.asarray(Mxy, dtype=np.float64))
+
+
+def combine_moments(moments):
+    """ Combines a list of partial moments by a pairwise tree reduction
+
+    Parameters
+    ----------
+    moments : list of Moments
+        partial moments, these are not modified.
+
+    Returns
+    -------
+    moments : Moments or None
+        the combined moments, None if the list contains no data.
+
+    """
+    moments = [m.copy() for m in moments if m.w > 0]
+    if len(moments) == 0:
+        return None
+    while len(moments) > 1:
+        reduced = [moments[i].combine(moments[i + 1])
+                   for i in xrange(0, len(moments) - 1, 2)]
+        if len(moments) % 2 == 1:
+            reduced.append(moments[-1])
+        moments = reduced
+    return moments[0]
+
+
+class RunningMoments(object):
+
+    """ Accumulates moments chunk by chunk
+
+    Moments of similar weight are merged on a stack, so that the chunks are
+    combined in a balanced pairwise fashion. At most `nsave` partial moments
+    are kept at the same time.
+
+    Parameters
+    ----------
+    dim : int
+        dimension of the data
+    nsave : int, default = 5
+        maximum number of partial moments held in memory
+
+    """
+
+    def __init__(self, dim, nsave=5):
+        self.dim = dim
+        self.nsave = max(int(nsave), 1)
+        self.storage = []
+
+    @property
+    def weight(self):
+        """ total weight of all added data """
+        return sum(m.w for m in self.storage)
+
+    def add(self, moments):
+        """ Adds partial moments
+
+        Parameters
+        ----------
+        moments : Moments
+
+        """
+        if moments.w == 0:
+            return
+        self.storage.append(moments)
+        # merge on top of the stack while the new moments outweigh the previous
+        while len(self.storage) > 1 and \
+                (self.storage[-1].w >= self.storage[-2].w or len(self.storage) > self.nsave):
+            top = self.storage.pop()
+            self.storage[-1].combine(top)
+
+    def moments(self):
+        """ Combines all partial moments
+
+        Returns
+        -------
+        moments : Moments
+            the moments of all data added so far. Zero weight if no data has
+            been added.
+
+        """
+        res = combine_moments(self.storage)
+        if res is None:
+            return _zero_moments(self.dim)
+        return res
+
+
+class MomentsPool(object):
+
+    """ Computes partial moments on a pool of worker threads
+
+    Chunks are handed to the workers as they are read, the resulting partial
+    moments are added to their :class:`RunningMoments` on the calling thread.
+    The computations are dominated by matrix products which release the
+    global interpreter lock, so threads are sufficient to use several cores.
+
+    Parameters
+    ----------
+    n_jobs : int, default = 1
+        number of worker threads. With one job, all moments are computed on
+        the calling thread.
+
+    """
+
+    def __init__(self, n_jobs=1):
+        self.n_jobs = max(int(n_jobs), 1)
+        self._pool = None
+        self._pending = []
+
+    def submit(self, target, func, *args, **kwargs):
+        """ Schedules the computation of moments
+
+        Parameters
+        ----------
+        target : RunningMoments
+            the result of the computation is added to target.
+        func : callable
+            computes partial moments from args and kwargs, e.g. :func:`moments_XX`.
+
+        """
+        if self.n_jobs == 1:
+            target.add(func(*args, **kwargs))
+            return
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_jobs)
+        self._pending.append((target, self._pool.apply_async(func, args, kwargs)))
+        # bound the number of chunks and results held in memory
+        while len(self._pending) > 2 * self.n_jobs:
+            self._collect()
+
+    def _collect(self):
+        target, result = self._pending.pop(0)
+        target.add(result.get())
+
+    def join(self):
+        """ Waits for all scheduled computations and shuts the workers down """
+        while self._pending:
+            self._collect()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -67,7 +67,7 @@ def count_matrix_mult(dtrajs, lag, sliding=True, sparse=True, nstates=None, fail
     """Determine maximum state index, nmax, over all trajectories"""
     nmax = 0
     for dtraj in dtrajs:
-        nmax = max(nmax, dtraj.max())
+        nmax = max(nmax, int(dtraj.max()))
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
@@ -127,7 +127,7 @@ def count_matrix(dtraj, lag, sliding=True, sparse=True, nstates=None):
     #     nstates=nmax+1
 
     """Dimension of state space is maximum microstate index + 1"""
-    nmax = dtraj.max()
+    nmax = int(dtraj.max())
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
@@ -181,7 +181,7 @@ def count_matrix_coo(dtraj, lag, sliding=True, sparse=True, nstates=None):
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
-        nstates = dtraj.max() + 1
+        nstates = int(dtraj.max()) + 1
 
     if (sliding):
         row = dtraj[0:-lag]
@@ -237,7 +237,7 @@ def count_matrix_coo_mult(dtrajs, lag, sliding=True, sparse=True, nstates=None,
     """Determine maximum state index, nmax, over all trajectories"""
     nmax = 0
     for dtraj in dtrajs:
-        nmax = max(nmax, dtraj.max())
+        nmax = max(nmax, int(dtraj.max()))
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
@@ -367,22 +367,24 @@ def count_matrix_bincount(dtraj, lag, sliding=True, sparse=True, nstates=None):
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
-        nstates = dtraj.max() + 1
+        nstates = int(dtraj.max()) + 1
 
     if sliding:
         # """Determine dimension of state space"""
         # if nstates is None:
         # nmax=dtraj.max()
         #     nstates=nmax+1
-        """Trajectory of flattend count-matrix indices k(i,j)=nstates*i+j"""
-        ds = nstates * dtraj[0:-lag] + dtraj[lag:]
+        """Trajectory of flattend count-matrix indices k(i,j)=nstates*i+j,
+        in intp since compact dtrajs (e.g. int16) would overflow"""
+        ds = nstates * dtraj[0:-lag].astype(np.intp) + dtraj[lag:]
     else:
         # """Determine dimension of state space"""
         # if nstates is None:
         # nmax=max(dtraj[0:-lag:lag].max(), dtraj[lag::lag].max())
         #     nstates=nmax+1
-        """Trajectory of flattend count-matrix indices k(i,j)=nstates*i+j"""
-        ds = nstates * dtraj[0:-lag:lag] + dtraj[lag::lag]
+        """Trajectory of flattend count-matrix indices k(i,j)=nstates*i+j,
+        in intp since compact dtrajs (e.g. int16) would overflow"""
+        ds = nstates * dtraj[0:-lag:lag].astype(np.intp) + dtraj[lag::lag]
     C = np.bincount(ds, minlength=nstates * nstates).reshape((nstates, nstates))
     if sparse:
         return scipy.sparse.csr_matrix(C)
@@ -419,7 +421,7 @@ def count_matrix_bincount_mult(dtrajs, lag, sliding=True, sparse=True, nstates=N
     """Determine maximum state index, nmax, over all trajectories"""
     nmax = 0
     for dtraj in dtrajs:
-        nmax = max(nmax, dtraj.max())
+        nmax = max(nmax, int(dtraj.max()))
 
     """Default is nstates = number of observed states at lagtime=1"""
     if nstates is None:
@@ -165,6 +165,14 @@ class TestArguments(unittest.TestCase):
         dtrajs = np.array([0, 1, 2, 0, 0, 1, 2, 1, 0])
         count_matrix(dtrajs, 1)
 
+    def testInputCompactArrays(self):
+        """ int16 dtrajs must not overflow in the flattened count indices """
+        dtraj = np.random.RandomState(0).randint(0, 3000, size=10000)
+        for sliding in (True, False):
+            C = count_matrix([dtraj], 3, sliding=sliding).toarray()
+            C16 = count_matrix([dtraj.astype(np.int16)], 3, sliding=sliding).toarray()
+            assert_allclose(C16, C)
+
     def testInputArrays(self):
         """ this is not supported, has to be list of ndarrays """
         dtrajs = np.array([[0, 1, 2, 0, 0, 1, 2, 1, 0],
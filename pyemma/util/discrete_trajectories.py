@@ -215,7 +215,7 @@ def number_of_states(dtrajs, only_used = False):
         # all states wanted, included nonpopulated ones. return max + 1
         imax = 0
         for dtraj in dtrajs:
-            imax = max(imax, np.max(dtraj))
+            imax = max(imax, int(np.max(dtraj)))
         return imax+1
 
 ################################################################################
@@ -28,6 +28,11 @@ __author__ = 'noe'
 import numpy as np
 import scipy.linalg
 import scipy.sparse
+import scipy.sparse.linalg
+
+# dense eigensolvers are used below this dimension, regardless of the number
+# of requested eigenpairs
+_LANCZOS_MIN_DIM = 1000
 
 def submatrix(M, sel):
     """Returns a submatrix of the quadratic matrix M, given by the selected columns and row
@@ -93,7 +98,74 @@ def _sort_by_norm(evals, evecs):
     return (evals2, evecs2)
 
 
-def eig_corr(C0, Ct, epsilon=1e-6):
+def _use_lanczos(n, neig, method):
+    """ decides whether only neig of n eigenpairs are computed iteratively """
+    if method == 'dense' or neig is None or neig >= n - 1:
+        return False
+    elif method == 'lanczos':
+        return True
+    elif method == 'auto':
+        return n >= _LANCZOS_MIN_DIM and 10 * neig <= n
+    raise ValueError('unknown eigensolver method "%s"' % method)
+
+
+def eig_cov(C, neig=None, method='auto'):
+    """
+    Solve the eigenvalue problem of a covariance matrix
+
+    Parameters
+    ----------
+    C : ndarray (n,n)
+        covariance matrix. Must be symmetric
+    neig : int, optional
+        number of leading eigenpairs needed. By default, all are computed.
+    method : str, optional, default = 'auto'
+        'dense' computes all eigenpairs by a dense solver, 'lanczos' computes
+        the leading neig eigenpairs by Lanczos iteration. 'auto' uses Lanczos
+        if n is large and neig is small compared to n.
+
+    Returns
+    -------
+    l : ndarray (m)
+        eigenvalues, sorted descending. m = neig for Lanczos, n otherwise
+    R : ndarray (n,m)
+        eigenvectors, as a column matrix.
+
+    """
+    if _use_lanczos(C.shape[0], neig, method):
+        (v, R) = scipy.sparse.linalg.eigsh(C, k=neig, which='LA')
+    else:
+        (v, R) = np.linalg.eigh(C)
+    # sort
+    I = np.argsort(v)[::-1]
+    return (v[I], R[:, I])
+
+
+def _eig_corr_lanczos(C0, Ct, epsilon, neig):
+    """
+    Leading generalized eigenpairs of Ct and C0 by Lanczos iteration on the
+    whitened Ct. Whitening uses a Cholesky factor of C0 regularized by epsilon,
+    so directions in which C0 is (nearly) singular get eigenvalues near zero
+    instead of being cut off.
+    """
+    n = C0.shape[0]
+    L = scipy.linalg.cholesky(C0 + epsilon * np.eye(n), lower=True)
+
+    def matvec(v):
+        # L^-1 Ct L^-T v
+        w = scipy.linalg.solve_triangular(L, v, lower=True, trans='T')
+        return scipy.linalg.solve_triangular(L, np.dot(Ct, w), lower=True)
+
+    A = scipy.sparse.linalg.LinearOperator((n, n), matvec=matvec, dtype=np.float64)
+    (l, R_trans) = scipy.sparse.linalg.eigsh(A, k=neig, which='LM')
+    (l, R_trans) = _sort_by_norm(l, R_trans)
+
+    # transform the eigenvectors back to the old basis
+    R = scipy.linalg.solve_triangular(L, R_trans, lower=True, trans='T')
+    return (l, R)
+
+
+def eig_corr(C0, Ct, epsilon=1e-6, neig=None, method='auto'):
     """
     Solve the generalized eigenvalues problem with correlation matrices C0 and Ct
 
@@ -107,6 +179,14 @@ def eig_corr(C0, Ct, epsilon=1e-6):
         eigenvalue norm cutoff. Eigenvalues of C0 with norms <= epsilon will be
         cut off. The remaining number of Eigenvalues define the size of
         the output.
+    neig : int, optional
+        number of leading eigenpairs needed. By default, all are computed.
+    method : str, optional, default = 'auto'
+        'dense' solves the full problem. 'lanczos' computes only the leading
+        neig eigenpairs by Lanczos iteration on Ct whitened with C0, which is
+        regularized by epsilon instead of being truncated. 'auto' uses Lanczos
+        if n is large and neig is small compared to n. If C0 cannot be
+        factorized, the dense solver is used.
 
     Returns
     -------
@@ -120,6 +200,12 @@ def eig_corr(C0, Ct, epsilon=1e-6):
     assert np.allclose(C0.T, C0), 'C0 is not a symmetric matrix'
     assert np.allclose(Ct.T, Ct), 'Ct is not a symmetric matrix'
 
+    if _use_lanczos(C0.shape[0], neig, method):
+        try:
+            return _eig_corr_lanczos(C0, Ct, epsilon, neig)
+        except scipy.linalg.LinAlgError:
+            pass
+
     # compute the Eigenvalues of C0 using Schur factorization
     (S, V) = scipy.linalg.schur(C0)
     s = np.diag(S)
@@ -152,4 +238,48 @@ def eig_corr(C0, Ct, epsilon=1e-6):
     R = np.dot(T.T, R_trans)
 
     # return result
-    return (l, R)
\ No newline at end of file
+    return (l, R)
+
+
+def projection_matrix(mu, W, C, dtype=np.float64):
+    r"""
+    Projection matrix and offset for projecting mean-free data onto W
+
+    Since :math:`(X - \mu) W = X W - \mu W`, data can be projected without a
+    mean-free copy by subtracting the offset :math:`\mu W` from :math:`X W`.
+
+    Parameters
+    ----------
+    mu : ndarray (n)
+        mean of the data
+    W : ndarray (n,m)
+        projection vectors, as a column matrix
+    C : ndarray (n,n)
+        covariance matrix of the data, used to decide on the precision
+    dtype : numpy dtype, optional, default = np.float64
+        requested precision of the projection, usually the one of the data
+
+    Returns
+    -------
+    W : ndarray (n,m)
+        contiguous projection matrix
+    offset : ndarray (m)
+        :math:`\mu W`, in the same precision as W
+
+    Notes
+    -----
+    Single precision is only used if the cancellation in :math:`X W - \mu W`
+    stays small compared to the spread of the projected data. Otherwise, W and
+    the offset are returned in double precision.
+    """
+    dtype = np.dtype(dtype)
+    if dtype != np.float32:
+        dtype = np.dtype(np.float64)
+    else:
+        spread = np.sqrt(np.abs(np.sum(W * np.dot(C, W), axis=0)))
+        # rounding error of the single precision sum over n products
+        error = np.finfo(np.float32).eps * np.sqrt(len(mu)) * np.dot(np.abs(mu), np.abs(W))
+        if np.any(error > 1e-5 * spread):
+            dtype = np.dtype(np.float64)
+    offset = np.dot(mu, W).astype(dtype)
+    return np.ascontiguousarray(W, dtype=dtype), offset
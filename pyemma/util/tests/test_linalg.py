@@ -0,0 +1,90 @@
+
+# Copyright (c) 2015, 2014 Computational Molecular Biology Group, Free University
+# Berlin, 14195 Berlin, Germany.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS ``AS IS''
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+import numpy as np
+
+from pyemma.util.linalg import eig_corr, eig_cov, projection_matrix
+
+
+class TestEigSolvers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rs = np.random.RandomState(0)
+        n = 200
+        cls.n = n
+        # C0 spd with a known square root, Ct with well separated leading eigenvalues
+        A = rs.randn(n, n)
+        cls.C0 = np.dot(A, A.T) / n + np.eye(n)
+        s, V = np.linalg.eigh(cls.C0)
+        C0half = np.dot(V * np.sqrt(s), V.T)
+        Q, _ = np.linalg.qr(rs.randn(n, n))
+        cls.l = np.concatenate(([0.99, 0.9, 0.8], rs.uniform(-0.5, 0.5, n - 3)))
+        cls.Ct = np.dot(np.dot(C0half, np.dot(Q * cls.l, Q.T)), C0half)
+        cls.Ct = 0.5 * (cls.Ct + cls.Ct.T)
+
+    def test_eig_corr_lanczos(self):
+        l_dense, R_dense = eig_corr(self.C0, self.Ct, method='dense')
+        l, R = eig_corr(self.C0, self.Ct, neig=3, method='lanczos')
+        assert R.shape == (self.n, 3)
+        np.testing.assert_allclose(l, [0.99, 0.9, 0.8], rtol=1e-5)
+        np.testing.assert_allclose(l, l_dense[:3], rtol=1e-5)
+        # same eigenvectors up to sign
+        np.testing.assert_allclose(np.abs(R), np.abs(R_dense[:, :3]), rtol=1e-3, atol=1e-6)
+
+    def test_eig_corr_auto(self):
+        # small problems are solved densely
+        l, R = eig_corr(self.C0, self.Ct, neig=3)
+        assert len(l) == self.n
+
+    def test_eig_cov(self):
+        v_dense, R_dense = eig_cov(self.C0)
+        assert np.all(np.diff(v_dense) <= 0)
+        v, R = eig_cov(self.C0, neig=2, method='lanczos')
+        np.testing.assert_allclose(v, v_dense[:2])
+        np.testing.assert_allclose(np.abs(R), np.abs(R_dense[:, :2]), atol=1e-6)
+
+    def test_projection_matrix(self):
+        rs = np.random.RandomState(0)
+        X = rs.randn(500, 4)
+        W = rs.randn(4, 2)
+        C = np.cov(X.T)
+        for shift, dtype in ((0.0, np.float32), (1e4, np.float64)):
+            Xs = (X + shift).astype(np.float32)
+            mu = Xs.mean(axis=0, dtype=np.float64)
+            P, offset = projection_matrix(mu, W, C, dtype=np.float32)
+            # large means cancel in single precision, so double precision is used
+            assert P.dtype == dtype and offset.dtype == dtype
+            assert P.flags.c_contiguous
+            Y = np.dot(Xs, P) - offset
+            np.testing.assert_allclose(Y, np.dot(Xs - mu, W), rtol=1e-5, atol=1e-5)
+        P, offset = projection_matrix(mu, W, C)
+        assert P.dtype == np.float64
+
+
+if __name__ == "__main__":
+    unittest.main()